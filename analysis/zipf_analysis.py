@@ -1,61 +1,238 @@
 import sys
 import os
-from pymongo import MongoClient, UpdateOne, ReplaceOne
-from contextlib import contextmanager
+import io
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+from pymongo import MongoClient
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from core.bridge import CoreBridge
 from crawler.config import MONGO_URI, DB_NAME, ARTICLES_COLLECTION
+from search.build_boolean_index import MAPPED_INDEX_FILE_PATH
+from search.segments import SegmentedIndex, SEGMENTS_DIR
+from search.term_dictionary import TermDictionary, TERMS_COLLECTION, TERM_IDS_FIELD, unpack_term_ids
 
 ZIPF_COLLECTION = "zipf_stats"
+ZIPF_ARTIFACTS_DIR = "zipf_artifacts" # Pre-rendered plot and fit, served by the web app
+ZIPF_MANIFEST_NAME = "zipf_fit.json"
+ZIPF_PLOT_LIMIT = 10000 # Top-ranked stems that are plotted
+ZIPF_INSERT_CHUNK = 10000 # Rows per insert_many when replacing zipf_stats
+ZIPF_COUNT_BATCH = 1000 # Articles whose term ids are counted together
 
-def calculate_zipf_with_cpp():
+def _write_atomically(path, data: bytes):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def fit_zipf(ranks, frequencies):
+    """
+    Least-squares fit of log(frequency) = intercept - alpha * log(rank) over the stems seen more
+    than once. Returns (alpha, intercept), or None if fewer than two points qualify.
+    """
+    ranks, frequencies = np.asarray(ranks), np.asarray(frequencies)
+    valid = (frequencies > 1) & (ranks > 0)
+    if np.count_nonzero(valid) < 2:
+        return None
+    slope, intercept = np.polyfit(np.log(ranks[valid]), np.log(frequencies[valid]), 1)
+    return float(-slope), float(intercept)
+
+def render_zipf_plot(ranks, frequencies, fit) -> bytes:
+    """Renders the rank/frequency distribution and the fitted line as a PNG."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    ranks = np.asarray(ranks)
+    alpha = fit[0] if fit else 0.0
+    plt.style.use('seaborn-v0_8-whitegrid')
+    fig, ax = plt.subplots(figsize=(12, 8))
+    ax.loglog(ranks, frequencies, marker=".", linestyle='None', label='Фактические данные корпуса', alpha=0.6, markersize=8)
+    if fit:
+        regression_line = np.exp(fit[1] - alpha * np.log(ranks))
+        ax.loglog(ranks, regression_line, linestyle='--', color='red', linewidth=2, label=f'Идеальный закон Ципфа (α ≈ {alpha:.2f})')
+    ax.set_title("Распределение по закону Ципфа (логарифмическая шкала)", fontsize=16)
+    ax.set_xlabel("Ранг", fontsize=12)
+    ax.set_ylabel("Частота", fontsize=12)
+    ax.legend()
+    ax.grid(True, which="both", ls="-", alpha=0.2)
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return buf.getvalue()
+
+def save_zipf_artifacts(ranks, frequencies, directory=ZIPF_ARTIFACTS_DIR) -> dict:
+    """
+    Fits the law, renders the plot to a file named after its content hash and then points the
+    manifest at it; both writes are atomic, so readers see either the old or the new version.
+    Returns the manifest: version, alpha, intercept, plot file name, points and updated_at.
+    """
+    fit = fit_zipf(ranks, frequencies)
+    png = render_zipf_plot(ranks, frequencies, fit)
+    version = hashlib.sha1(png).hexdigest()[:16]
+    plot_name = f"zipf_plot.{version}.png"
+
+    os.makedirs(directory, exist_ok=True)
+    _write_atomically(os.path.join(directory, plot_name), png)
+    manifest = {
+        "version": version,
+        "alpha": fit[0] if fit else None,
+        "intercept": fit[1] if fit else None,
+        "plot": plot_name,
+        "points": len(ranks),
+        "updated_at": time.time(),
+    }
+    _write_atomically(os.path.join(directory, ZIPF_MANIFEST_NAME), json.dumps(manifest, indent=2).encode("utf-8"))
+
+    # Older renders go, except the one just replaced, which a reader may still be sending.
+    previous = sorted((name for name in os.listdir(directory) if name.startswith("zipf_plot.") and name != plot_name),
+                      key=lambda name: os.path.getmtime(os.path.join(directory, name)))
+    for name in previous[:-1]:
+        os.remove(os.path.join(directory, name))
+    return manifest
+
+def load_zipf_manifest(directory=ZIPF_ARTIFACTS_DIR):
+    """The manifest written by save_zipf_artifacts, or None if there is none yet."""
+    try:
+        with open(os.path.join(directory, ZIPF_MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def build_zipf_artifacts_from_db(zipf_collection, directory=ZIPF_ARTIFACTS_DIR) -> dict:
+    """Renders the artifacts from the stats already stored in MongoDB. Raises ValueError if there are none."""
+    stats = list(zipf_collection.find({}, {"_id": 0, "rank": 1, "frequency": 1}).sort("rank", 1).limit(ZIPF_PLOT_LIMIT))
+    if not stats:
+        raise ValueError("No Zipf stats to plot.")
+    return save_zipf_artifacts([s['rank'] for s in stats], [s['frequency'] for s in stats], directory)
+
+# --- Statistics ---
+def zipf_rows(term_stats) -> list:
+    """
+    zipf_stats documents from (stem, document frequency, collection frequency) triples, ranked by
+    collection frequency (ties by stem). The document frequency may be None if it is unknown.
+    """
+    ordered = sorted(term_stats, key=lambda item: (-item[2], item[0]))
+    rows = []
+    for rank, (stem, doc_freq, freq) in enumerate(ordered, 1):
+        row = {"stem": stem, "frequency": freq, "rank": rank, "frequency_rank_product": freq * rank}
+        if doc_freq is not None:
+            row["doc_frequency"] = doc_freq
+        rows.append(row)
+    return rows
+
+def write_zipf_stats(db, rows):
+    """
+    Replaces the zipf_stats collection in one step: the rows are inserted into a staging
+    collection in chunks, which is then renamed over the old one, so readers never see a
+    half-written table.
+    """
+    staging = db[ZIPF_COLLECTION + "_staging"]
+    staging.drop()
+    if not rows:
+        db[ZIPF_COLLECTION].delete_many({})
+        return
+    for i in range(0, len(rows), ZIPF_INSERT_CHUNK):
+        staging.insert_many(rows[i:i + ZIPF_INSERT_CHUNK], ordered=False)
+    staging.create_index("rank")
+    staging.rename(ZIPF_COLLECTION, dropTarget=True)
+
+def index_term_stats(bridge):
+    """
+    (stem, document frequency, collection frequency) triples of the search index: the segmented
+    index if there is one, else the mapped index file. Both keep the counts in their dictionaries.
+    """
+    if SegmentedIndex.exists(SEGMENTS_DIR):
+        index = SegmentedIndex(SEGMENTS_DIR, bridge)
+        return [(term, doc_freq, freq) for term, (doc_freq, freq) in index.term_stats().items()]
+    with bridge.managed_mapped_index(MAPPED_INDEX_FILE_PATH) as index_ptr:
+        if not index_ptr:
+            raise IOError(f"Could not open index file: {MAPPED_INDEX_FILE_PATH}. Please build it first.")
+        return bridge.get_mapped_term_stats(index_ptr)
+
+def publish_zipf_stats(db, term_stats):
+    """Writes zipf_stats and re-renders the plot artifacts from (stem, doc_freq, freq) triples."""
+    rows = zipf_rows(term_stats)
+    print(f"Writing {len(rows)} stems to '{ZIPF_COLLECTION}'...")
+    write_zipf_stats(db, rows)
+    if rows:
+        top = rows[:ZIPF_PLOT_LIMIT]
+        manifest = save_zipf_artifacts([row['rank'] for row in top], [row['frequency'] for row in top])
+        alpha = manifest['alpha']
+        print(f"Zipf fit: alpha = {alpha:.3f}; plot saved to '{ZIPF_ARTIFACTS_DIR}'." if alpha is not None
+              else f"Too few repeated stems to fit; plot saved to '{ZIPF_ARTIFACTS_DIR}'.")
+
+def calculate_zipf_from_index():
+    """Derives the Zipf stats from the counts stored in the search index; no article is read."""
+    bridge = CoreBridge()
+    client = MongoClient(MONGO_URI)
+    try:
+        print("Reading term statistics from the search index...")
+        start_time = time.monotonic()
+        term_stats = index_term_stats(bridge)
+        print(f"Read {len(term_stats)} stems in {time.monotonic() - start_time:.2f}s.")
+        publish_zipf_stats(client[DB_NAME], term_stats)
+    finally:
+        client.close()
+    print("Zipf stats successfully calculated and saved to MongoDB.")
+
+def count_term_ids(term_id_streams, counts=None) -> np.ndarray:
+    """Adds the occurrences of every term id in packed term-id streams to `counts` (indexed by id) and returns it."""
+    ids = unpack_term_ids(b"".join(term_id_streams))
+    batch_counts = np.bincount(ids, minlength=0 if counts is None else len(counts))
+    if counts is None:
+        return batch_counts
+    if len(batch_counts) > len(counts):
+        counts = np.concatenate([counts, np.zeros(len(batch_counts) - len(counts), dtype=counts.dtype)])
+    counts += batch_counts
+    return counts
+
+def calculate_zipf_from_articles():
+    """
+    Counts the stems of every article again; for databases without a built index. The articles'
+    packed term ids are counted as integer arrays and named through the term dictionary at the end.
+    """
     bridge = CoreBridge()
     client = MongoClient(MONGO_URI)
     db = client[DB_NAME]
     articles_collection = db[ARTICLES_COLLECTION]
-    zipf_collection = db[ZIPF_COLLECTION]
-
-    print("Calculating Zipf stats using C++ core...")
-
-    with bridge.managed_freq_map() as freq_map_ptr:
-        cursor = articles_collection.find({"stems": {"$exists": True, "$ne": []}}, {"stems": 1})
-        
-        doc_count = 0
-        for doc in cursor:
-            stems = doc.get('stems', [])
-            if stems:
-                bridge.add_stems_to_freq_map(freq_map_ptr, stems)
-            doc_count += 1
-            if doc_count % 1000 == 0:
-                print(f"Processed {doc_count} documents for Zipf stats...")
-        
-        print("All documents processed. Converting C++ map to array...")
-        freq_list = bridge.get_freq_map_as_list(freq_map_ptr)
-    
-    print(f"Received {len(freq_list)} unique stems from C++. Preparing for DB update.")
-
-    # --- Update MongoDB ---
-    zipf_collection.delete_many({})
-    operations = []
-    for i, item in enumerate(freq_list):
-        rank = i + 1
-        operations.append(ReplaceOne(
-            {"stem": item['stem']},
-            {
-                "stem": item['stem'],
-                "frequency": item['frequency'],
-                "rank": rank,
-                "frequency_rank_product": item['frequency'] * rank
-            },
-            upsert=True
-        ))
-    
-    if operations:
-        zipf_collection.bulk_write(operations)
 
+    print("Calculating Zipf stats from the articles' term ids...")
+
+    cursor = articles_collection.find({TERM_IDS_FIELD: {"$exists": True, "$ne": b""}}, {TERM_IDS_FIELD: 1, "_id": 0})
+    counts = np.zeros(0, dtype=np.int64)
+    batch = []
+    doc_count = 0
+    for doc in cursor:
+        batch.append(doc[TERM_IDS_FIELD])
+        doc_count += 1
+        if len(batch) == ZIPF_COUNT_BATCH:
+            counts = count_term_ids(batch, counts)
+            batch = []
+            print(f"Processed {doc_count} documents for Zipf stats...")
+    counts = count_term_ids(batch, counts)
+
+    # Loaded after the articles were read, so it holds every id they use.
+    with TermDictionary(db[TERMS_COLLECTION], bridge) as dictionary:
+        stems = dictionary.terms()
+    present = np.flatnonzero(counts[:len(stems)])
+    print(f"Counted {len(present)} unique stems in {doc_count} documents. Preparing for DB update.")
+
+    publish_zipf_stats(db, [(stems[term_id], None, freq) for term_id, freq in zip(present.tolist(), counts[present].tolist())])
     print("Zipf stats successfully calculated and saved to MongoDB.")
     client.close()
 
 if __name__ == '__main__':
-    calculate_zipf_with_cpp()
+    parser = argparse.ArgumentParser(description="Calculate the Zipf statistics of the corpus.")
+    parser.add_argument('--from-articles', action='store_true',
+                        help="Count the stems of every article in MongoDB instead of reading the built index.")
+    args = parser.parse_args()
+
+    if args.from_articles:
+        calculate_zipf_from_articles()
+    else:
+        calculate_zipf_from_index()
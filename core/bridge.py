@@ -1,11 +1,31 @@
 import ctypes
 import os
+import sys
+import weakref
+from array import array
+from itertools import accumulate, chain
 from contextlib import contextmanager
 
 # ... (Existing Structs: StringArray, IntArray, InvertedIndex) ...
 class StringArray(ctypes.Structure): _fields_ = [("strings", ctypes.POINTER(ctypes.c_char_p)), ("count", ctypes.c_int)]
 class IntArray(ctypes.Structure): _fields_ = [("ids", ctypes.POINTER(ctypes.c_int)), ("count", ctypes.c_int)]
+class ScoredArray(ctypes.Structure): _fields_ = [("ids", ctypes.POINTER(ctypes.c_int)), ("scores", ctypes.POINTER(ctypes.c_float)), ("count", ctypes.c_int)]
+class PostingsCacheStats(ctypes.Structure): _fields_ = [("hits", ctypes.c_ulonglong), ("misses", ctypes.c_ulonglong), ("entries", ctypes.c_ulonglong), ("bytes", ctypes.c_ulonglong)]
 class InvertedIndex(ctypes.Structure): pass
+class TokenBatch(ctypes.Structure):
+    _fields_ = [("arena", ctypes.c_void_p), ("token_offsets", ctypes.POINTER(ctypes.c_int)), ("stem_offsets", ctypes.POINTER(ctypes.c_int)),
+                ("doc_offsets", ctypes.POINTER(ctypes.c_int)), ("num_tokens", ctypes.c_int), ("num_docs", ctypes.c_int), ("arena_size", ctypes.c_int)]
+class TokenSpans(ctypes.Structure):
+    _fields_ = [("text", ctypes.c_void_p), ("base", ctypes.c_longlong), ("starts", ctypes.POINTER(ctypes.c_longlong)),
+                ("lengths", ctypes.POINTER(ctypes.c_int)), ("count", ctypes.c_int), ("size", ctypes.c_int)]
+class TokenText(ctypes.Structure): _fields_ = [("text", ctypes.c_void_p), ("count", ctypes.c_int), ("size", ctypes.c_int)]
+class TokenStream(ctypes.Structure): pass # Opaque pointer to a tokenizer fed in chunks
+class MappedIndex(ctypes.Structure): pass # Opaque pointer to a read-only, memory-mapped index
+class SearchCursor(ctypes.Structure): pass # Opaque pointer to the evaluated matches of a query
+class TermDictionary(ctypes.Structure): pass # Opaque pointer to a stem -> dense id dictionary
+class TermStatsArray(ctypes.Structure):
+    _fields_ = [("terms", ctypes.POINTER(ctypes.c_char)), ("doc_freqs", ctypes.POINTER(ctypes.c_int)),
+                ("collection_freqs", ctypes.POINTER(ctypes.c_ulonglong)), ("count", ctypes.c_int), ("terms_size", ctypes.c_int)]
 
 # --- New Structs for Zipf ---
 class FreqPair(ctypes.Structure):
@@ -14,9 +34,48 @@ class FreqPair(ctypes.Structure):
 class FreqArray(ctypes.Structure):
     _fields_ = [("pairs", ctypes.POINTER(FreqPair)), ("count", ctypes.c_int)]
 
+class FreqColumns(ctypes.Structure):
+    _fields_ = [("stems", ctypes.c_void_p), ("frequencies", ctypes.POINTER(ctypes.c_int)), ("count", ctypes.c_int), ("stems_size", ctypes.c_int)]
+
 class FrequencyMap(ctypes.Structure): pass # Opaque pointer
 
 
+def _byte_buffer(data):
+    """Wraps bytes-like data for a `const unsigned char*` argument. A bytearray is shared, not copied."""
+    if data is None: return None
+    if isinstance(data, bytearray): return (ctypes.c_ubyte * len(data)).from_buffer(data)
+    return (ctypes.c_ubyte * len(data)).from_buffer_copy(data)
+
+
+# --- Results owned by the core ---
+# Large results are not copied into Python objects element by element: a memoryview is laid over the
+# core's buffer instead (np.asarray wraps it without a copy, .tolist() converts it in one call), and
+# the buffer is freed by a finalizer once the last view over it is gone.
+_VIEW_FORMATS = {ctypes.c_int: 'i', ctypes.c_float: 'f', ctypes.c_ulonglong: 'Q', ctypes.c_ubyte: 'B'}
+
+class _CoreResult:
+    """Owns a struct returned by the core; free(struct) runs once nothing refers to the owner any more."""
+    def __init__(self, struct, free):
+        weakref.finalize(self, free, struct)
+
+def _core_view(owner, address, ctype, count) -> memoryview:
+    """A flat memoryview of `count` values of `ctype` at `address`, inside a buffer kept alive by `owner`."""
+    if not count: return memoryview(b"").cast(_VIEW_FORMATS[ctype])
+    array = (ctype * count).from_address(ctypes.cast(address, ctypes.c_void_p).value)
+    array._owner = owner
+    return memoryview(array).cast('B').cast(_VIEW_FORMATS[ctype])
+
+def _uint32_buffer(data):
+    """Wraps packed little-endian uint32 values (bytes, bytearray or memoryview) for a `const unsigned int*` argument."""
+    values = array('I'); values.frombytes(data)
+    if sys.byteorder != 'little': values.byteswap()
+    return values
+
+def _decode_strings(view, count) -> list:
+    """Decodes `count` NUL-terminated UTF-8 strings stored back to back with one decode and one split."""
+    return str(view, 'utf-8')[:-1].split("\0") if count else []
+
+
 class CoreBridge:
     def __init__(self):
         self.lib = self._load_library()
@@ -33,12 +92,55 @@ class CoreBridge:
         self.lib.tokenize.restype = StringArray; self.lib.tokenize.argtypes = [ctypes.c_char_p]
         self.lib.stem_word_no_stl.restype = ctypes.POINTER(ctypes.c_char); self.lib.stem_word_no_stl.argtypes = [ctypes.c_char_p]
         self.lib.free_string_array.argtypes = [StringArray]; self.lib.free_single_string.argtypes = [ctypes.POINTER(ctypes.c_char)]
+        self.lib.tokenize_and_stem_batch.restype = TokenBatch; self.lib.tokenize_and_stem_batch.argtypes = [ctypes.c_char_p, ctypes.c_int, ctypes.c_int]
+        self.lib.free_token_batch.argtypes = [TokenBatch]
+        self.lib.tokenize_joined.restype = TokenText; self.lib.tokenize_joined.argtypes = [ctypes.c_char_p, ctypes.c_int]
+        self.lib.free_token_text.argtypes = [TokenText]
+        self.lib.tokenize_spans.restype = TokenSpans; self.lib.tokenize_spans.argtypes = [ctypes.c_char_p, ctypes.c_int]
+        self.lib.open_token_stream.restype = ctypes.POINTER(TokenStream); self.lib.close_token_stream.argtypes = [ctypes.POINTER(TokenStream)]
+        self.lib.token_stream_feed.restype = TokenSpans; self.lib.token_stream_feed.argtypes = [ctypes.POINTER(TokenStream), ctypes.c_char_p, ctypes.c_int, ctypes.c_int]
+        self.lib.free_token_spans.argtypes = [TokenSpans]
         self.lib.create_index.restype = ctypes.POINTER(InvertedIndex); self.lib.destroy_index.argtypes = [ctypes.POINTER(InvertedIndex)]
+        self.lib.create_positional_index.restype = ctypes.POINTER(InvertedIndex)
         self.lib.add_document_to_index.argtypes = [ctypes.POINTER(InvertedIndex), ctypes.c_int, StringArray]
+        self.lib.add_documents_to_index.argtypes = [ctypes.POINTER(InvertedIndex), ctypes.c_int, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int), ctypes.c_char_p, ctypes.c_int]
+        self.lib.create_term_dictionary.restype = ctypes.POINTER(TermDictionary); self.lib.destroy_term_dictionary.argtypes = [ctypes.POINTER(TermDictionary)]
+        self.lib.term_dictionary_size.restype = ctypes.c_int; self.lib.term_dictionary_size.argtypes = [ctypes.POINTER(TermDictionary)]
+        self.lib.encode_terms.argtypes = [ctypes.POINTER(TermDictionary), ctypes.c_char_p, ctypes.c_int, ctypes.c_int, ctypes.POINTER(ctypes.c_uint)]
+        self.lib.get_dictionary_terms.restype = TokenText; self.lib.get_dictionary_terms.argtypes = [ctypes.POINTER(TermDictionary), ctypes.c_int]
+        self.lib.add_encoded_documents_to_index.restype = ctypes.c_int
+        self.lib.add_encoded_documents_to_index.argtypes = [ctypes.POINTER(InvertedIndex), ctypes.POINTER(TermDictionary), ctypes.c_int,
+                                                            ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_uint)]
         self.lib.save_index_to_file.restype = ctypes.c_int; self.lib.save_index_to_file.argtypes = [ctypes.POINTER(InvertedIndex), ctypes.c_char_p]
         self.lib.load_index_from_file.restype = ctypes.POINTER(InvertedIndex); self.lib.load_index_from_file.argtypes = [ctypes.c_char_p]
         self.lib.search_index.restype = IntArray; self.lib.search_index.argtypes = [ctypes.POINTER(InvertedIndex), ctypes.c_char_p]
         self.lib.free_int_array.argtypes = [IntArray]
+        self.lib.count_index_matches.restype = ctypes.c_int; self.lib.count_index_matches.argtypes = [ctypes.POINTER(InvertedIndex), ctypes.c_char_p]
+        self.lib.open_search_cursor.restype = ctypes.POINTER(SearchCursor); self.lib.open_search_cursor.argtypes = [ctypes.POINTER(InvertedIndex), ctypes.c_char_p]
+        self.lib.search_cursor_count.restype = ctypes.c_int; self.lib.search_cursor_count.argtypes = [ctypes.POINTER(SearchCursor)]
+        self.lib.search_cursor_seek.argtypes = [ctypes.POINTER(SearchCursor), ctypes.c_int]
+        self.lib.search_cursor_next.restype = IntArray; self.lib.search_cursor_next.argtypes = [ctypes.POINTER(SearchCursor), ctypes.c_int]
+        self.lib.close_search_cursor.argtypes = [ctypes.POINTER(SearchCursor)]
+
+        # --- Memory-mapped Index Functions ---
+        self.lib.save_index_mapped.restype = ctypes.c_int; self.lib.save_index_mapped.argtypes = [ctypes.POINTER(InvertedIndex), ctypes.c_char_p]
+        self.lib.open_mapped_index.restype = ctypes.POINTER(MappedIndex); self.lib.open_mapped_index.argtypes = [ctypes.c_char_p]
+        self.lib.search_mapped_index.restype = IntArray; self.lib.search_mapped_index.argtypes = [ctypes.POINTER(MappedIndex), ctypes.c_char_p]
+        self.lib.close_mapped_index.argtypes = [ctypes.POINTER(MappedIndex)]
+        self.lib.search_mapped_index_live.restype = IntArray; self.lib.search_mapped_index_live.argtypes = [ctypes.POINTER(MappedIndex), ctypes.c_char_p, ctypes.POINTER(ctypes.c_ubyte), ctypes.c_int]
+        self.lib.count_mapped_index_matches.restype = ctypes.c_int; self.lib.count_mapped_index_matches.argtypes = [ctypes.POINTER(MappedIndex), ctypes.c_char_p, ctypes.POINTER(ctypes.c_ubyte), ctypes.c_int]
+        self.lib.open_mapped_search_cursor.restype = ctypes.POINTER(SearchCursor)
+        self.lib.open_mapped_search_cursor.argtypes = [ctypes.POINTER(MappedIndex), ctypes.c_char_p, ctypes.POINTER(ctypes.c_ubyte), ctypes.c_int]
+        self.lib.search_mapped_index_ranked.restype = ScoredArray
+        self.lib.search_mapped_index_ranked.argtypes = [ctypes.POINTER(MappedIndex), ctypes.c_char_p, ctypes.c_int, ctypes.POINTER(ctypes.c_ubyte), ctypes.c_int]
+        self.lib.free_scored_array.argtypes = [ScoredArray]
+        self.lib.get_mapped_term_stats.restype = TermStatsArray
+        self.lib.get_mapped_term_stats.argtypes = [ctypes.POINTER(MappedIndex), ctypes.POINTER(ctypes.c_ubyte), ctypes.c_int]
+        self.lib.free_term_stats_array.argtypes = [TermStatsArray]
+        self.lib.set_postings_cache_limit.argtypes = [ctypes.POINTER(MappedIndex), ctypes.c_longlong]
+        self.lib.get_postings_cache_stats.restype = PostingsCacheStats; self.lib.get_postings_cache_stats.argtypes = [ctypes.POINTER(MappedIndex)]
+        self.lib.merge_mapped_indexes.restype = ctypes.c_int
+        self.lib.merge_mapped_indexes.argtypes = [ctypes.POINTER(ctypes.c_char_p), ctypes.POINTER(ctypes.POINTER(ctypes.c_ubyte)), ctypes.POINTER(ctypes.c_int), ctypes.c_int, ctypes.c_char_p]
         
         # --- Zipf Functions ---
         self.lib.create_freq_map.restype = ctypes.POINTER(FrequencyMap)
@@ -46,25 +148,282 @@ class CoreBridge:
         self.lib.add_stems_to_freq_map.argtypes = [ctypes.POINTER(FrequencyMap), StringArray]
         self.lib.get_freq_map_as_array.restype = FreqArray; self.lib.get_freq_map_as_array.argtypes = [ctypes.POINTER(FrequencyMap)]
         self.lib.free_freq_array.argtypes = [FreqArray]
+        self.lib.get_freq_map_columns.restype = FreqColumns; self.lib.get_freq_map_columns.argtypes = [ctypes.POINTER(FrequencyMap)]
+        self.lib.free_freq_columns.argtypes = [FreqColumns]
 
     # ... (Tokenizer, Stemmer, Indexer methods) ...
     def get_version(self): return self.lib.get_core_version().decode('utf-8')
-    def tokenize(self, text: str) -> list: # ...
-        c_arr = self.lib.tokenize(text.encode('utf-8')); py_list = [c_arr.strings[i].decode('utf-8') for i in range(c_arr.count)]; self.lib.free_string_array(c_arr); return py_list
+    def tokenize(self, text: str) -> list:
+        """The normalized tokens of a text; the core returns them in one buffer, which is decoded once."""
+        data = text.encode('utf-8'); c_text = self.lib.tokenize_joined(data, len(data))
+        try: return _decode_strings(ctypes.string_at(c_text.text, c_text.size), c_text.count)
+        finally: self.lib.free_token_text(c_text)
     def stem_word(self, word: str) -> str: # ...
         c_ptr = self.lib.stem_word_no_stl(word.encode('utf-8')); py_str = ctypes.cast(c_ptr, ctypes.c_char_p).value.decode('utf-8'); self.lib.free_single_string(c_ptr); return py_str
+    def tokenize_and_stem_batch(self, texts: list) -> list:
+        """
+        Tokenizes and stems many texts with one call into the core and returns a (tokens, stems) pair per text.
+        The core fills a single arena that is decoded in two runs per text and freed once. ctypes releases
+        the GIL for the duration of the call, so batches submitted from several threads run in parallel.
+        """
+        if not texts: return []
+        buffer = "\0".join(texts).encode('utf-8') + b"\0"
+        if buffer.count(b"\0") != len(texts): # An embedded NUL would shift every following text.
+            buffer = "\0".join(text.replace("\0", " ") for text in texts).encode('utf-8') + b"\0"
+
+        batch = self.lib.tokenize_and_stem_batch(buffer, len(texts), len(buffer))
+        try:
+            arena = ctypes.string_at(batch.arena, batch.arena_size)
+            token_offsets, stem_offsets, doc_offsets = batch.token_offsets, batch.stem_offsets, batch.doc_offsets
+            results = []
+            for d in range(batch.num_docs):
+                first, last = doc_offsets[d], doc_offsets[d + 1]
+                if first == last:
+                    results.append(([], []))
+                    continue
+                # Each document is "tok\0tok\0...stem\0stem\0..." and the next document starts right after it.
+                tokens_start, stems_start, stems_end = token_offsets[first], stem_offsets[first], token_offsets[last]
+                tokens = arena[tokens_start:stems_start - 1].decode('utf-8').split("\0")
+                stems = arena[stems_start:stems_end - 1].decode('utf-8').split("\0")
+                results.append((tokens, stems))
+            return results
+        finally:
+            self.lib.free_token_batch(batch)
+    def _take_token_spans(self, c_spans) -> tuple:
+        try:
+            text = ctypes.string_at(c_spans.text, c_spans.size) if c_spans.size else b""
+            return c_spans.base, text, list(zip(c_spans.starts[:c_spans.count], c_spans.lengths[:c_spans.count]))
+        finally:
+            self.lib.free_token_spans(c_spans)
+    def tokenize_spans(self, data) -> tuple:
+        """
+        Tokenizes UTF-8 bytes (or a str, encoded first) in one pass and returns (normalized, spans): the
+        lower-cased bytes, as long as the input, and a (start, length) byte range per token in either of them.
+        """
+        if isinstance(data, str): data = data.encode('utf-8')
+        _, text, spans = self._take_token_spans(self.lib.tokenize_spans(data, len(data)))
+        return text, spans
+    @contextmanager
+    def managed_token_stream(self):
+        stream = self.lib.open_token_stream()
+        try: yield stream
+        finally: self.lib.close_token_stream(stream)
+    def feed_token_stream(self, stream, chunk: bytes, last: bool = False) -> tuple:
+        """
+        Tokenizes the next chunk of a stream and returns (base, normalized, spans): spans are offsets from
+        the start of the stream and normalized holds stream bytes [base, base + len(normalized)).
+        """
+        return self._take_token_spans(self.lib.token_stream_feed(stream, chunk, len(chunk), int(last)))
+    def iter_stream_tokens(self, chunks):
+        """Yields the tokens of a text given as an iterable of byte chunks, without joining the chunks."""
+        with self.managed_token_stream() as stream:
+            for chunk in chain(chunks, [None]):
+                base, text, spans = self.feed_token_stream(stream, chunk or b"", last=chunk is None)
+                for start, length in spans:
+                    yield text[start - base:start - base + length].decode('utf-8')
     @contextmanager
-    def managed_index(self, path: str = None): # ...
-        index_ptr = self.lib.load_index_from_file(path.encode('utf-8')) if path and os.path.exists(path) else self.lib.create_index()
+    def managed_index(self, path: str = None, positions: bool = False):
+        """Yields an index loaded from `path`, or a new one; `positions` makes a new index record term positions."""
+        if path and os.path.exists(path): index_ptr = self.lib.load_index_from_file(path.encode('utf-8'))
+        else: index_ptr = self.lib.create_positional_index() if positions else self.lib.create_index()
         try: yield index_ptr
         finally:
             if index_ptr: self.lib.destroy_index(index_ptr)
     def add_document_to_index(self, index_ptr, doc_id: int, stems: list): # ...
         c_stems = (ctypes.c_char_p * len(stems))(); encoded_stems = [s.encode('utf-8') for s in stems]; c_stems[:] = encoded_stems
         self.lib.add_document_to_index(index_ptr, doc_id, StringArray(c_stems, len(stems)))
+    def add_documents_to_index(self, index_ptr, documents: list):
+        """
+        Indexes a batch of (doc_id, stems) pairs with a single call into the core.
+        All stems are joined and encoded once, so the cost per document is a few list operations.
+        """
+        if not documents: return
+        num_docs = len(documents)
+        doc_ids = (ctypes.c_int * num_docs)(*[doc_id for doc_id, _ in documents])
+        stem_offsets = (ctypes.c_int * (num_docs + 1))(0, *accumulate(len(stems) for _, stems in documents))
+        buffer = "\0".join(chain.from_iterable(stems for _, stems in documents)).encode('utf-8') + b"\0"
+        self.lib.add_documents_to_index(index_ptr, num_docs, doc_ids, stem_offsets, buffer, len(buffer))
+    def add_encoded_documents_to_index(self, index_ptr, dictionary_ptr, documents: list) -> int:
+        """
+        Like add_documents_to_index, for (doc_id, term_ids) pairs whose term ids (packed little-endian
+        uint32, as returned by encode_terms) come from `dictionary_ptr`. No stem is encoded or hashed.
+        Returns the number of ids skipped because the dictionary does not hold them.
+        """
+        if not documents: return 0
+        num_docs = len(documents)
+        doc_ids = (ctypes.c_int * num_docs)(*[doc_id for doc_id, _ in documents])
+        term_offsets = (ctypes.c_int * (num_docs + 1))(0, *accumulate(len(term_ids) // 4 for _, term_ids in documents))
+        term_ids = _uint32_buffer(b"".join(term_ids for _, term_ids in documents))
+        address, _ = term_ids.buffer_info()
+        return self.lib.add_encoded_documents_to_index(index_ptr, dictionary_ptr, num_docs, doc_ids, term_offsets,
+                                                       ctypes.cast(address, ctypes.POINTER(ctypes.c_uint)))
     def save_index(self, index_ptr, path: str) -> bool: return self.lib.save_index_to_file(index_ptr, path.encode('utf-8')) == 0
-    def search_index(self, index_ptr, query: str) -> list: # ...
-        c_int_arr = self.lib.search_index(index_ptr, query.encode('utf-8')); py_list = [c_int_arr.ids[i] for i in range(c_int_arr.count)]; self.lib.free_int_array(c_int_arr); return py_list
+    def search_index(self, index_ptr, query: str) -> list: return self.search_index_ids(index_ptr, query).tolist()
+    def search_index_ids(self, index_ptr, query: str) -> memoryview:
+        """The matching ids as an int32 memoryview over the core's result, freed once no view is left."""
+        return self._int_array_view(self.lib.search_index(index_ptr, query.encode('utf-8')))
+    def _int_array_view(self, c_int_arr) -> memoryview:
+        return _core_view(_CoreResult(c_int_arr, self.lib.free_int_array), c_int_arr.ids, ctypes.c_int, c_int_arr.count)
+
+    def count_index_matches(self, index_ptr, query: str) -> int: return self.lib.count_index_matches(index_ptr, query.encode('utf-8'))
+
+    # --- Search Cursor Methods ---
+    def open_search_cursor(self, index_ptr, query: str):
+        """Evaluates a query into a cursor whose matches are read in chunks. Free it with close_search_cursor."""
+        return self.lib.open_search_cursor(index_ptr, query.encode('utf-8'))
+
+    def open_mapped_search_cursor(self, index_ptr, query: str, live_docs=None):
+        """Like open_search_cursor, on a mapped index; documents whose live bit is clear are left out."""
+        return self.lib.open_mapped_search_cursor(index_ptr, query.encode('utf-8'), _byte_buffer(live_docs),
+                                                  len(live_docs) if live_docs is not None else 0)
+
+    def close_search_cursor(self, cursor_ptr):
+        if cursor_ptr: self.lib.close_search_cursor(cursor_ptr)
+
+    @contextmanager
+    def managed_search_cursor(self, cursor_ptr):
+        """Closes a cursor from open_search_cursor or open_mapped_search_cursor on exit."""
+        try:
+            yield cursor_ptr
+        finally:
+            self.close_search_cursor(cursor_ptr)
+
+    def search_cursor_count(self, cursor_ptr) -> int: return self.lib.search_cursor_count(cursor_ptr)
+    def search_cursor_seek(self, cursor_ptr, offset: int): self.lib.search_cursor_seek(cursor_ptr, offset)
+
+    def search_cursor_next(self, cursor_ptr, max_count: int) -> list:
+        """The next (at most max_count) matching ids, ascending; an empty list once the cursor is exhausted."""
+        c_int_arr = self.lib.search_cursor_next(cursor_ptr, max_count)
+        py_list = c_int_arr.ids[:c_int_arr.count] if c_int_arr.count else []
+        self.lib.free_int_array(c_int_arr)
+        return py_list
+
+    def iter_search_cursor(self, cursor_ptr, chunk_size: int = 1000):
+        """Yields the remaining matches of a cursor in lists of up to chunk_size ids."""
+        while True:
+            chunk = self.search_cursor_next(cursor_ptr, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    # --- Memory-mapped Index Methods ---
+    def save_mapped_index(self, index_ptr, path: str) -> bool:
+        """Writes the in-memory index in the immutable format read by open_mapped_index."""
+        return self.lib.save_index_mapped(index_ptr, path.encode('utf-8')) == 0
+
+    def open_mapped_index(self, path: str):
+        """Maps an index file without copying it. Returns None if the file is missing or invalid."""
+        index_ptr = self.lib.open_mapped_index(path.encode('utf-8'))
+        return index_ptr if index_ptr else None
+
+    def close_mapped_index(self, index_ptr):
+        if index_ptr: self.lib.close_mapped_index(index_ptr)
+
+    @contextmanager
+    def managed_mapped_index(self, path: str):
+        index_ptr = self.open_mapped_index(path)
+        try:
+            yield index_ptr
+        finally:
+            self.close_mapped_index(index_ptr)
+
+    def merge_mapped_indexes(self, paths: list, out_path: str, live_docs: list = None) -> bool:
+        """
+        Merges mapped index files (e.g. per-worker segments) into one mapped index file.
+        `live_docs` optionally gives one live-docs bitmap (or None) per path; deleted documents are dropped.
+        A document held by several inputs is taken from the last of them.
+        """
+        c_paths = (ctypes.c_char_p * len(paths))(*[p.encode('utf-8') for p in paths])
+        c_live, c_sizes = None, None
+        if live_docs is not None:
+            buffers = [_byte_buffer(bitmap) for bitmap in live_docs]
+            c_live = (ctypes.POINTER(ctypes.c_ubyte) * len(paths))(
+                *[ctypes.cast(b, ctypes.POINTER(ctypes.c_ubyte)) if b is not None else None for b in buffers])
+            c_sizes = (ctypes.c_int * len(paths))(*[len(b) if b is not None else 0 for b in buffers])
+        return self.lib.merge_mapped_indexes(c_paths, c_live, c_sizes, len(paths), out_path.encode('utf-8')) == 0
+
+    def search_mapped_index(self, index_ptr, query: str, live_docs=None) -> list:
+        """Searches a mapped index. With a live-docs bitmap, documents whose bit is clear are left out."""
+        return self.search_mapped_index_ids(index_ptr, query, live_docs).tolist()
+
+    def search_mapped_index_ids(self, index_ptr, query: str, live_docs=None) -> memoryview:
+        """Like search_mapped_index, as an int32 memoryview over the core's result."""
+        if live_docs is None:
+            c_int_arr = self.lib.search_mapped_index(index_ptr, query.encode('utf-8'))
+        else:
+            c_int_arr = self.lib.search_mapped_index_live(index_ptr, query.encode('utf-8'), _byte_buffer(live_docs), len(live_docs))
+        return self._int_array_view(c_int_arr)
+
+    def count_mapped_index_matches(self, index_ptr, query: str, live_docs=None) -> int:
+        return self.lib.count_mapped_index_matches(index_ptr, query.encode('utf-8'), _byte_buffer(live_docs),
+                                                   len(live_docs) if live_docs is not None else 0)
+
+    def search_mapped_index_ranked(self, index_ptr, query: str, k: int, live_docs=None) -> list:
+        """Returns up to k (doc_id, score) pairs ranked by BM25, best first. Negated terms are not scored."""
+        ids, scores = self.search_mapped_index_ranked_arrays(index_ptr, query, k, live_docs)
+        return list(zip(ids.tolist(), scores.tolist()))
+
+    def search_mapped_index_ranked_arrays(self, index_ptr, query: str, k: int, live_docs=None) -> tuple:
+        """Like search_mapped_index_ranked, as (ids, scores): int32 and float32 memoryviews over the core's result."""
+        c_live = _byte_buffer(live_docs)
+        c_scored = self.lib.search_mapped_index_ranked(index_ptr, query.encode('utf-8'), k, c_live, len(live_docs) if live_docs is not None else 0)
+        owner = _CoreResult(c_scored, self.lib.free_scored_array)
+        return (_core_view(owner, c_scored.ids, ctypes.c_int, c_scored.count),
+                _core_view(owner, c_scored.scores, ctypes.c_float, c_scored.count))
+
+    def get_mapped_term_stats(self, index_ptr, live_docs=None) -> list:
+        """
+        (term, document frequency, collection frequency) for every term of a mapped index, in byte order
+        of the terms. Read from the dictionary; with a live-docs bitmap deleted documents are not counted.
+        """
+        terms, doc_freqs, collection_freqs = self.get_mapped_term_stats_columns(index_ptr, live_docs)
+        return list(zip(terms, doc_freqs.tolist(), collection_freqs.tolist()))
+
+    def get_mapped_term_stats_columns(self, index_ptr, live_docs=None) -> tuple:
+        """
+        Like get_mapped_term_stats, as columns: (terms, doc_freqs, collection_freqs), a list of str and
+        int32/uint64 memoryviews over the core's result. The terms are decoded in one run.
+        """
+        c_stats = self.lib.get_mapped_term_stats(index_ptr, _byte_buffer(live_docs), len(live_docs) if live_docs is not None else 0)
+        owner = _CoreResult(c_stats, self.lib.free_term_stats_array)
+        terms = _decode_strings(_core_view(owner, c_stats.terms, ctypes.c_ubyte, c_stats.terms_size), c_stats.count)
+        return (terms, _core_view(owner, c_stats.doc_freqs, ctypes.c_int, c_stats.count),
+                _core_view(owner, c_stats.collection_freqs, ctypes.c_ulonglong, c_stats.count))
+
+    def set_postings_cache_limit(self, index_ptr, max_bytes: int):
+        """Sets the byte budget of the handle's cache of decoded posting lists; 0 disables it."""
+        self.lib.set_postings_cache_limit(index_ptr, max_bytes)
+
+    def postings_cache_stats(self, index_ptr) -> dict:
+        stats = self.lib.get_postings_cache_stats(index_ptr)
+        return {name: getattr(stats, name) for name, _ in PostingsCacheStats._fields_}
+
+    # --- Term Dictionary Methods ---
+    @contextmanager
+    def managed_term_dictionary(self):
+        dictionary_ptr = self.lib.create_term_dictionary()
+        try:
+            yield dictionary_ptr
+        finally:
+            self.lib.destroy_term_dictionary(dictionary_ptr)
+
+    def term_dictionary_size(self, dictionary_ptr) -> int: return self.lib.term_dictionary_size(dictionary_ptr)
+
+    def encode_terms(self, dictionary_ptr, stems: list) -> bytes:
+        """The ids of the stems, packed as little-endian uint32; unseen stems get the next free ids."""
+        if not stems: return b""
+        buffer = "\0".join(stems).encode('utf-8') + b"\0"
+        ids = array('I', bytes(4 * len(stems)))
+        address, _ = ids.buffer_info()
+        self.lib.encode_terms(dictionary_ptr, buffer, len(stems), len(buffer), ctypes.cast(address, ctypes.POINTER(ctypes.c_uint)))
+        if sys.byteorder != 'little': ids.byteswap()
+        return ids.tobytes()
+
+    def get_dictionary_terms(self, dictionary_ptr, first_id: int = 0) -> list:
+        """The terms with ids first_id onwards, in id order, decoded in one run."""
+        c_text = self.lib.get_dictionary_terms(dictionary_ptr, first_id)
+        try: return _decode_strings(ctypes.string_at(c_text.text, c_text.size), c_text.count)
+        finally: self.lib.free_token_text(c_text)
 
     # --- Zipf Methods ---
     @contextmanager
@@ -80,8 +439,16 @@ class CoreBridge:
         self.lib.add_stems_to_freq_map(map_ptr, StringArray(c_stems, len(stems)))
     
     def get_freq_map_as_list(self, map_ptr) -> list:
-        c_freq_arr = self.lib.get_freq_map_as_array(map_ptr)
-        py_list = [{'stem': c_freq_arr.pairs[i].stem.decode('utf-8'), 'frequency': c_freq_arr.pairs[i].frequency} for i in range(c_freq_arr.count)]
-        self.lib.free_freq_array(c_freq_arr)
-        return py_list
+        stems, frequencies = self.get_freq_map_columns(map_ptr)
+        return [{'stem': stem, 'frequency': frequency} for stem, frequency in zip(stems, frequencies.tolist())]
+
+    def get_freq_map_columns(self, map_ptr) -> tuple:
+        """
+        (stems, frequencies) by descending frequency, then stem: the stems decoded in one run and the
+        frequencies as an int32 memoryview over the core's result.
+        """
+        c_columns = self.lib.get_freq_map_columns(map_ptr)
+        owner = _CoreResult(c_columns, self.lib.free_freq_columns)
+        stems = _decode_strings(_core_view(owner, c_columns.stems, ctypes.c_ubyte, c_columns.stems_size), c_columns.count)
+        return stems, _core_view(owner, c_columns.frequencies, ctypes.c_int, c_columns.count)
 
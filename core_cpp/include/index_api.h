@@ -3,16 +3,54 @@
 
 #include "core_api.h" // For CORE_API macro
 
+// Thread safety: the search, count, cursor-opening and cache functions only read an index,
+// so any number of threads may call them on the same index at once (the postings cache of a
+// mapped index has its own lock). Building, saving, merging or freeing an index must not
+// overlap with anything else on it, and a SearchCursor belongs to one thread at a time.
+
 // Opaque pointer to the internal index structure.
 // Python will only ever see this as a generic pointer.
 typedef struct InvertedIndex InvertedIndex;
 
+// Opaque pointer to a read-only index memory-mapped from an immutable file.
+typedef struct MappedIndex MappedIndex;
+
+// Opaque pointer to the evaluated matches of a query, read in chunks.
+typedef struct SearchCursor SearchCursor;
+
+// Opaque pointer to a dictionary numbering stems 0, 1, 2, ... in the order they were first seen.
+typedef struct TermDictionary TermDictionary;
+
 // A struct to represent an array of integers, returned from C++ to Python.
 typedef struct {
     int* ids;
     int count;
 } IntArray;
 
+// Ranked search results: ids[i] scored scores[i], best first.
+typedef struct {
+    int* ids;
+    float* scores;
+    int count;
+} ScoredArray;
+
+// Counters of a mapped index's postings cache.
+typedef struct {
+    unsigned long long hits;
+    unsigned long long misses;
+    unsigned long long entries;
+    unsigned long long bytes;
+} PostingsCacheStats;
+
+// Corpus statistics of the terms of a mapped index, in dictionary (byte) order.
+typedef struct {
+    char* terms;                          // `count` NUL-terminated UTF-8 terms, back to back.
+    int* doc_freqs;                       // Documents holding each term.
+    unsigned long long* collection_freqs; // Occurrences of each term.
+    int count;
+    int terms_size;                       // Size of `terms` in bytes.
+} TermStatsArray;
+
 extern "C" {
     /**
      * @brief Creates a new, empty inverted index in memory.
@@ -20,6 +58,14 @@ extern "C" {
      */
     CORE_API InvertedIndex* create_index();
 
+    /**
+     * @brief Creates a new, empty inverted index that also records where each term occurs.
+     * The position of a stem is its index in the document's stem list. Positions let
+     * phrase and NEAR queries match exactly; save_index_to_file does not keep them.
+     * @return A pointer to the new index. Must be freed with destroy_index.
+     */
+    CORE_API InvertedIndex* create_positional_index();
+
     /**
      * @brief Adds a document's stems to the index.
      * @param index Pointer to the index.
@@ -28,6 +74,68 @@ extern "C" {
      */
     CORE_API void add_document_to_index(InvertedIndex* index, int doc_id, StringArray stems);
 
+    /**
+     * @brief Adds a batch of documents to the index in one call.
+     * The stems of all documents are packed into one buffer of NUL-terminated UTF-8 strings;
+     * document d owns the stems numbered stem_offsets[d] .. stem_offsets[d + 1] - 1.
+     * @param index Pointer to the index.
+     * @param num_docs Number of documents in the batch.
+     * @param doc_ids num_docs document IDs.
+     * @param stem_offsets num_docs + 1 prefix sums of the per-document stem counts.
+     * @param stems_buffer The packed stems.
+     * @param buffer_size Size of stems_buffer in bytes.
+     */
+    CORE_API void add_documents_to_index(InvertedIndex* index, int num_docs, const int* doc_ids,
+                                         const int* stem_offsets, const char* stems_buffer, int buffer_size);
+
+    /**
+     * @brief Creates an empty term dictionary.
+     * @return A pointer to the dictionary. Must be freed with destroy_term_dictionary.
+     */
+    CORE_API TermDictionary* create_term_dictionary();
+
+    /**
+     * @brief Returns the number of terms in a dictionary; their ids are 0 .. size - 1.
+     */
+    CORE_API int term_dictionary_size(const TermDictionary* dictionary);
+
+    /**
+     * @brief Maps stems to their ids, giving unseen stems the next free ids.
+     * Loading a saved dictionary is encoding its terms in id order.
+     * @param dictionary Pointer to the dictionary.
+     * @param terms `count` NUL-terminated UTF-8 stems, back to back.
+     * @param count Number of stems.
+     * @param buffer_size Size of terms in bytes.
+     * @param ids Receives `count` ids.
+     */
+    CORE_API void encode_terms(TermDictionary* dictionary, const char* terms, int count, int buffer_size, unsigned int* ids);
+
+    /**
+     * @brief Returns the terms with ids first_id .. size - 1, in id order.
+     * @return A TokenText. Must be freed with free_token_text.
+     */
+    CORE_API TokenText get_dictionary_terms(const TermDictionary* dictionary, int first_id);
+
+    /**
+     * @brief Frees a term dictionary.
+     */
+    CORE_API void destroy_term_dictionary(TermDictionary* dictionary);
+
+    /**
+     * @brief Like add_documents_to_index, for documents given as term ids of a dictionary.
+     * Each distinct id is looked up in the index's term table once per index, not once per occurrence.
+     * Ids the dictionary does not hold are skipped, but still take up a position, and counted.
+     * @param index Pointer to the index.
+     * @param dictionary The dictionary the ids were encoded with; always the same one for an index.
+     * @param num_docs Number of documents in the batch.
+     * @param doc_ids num_docs document IDs.
+     * @param term_offsets num_docs + 1 offsets into term_ids; document d owns term_ids[term_offsets[d]] onwards.
+     * @param term_ids The term ids of all documents, back to back.
+     * @return The number of ids skipped because the dictionary does not hold them; 0 if all were indexed.
+     */
+    CORE_API int add_encoded_documents_to_index(InvertedIndex* index, const TermDictionary* dictionary, int num_docs,
+                                                const int* doc_ids, const int* term_offsets, const unsigned int* term_ids);
+
     /**
      * @brief Saves the index to a binary file.
      * @param index Pointer to the index.
@@ -45,13 +153,67 @@ extern "C" {
 
     /**
      * @brief Performs a boolean search query on the index.
-     * The query string should be simple for now, e.g., "word1 AND word2 OR word3 NOT word4".
+     * Supports AND, OR, NOT (unary, or binary as "AND NOT") and parentheses, with the precedence
+     * NOT > AND > OR; adjacent terms are ANDed, e.g., "word1 (word2 OR word3) NOT word4".
+     * A quoted phrase ("word1 word2") matches consecutive positions and "word1 NEAR/k word2"
+     * matches terms at most k positions apart; in an index without positions both act as AND.
+     * Conjunctions are evaluated rarest term first and negations only filter their results,
+     * so a query made only of negations matches nothing.
      * @param index Pointer to the index.
      * @param query The boolean query string.
      * @return An IntArray of matching document IDs. Must be freed with free_int_array.
      */
     CORE_API IntArray search_index(const InvertedIndex* index, const char* query);
 
+    /**
+     * @brief Counts the documents matching a boolean query without returning them.
+     * @param index Pointer to the index.
+     * @param query The boolean query string, as for search_index.
+     * @return The number of matching documents.
+     */
+    CORE_API int count_index_matches(const InvertedIndex* index, const char* query);
+
+    /**
+     * @brief Opens a cursor that hands out the IDs matching a boolean query in chunks.
+     * The query is evaluated lazily: seeking and reading walk the posting lists (skipping
+     * where they can) only as far as the matches asked for, so a first page of a broad query
+     * costs little more than the page itself. The cursor reads the index while it is open,
+     * so it must be closed before the index is destroyed.
+     * @param index Pointer to the index.
+     * @param query The boolean query string, as for search_index.
+     * @return A cursor positioned at the first match. Must be freed with close_search_cursor.
+     */
+    CORE_API SearchCursor* open_search_cursor(const InvertedIndex* index, const char* query);
+
+    /**
+     * @brief Returns the total number of matches of a cursor, whatever its position.
+     * The first call counts the matches without collecting them, unless the cursor has
+     * already been read to the end.
+     * @param cursor Pointer to the cursor.
+     */
+    CORE_API int search_cursor_count(const SearchCursor* cursor);
+
+    /**
+     * @brief Moves a cursor to the match with the given rank (0 is the first; past the end is allowed).
+     * @param cursor Pointer to the cursor.
+     * @param offset Number of matches to skip from the start.
+     */
+    CORE_API void search_cursor_seek(SearchCursor* cursor, int offset);
+
+    /**
+     * @brief Returns the next matches of a cursor, in ascending ID order, and advances past them.
+     * @param cursor Pointer to the cursor.
+     * @param max_count Maximum number of IDs to return.
+     * @return An IntArray, empty once the cursor is exhausted. Must be freed with free_int_array.
+     */
+    CORE_API IntArray search_cursor_next(SearchCursor* cursor, int max_count);
+
+    /**
+     * @brief Frees a cursor returned by open_search_cursor or open_mapped_search_cursor.
+     * @param cursor Pointer to the cursor.
+     */
+    CORE_API void close_search_cursor(SearchCursor* cursor);
+
     /**
      * @brief Destroys the index and frees all associated memory.
      * @param index Pointer to the index to be destroyed.
@@ -63,6 +225,151 @@ extern "C" {
      * @param arr The IntArray to free.
      */
     CORE_API void free_int_array(IntArray arr);
+
+    /**
+     * @brief Saves the index in the immutable, memory-mappable format.
+     * The file holds a header, a term dictionary sorted by key, the document lengths,
+     * contiguous sorted postings with term frequencies and, for a positional index, the
+     * compressed positions in a section of their own.
+     * @param index Pointer to the index.
+     * @param path Path to the file.
+     * @return 0 on success, -1 on error.
+     */
+    CORE_API int save_index_mapped(const InvertedIndex* index, const char* path);
+
+    /**
+     * @brief Maps an index file written by save_index_mapped into memory.
+     * Nothing is copied: the dictionary and postings are read in place from the page cache,
+     * so several processes mapping the same file share one copy.
+     * @param path Path to the file.
+     * @return A pointer to the mapped index. Must be freed with close_mapped_index. Returns NULL on error.
+     */
+    CORE_API MappedIndex* open_mapped_index(const char* path);
+
+    /**
+     * @brief Performs a boolean search query on a mapped index.
+     * Accepts the same query syntax as search_index.
+     * @param index Pointer to the mapped index.
+     * @param query The boolean query string.
+     * @return An IntArray of matching document IDs. Must be freed with free_int_array.
+     */
+    CORE_API IntArray search_mapped_index(const MappedIndex* index, const char* query);
+
+    /**
+     * @brief Performs a boolean search query on a mapped index segment, skipping deleted documents.
+     * @param index Pointer to the mapped index.
+     * @param query The boolean query string.
+     * @param live_docs Bitmap with bit (doc_id % 8) of byte (doc_id / 8) set for every document of
+     *        the segment that has not been deleted. NULL keeps every document.
+     * @param live_docs_size Size of live_docs in bytes.
+     * @return An IntArray of matching document IDs. Must be freed with free_int_array.
+     */
+    CORE_API IntArray search_mapped_index_live(const MappedIndex* index, const char* query,
+                                               const unsigned char* live_docs, int live_docs_size);
+
+    /**
+     * @brief Counts the documents of a mapped index matching a boolean query without returning them.
+     * @param index Pointer to the mapped index.
+     * @param query The boolean query string.
+     * @param live_docs Live-docs bitmap as for search_mapped_index_live, or NULL.
+     * @param live_docs_size Size of live_docs in bytes.
+     * @return The number of matching live documents.
+     */
+    CORE_API int count_mapped_index_matches(const MappedIndex* index, const char* query,
+                                            const unsigned char* live_docs, int live_docs_size);
+
+    /**
+     * @brief Opens a lazy cursor over the matches of a boolean query on a mapped index (see
+     * open_search_cursor). It must be closed before the mapped index is.
+     * @param index Pointer to the mapped index.
+     * @param query The boolean query string.
+     * @param live_docs Live-docs bitmap as for search_mapped_index_live, or NULL. It is copied,
+     * so the caller may free it once the cursor is open.
+     * @param live_docs_size Size of live_docs in bytes.
+     * @return A cursor positioned at the first match. Must be freed with close_search_cursor.
+     */
+    CORE_API SearchCursor* open_mapped_search_cursor(const MappedIndex* index, const char* query,
+                                                     const unsigned char* live_docs, int live_docs_size);
+
+    /**
+     * @brief Returns the k documents of a mapped index that score best for a query under BM25.
+     * Every term of the query except the negated ones is scored, and a document matching any
+     * of them is a candidate; boolean structure is otherwise ignored. Block-max WAND skips the
+     * documents that cannot reach the current top k, so the cost grows with k rather than with
+     * the number of matching documents.
+     * @param index Pointer to the mapped index.
+     * @param query The query string, in the syntax of search_index.
+     * @param k Maximum number of results.
+     * @param live_docs Live-docs bitmap as for search_mapped_index_live, or NULL.
+     * @param live_docs_size Size of live_docs in bytes.
+     * @return A ScoredArray, best first. Must be freed with free_scored_array.
+     */
+    CORE_API ScoredArray search_mapped_index_ranked(const MappedIndex* index, const char* query, int k,
+                                                    const unsigned char* live_docs, int live_docs_size);
+
+    /**
+     * @brief Frees a ScoredArray returned by search_mapped_index_ranked.
+     * @param arr The ScoredArray to free.
+     */
+    CORE_API void free_scored_array(ScoredArray arr);
+
+    /**
+     * @brief Merges several mapped index files into one.
+     * Dictionaries are combined with a k-way merge and the postings of a term are united,
+     * so the inputs may cover disjoint or overlapping document ranges. A document live in
+     * several inputs is taken from the last of them, postings and length alike. Positions are
+     * kept if every input has them.
+     * @param paths Paths of the mapped index files to merge.
+     * @param live_docs Per-input live-docs bitmaps (see search_mapped_index_live); documents whose
+     *        bit is clear are dropped. The array itself or any entry may be NULL to keep everything.
+     * @param live_docs_sizes Sizes of the bitmaps in bytes.
+     * @param num_paths Number of paths.
+     * @param out_path Path of the merged file; may not be one of the inputs.
+     * @return 0 on success, -1 on error.
+     */
+    CORE_API int merge_mapped_indexes(const char* const* paths, const unsigned char* const* live_docs,
+                                      const int* live_docs_sizes, int num_paths, const char* out_path);
+
+    /**
+     * @brief Returns the document and collection frequency of every term of a mapped index.
+     * Both are stored in the dictionary, so without deletions this reads no postings at all;
+     * with a live-docs bitmap the postings are decoded and deleted documents are not counted.
+     * Terms left with no live document are omitted.
+     * @param index Pointer to the mapped index.
+     * @param live_docs Live-docs bitmap as for search_mapped_index_live, or NULL.
+     * @param live_docs_size Size of live_docs in bytes.
+     * @return The statistics. Must be freed with free_term_stats_array.
+     */
+    CORE_API TermStatsArray get_mapped_term_stats(const MappedIndex* index, const unsigned char* live_docs, int live_docs_size);
+
+    /**
+     * @brief Frees a TermStatsArray returned by get_mapped_term_stats.
+     * @param arr The TermStatsArray to free.
+     */
+    CORE_API void free_term_stats_array(TermStatsArray arr);
+
+    /**
+     * @brief Sets the memory budget of a mapped index's postings cache.
+     * Boolean searches keep the decoded doc ids of long posting lists (hot terms) in a
+     * per-handle LRU cache, so the same terms are not decoded again by later queries.
+     * The cache starts with a 16 MiB budget.
+     * @param index Pointer to the mapped index.
+     * @param max_bytes New budget in bytes; 0 disables the cache and empties it.
+     */
+    CORE_API void set_postings_cache_limit(MappedIndex* index, long long max_bytes);
+
+    /**
+     * @brief Returns the hit/miss counters and the current size of a mapped index's postings cache.
+     * @param index Pointer to the mapped index.
+     * @return The counters. Only lookups of lists long enough to be cached are counted.
+     */
+    CORE_API PostingsCacheStats get_postings_cache_stats(const MappedIndex* index);
+
+    /**
+     * @brief Unmaps the index file and frees the handle.
+     * @param index Pointer to the mapped index.
+     */
+    CORE_API void close_mapped_index(MappedIndex* index);
 }
 
 #endif // INDEX_API_H
@@ -9,17 +9,107 @@ typedef struct {
     int count;
 } StringArray;
 
+// Tokens and stems of a batch of documents, packed into one arena.
+// Every token and stem is a NUL-terminated string inside `arena`. The tokens of a
+// document are stored back to back, followed by its stems, so each half of a
+// document can be decoded as one run. Free with free_token_batch.
+typedef struct {
+    char* arena;
+    int* token_offsets; // Byte offsets of the tokens in arena, plus a final arena_size.
+    int* stem_offsets;  // Byte offsets of the matching stems in arena, plus a final arena_size.
+    int* doc_offsets;   // num_docs + 1 prefix sums of the per-document token counts.
+    int num_tokens;
+    int num_docs;
+    int arena_size;
+} TokenBatch;
+
+// Tokens of a text (or of one chunk of a token stream) as byte offsets. `text` holds the
+// normalized bytes [base, base + size) of the input: lower-cased, with "ё" folded to "е",
+// byte for byte the same length as the input. Token i starts at input offset starts[i],
+// which is text[starts[i] - base], and is lengths[i] bytes long. Free with free_token_spans.
+typedef struct {
+    char* text;
+    long long base;
+    long long* starts;
+    int* lengths;
+    int count;
+    int size;
+} TokenSpans;
+
+// Tokens of a text stored back to back in one buffer, each followed by '\0', so they can
+// be decoded as one run. Free with free_token_text.
+typedef struct {
+    char* text;
+    int count;
+    int size;
+} TokenText;
+
+// Opaque state of a tokenizer fed in chunks.
+typedef struct TokenStream TokenStream;
+
 extern "C" {
     /**
      * @brief Tokenizes a given text into words.
      */
     CORE_API StringArray tokenize(const char* text);
+
+    /**
+     * @brief Tokenizes len bytes of UTF-8 text into a single buffer of NUL-terminated tokens.
+     */
+    CORE_API TokenText tokenize_joined(const char* text, int len);
+
+    /**
+     * @brief Frees a TokenText returned by tokenize_joined.
+     */
+    CORE_API void free_token_text(TokenText tokens);
+
+    /**
+     * @brief Tokenizes len bytes of UTF-8 text in one pass and returns token offsets
+     * into a normalized copy of it instead of one string per token.
+     */
+    CORE_API TokenSpans tokenize_spans(const char* text, int len);
+
+    /**
+     * @brief Creates a tokenizer that is fed a text in chunks. Close with close_token_stream.
+     */
+    CORE_API TokenStream* open_token_stream();
+
+    /**
+     * @brief Tokenizes the next chunk of a stream; offsets are counted from the start of the stream.
+     * A word (or UTF-8 sequence) cut by the end of the chunk is returned with the next one;
+     * pass last = 1 with the final chunk to complete it.
+     */
+    CORE_API TokenSpans token_stream_feed(TokenStream* stream, const char* chunk, int len, int last);
+
+    /**
+     * @brief Frees a token stream.
+     */
+    CORE_API void close_token_stream(TokenStream* stream);
+
+    /**
+     * @brief Frees a TokenSpans returned by tokenize_spans or token_stream_feed.
+     */
+    CORE_API void free_token_spans(TokenSpans spans);
     
     /**
      * @brief Stems a single word using a non-STL implementation.
      */
     CORE_API char* stem_word_no_stl(const char* word);
     
+    /**
+     * @brief Tokenizes and stems a batch of documents in one call.
+     * Allocates one arena and three offset arrays for the whole batch instead of one string per token.
+     * @param texts num_docs NUL-terminated UTF-8 texts stored back to back.
+     * @param num_docs Number of texts.
+     * @param buffer_size Size of texts in bytes.
+     */
+    CORE_API TokenBatch tokenize_and_stem_batch(const char* texts, int num_docs, int buffer_size);
+
+    /**
+     * @brief Frees a TokenBatch returned by tokenize_and_stem_batch.
+     */
+    CORE_API void free_token_batch(TokenBatch batch);
+
     /**
      * @brief Frees the memory allocated for a StringArray.
      */
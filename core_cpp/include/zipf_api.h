@@ -18,6 +18,15 @@ typedef struct {
     int count;
 } FreqArray;
 
+// The same pairs as two columns: stems[] holds every stem followed by '\0', in the order of
+// frequencies[], so the stems can be decoded as one run. Free with free_freq_columns.
+typedef struct {
+    char* stems;
+    int* frequencies;
+    int count;
+    int stems_size;
+} FreqColumns;
+
 extern "C" {
     /**
      * @brief Creates a new, empty frequency map in memory.
@@ -36,6 +45,13 @@ extern "C" {
      */
     CORE_API FreqArray get_freq_map_as_array(FrequencyMap* map);
 
+    /**
+     * @brief Converts the frequency map to columns, sorted by frequency in descending order
+     * and then by stem bytes.
+     * The caller is responsible for freeing the returned FreqColumns with free_freq_columns.
+     */
+    CORE_API FreqColumns get_freq_map_columns(FrequencyMap* map);
+
     /**
      * @brief Destroys the frequency map and frees all associated memory.
      */
@@ -45,6 +61,11 @@ extern "C" {
      * @brief Frees a FreqArray returned by the library.
      */
     CORE_API void free_freq_array(FreqArray arr);
+
+    /**
+     * @brief Frees a FreqColumns returned by the library.
+     */
+    CORE_API void free_freq_columns(FreqColumns columns);
 }
 
 #endif // ZIPF_API_H
@@ -1,4 +1,6 @@
 #include "core_api.h"
+#include "russian_stemmer.h"
+#include "token_scanner.h"
 #include <vector>
 #include <string>
 #include <cctype>
@@ -29,126 +31,194 @@ void free_single_string(char* str) {
 
 
 // =================================================================================
-// Tokenizer Implementation (with STL)
+// Tokenizer Implementation (table-driven scanner, see token_scanner.h)
 // =================================================================================
-namespace { // Anonymous namespace for internal helpers
-    // Corrected version
-void to_lower_utf8_stl(std::string& s) {
-    for (size_t i = 0; i < s.length(); ++i) {
-        unsigned char c1 = s[i];
-        if (c1 >= 0xD0 && c1 <= 0xDF && i + 1 < s.length()) { // Cyrillic character
-            unsigned char c2 = s[i+1];
-            if (c1 == 0xD0 && c2 >= 0x90 && c2 <= 0x9F) { // А-П
-                s[i+1] = s[i+1] + 32;
-            } else if (c1 == 0xD0 && c2 >= 0xA0 && c2 <= 0xAF) { // Р-Я
-                s[i] = 0xD1;
-                s[i+1] = s[i+1] - 32;
-            } else if (c1 == 0xD1 && c2 >= 0x80 && c2 <= 0x8F) { // а-п already lower
-                 // do nothing
-            } else if (c1 == 0xD1 && c2 == 0x91) { // Ё -> ё
-                 s[i+1] = 0x91; // ё is 0xD1 0x91, Ё is 0xD0 0x81 -- this case is complex
-            }
-            i++; // skip second byte
-        } else { // Not a Cyrillic char, use standard tolower
-            s[i] = std::tolower(c1);
-        }
+namespace {
+// Calls emit(word, word_len) for every normalized word in text[0, len).
+template <typename Emit>
+void for_each_token(const char* text, size_t len, Emit emit) {
+    token_scanner::Scanner scanner;
+    std::string normalized;
+    std::vector<long long> starts;
+    std::vector<int> lengths;
+    long long base;
+    scanner.feed(text, len, true, normalized, &base, starts, lengths);
+    for (size_t t = 0; t < starts.size(); ++t) emit(normalized.data() + (starts[t] - base), (size_t)lengths[t]);
+}
+
+TokenSpans to_token_spans(const std::string& normalized, long long base,
+                          const std::vector<long long>& starts, const std::vector<int>& lengths) {
+    TokenSpans spans;
+    spans.count = (int)starts.size();
+    spans.base = base;
+    spans.size = (int)normalized.size();
+    spans.text = (char*)malloc(normalized.size() + 1);
+    memcpy(spans.text, normalized.data(), normalized.size());
+    spans.starts = (long long*)malloc(sizeof(long long) * (starts.size() + 1));
+    spans.lengths = (int*)malloc(sizeof(int) * (lengths.size() + 1));
+    if (spans.count) {
+        memcpy(spans.starts, starts.data(), sizeof(long long) * starts.size());
+        memcpy(spans.lengths, lengths.data(), sizeof(int) * lengths.size());
     }
+    return spans;
 }
 }
 
+struct TokenStream {
+    token_scanner::Scanner scanner;
+};
+
 StringArray tokenize(const char* text) {
     if (!text) return {nullptr, 0};
 
-    std::vector<std::string> tokens;
-    std::string current_word;
-    std::string input(text);
-
-    for (size_t i = 0; i < input.length(); ) {
-        size_t char_len = 1;
-        unsigned char c = input[i];
-        bool is_cyrillic = false;
-        if (c >= 0xD0 && c <= 0xDF && i + 1 < input.length()) {
-            char_len = 2;
-            is_cyrillic = true;
-        }
-
-        if (isalpha(c) || is_cyrillic) {
-            current_word += input.substr(i, char_len);
-        } else {
-            if (!current_word.empty()) {
-                to_lower_utf8_stl(current_word);
-                tokens.push_back(current_word);
-                current_word.clear();
-            }
-        }
-        i += char_len;
-    }
-    if (!current_word.empty()) {
-        to_lower_utf8_stl(current_word);
-        tokens.push_back(current_word);
-    }
+    std::vector<char*> tokens;
+    for_each_token(text, strlen(text), [&tokens](const char* word, size_t word_len) {
+        char* token = (char*)malloc(word_len + 1);
+        memcpy(token, word, word_len);
+        token[word_len] = '\0';
+        tokens.push_back(token);
+    });
 
     StringArray result;
-    result.count = tokens.size();
+    result.count = (int)tokens.size();
     result.strings = (char**)malloc(result.count * sizeof(char*));
-    for (int i = 0; i < result.count; ++i) {
-        result.strings[i] = (char*)malloc(tokens[i].length() + 1);
-        strcpy(result.strings[i], tokens[i].c_str());
-    }
+    if (result.count) memcpy(result.strings, tokens.data(), result.count * sizeof(char*));
     return result;
 }
 
+TokenText tokenize_joined(const char* text, int len) {
+    std::string joined;
+    int count = 0;
+    for_each_token(text ? text : "", text && len > 0 ? (size_t)len : 0, [&](const char* word, size_t word_len) {
+        joined.append(word, word_len);
+        joined.push_back('\0');
+        ++count;
+    });
+    TokenText tokens;
+    tokens.count = count;
+    tokens.size = (int)joined.size();
+    tokens.text = (char*)malloc(joined.size() + 1);
+    memcpy(tokens.text, joined.data(), joined.size());
+    return tokens;
+}
+
+void free_token_text(TokenText tokens) {
+    free(tokens.text);
+}
+
+TokenSpans tokenize_spans(const char* text, int len) {
+    TokenStream stream;
+    return token_stream_feed(&stream, text, len, 1);
+}
+
+TokenStream* open_token_stream() {
+    return new TokenStream();
+}
+
+TokenSpans token_stream_feed(TokenStream* stream, const char* chunk, int len, int last) {
+    std::string normalized;
+    std::vector<long long> starts;
+    std::vector<int> lengths;
+    long long base;
+    stream->scanner.feed(chunk ? chunk : "", chunk && len > 0 ? (size_t)len : 0, last != 0, normalized, &base, starts, lengths);
+    return to_token_spans(normalized, base, starts, lengths);
+}
+
+void close_token_stream(TokenStream* stream) {
+    delete stream;
+}
+
+void free_token_spans(TokenSpans spans) {
+    free(spans.text);
+    free(spans.starts);
+    free(spans.lengths);
+}
+
 
 // =================================================================================
-// Stemmer Implementation (NO STL)
+// Stemmer Implementation (Snowball Russian, see russian_stemmer.cpp)
 // =================================================================================
 namespace { // Anonymous namespace for internal helpers
-    bool ends_with_no_stl(const char* word, const char* suffix) {
-        size_t word_len = strlen(word);
-        size_t suffix_len = strlen(suffix);
-        if (word_len < suffix_len) return false;
-        return strcmp(word + word_len - suffix_len, suffix) == 0;
+    // Stemming only ever strips a suffix, so the stem is returned as a prefix length
+    // and callers copy it where they need it.
+    size_t stem_length(const char* word, size_t len) {
+        return cached_stem_length(word, len);
     }
+}
 
-    char* replace_suffix_no_stl(const char* word, const char* old_suffix, const char* new_suffix) {
-        size_t word_len = strlen(word);
-        size_t old_suffix_len = strlen(old_suffix);
-        size_t new_suffix_len = strlen(new_suffix);
-        size_t new_word_len = word_len - old_suffix_len + new_suffix_len;
-        
-        char* new_word = (char*)malloc(new_word_len + 1);
-        strncpy(new_word, word, word_len - old_suffix_len);
-        strcpy(new_word + (word_len - old_suffix_len), new_suffix);
-        new_word[new_word_len] = '\0';
-        return new_word;
+char* stem_word_no_stl(const char* word) {
+    size_t len = word ? strlen(word) : 0;
+    char* result = (char*)malloc(len + 1);
+    if (len) memcpy(result, word, len);
+    // Fold "ё" to "е" (and "Ё" to "Е") as the tokenizer does, so a word stems the same whichever
+    // way it reaches the stemmer. Both are two bytes, so the word keeps its length.
+    for (size_t i = 0; i + 1 < len; ++i) {
+        unsigned char lead = (unsigned char)result[i], cont = (unsigned char)result[i + 1];
+        if (lead == 0xD1 && cont == 0x91) { result[i] = (char)0xD0; result[i + 1] = (char)0xB5; ++i; }
+        else if (lead == 0xD0 && cont == 0x81) { result[i + 1] = (char)0x95; ++i; }
     }
+    size_t stem_len = len ? stem_length(result, len) : 0;
+    result[stem_len] = '\0';
+    return result;
 }
 
-
-// A simplified Porter stemmer for Russian.
-char* stem_word_no_stl(const char* word) {
-    if (!word || strlen(word) == 0) {
-        char* empty = (char*)malloc(1);
-        empty[0] = '\0';
-        return empty;
+// =================================================================================
+// Batch Tokenizer + Stemmer
+// =================================================================================
+TokenBatch tokenize_and_stem_batch(const char* texts, int num_docs, int buffer_size) {
+    TokenBatch batch = {nullptr, nullptr, nullptr, nullptr, 0, 0, 0};
+    if (!texts || num_docs <= 0) return batch;
+
+    std::string arena;
+    std::vector<int> token_offsets, stem_offsets, token_lengths;
+    std::vector<int> doc_offsets(1, 0);
+    const char* p = texts;
+    const char* end = texts + buffer_size;
+    for (int d = 0; d < num_docs; ++d) {
+        size_t len = p < end ? strnlen(p, end - p) : 0;
+        size_t first = token_offsets.size();
+        for_each_token(p, len, [&](const char* word, size_t word_len) {
+            token_offsets.push_back((int)arena.size());
+            token_lengths.push_back((int)word_len);
+            arena.append(word, word_len);
+            arena.push_back('\0');
+        });
+        // The stems of a document follow its tokens, so each half decodes as one NUL-separated run.
+        for (size_t t = first; t < token_offsets.size(); ++t) {
+            arena.reserve(arena.size() + token_lengths[t] + 1); // Keeps `token` valid while appending.
+            const char* token = arena.data() + token_offsets[t];
+            size_t stem_len = stem_length(token, token_lengths[t]);
+            stem_offsets.push_back((int)arena.size());
+            arena.append(token, stem_len);
+            arena.push_back('\0');
+        }
+        doc_offsets.push_back((int)token_offsets.size());
+        p += len + 1;
     }
 
-    char* result = (char*)malloc(strlen(word) + 1);
-    strcpy(result, word);
-
-    // Simple rules for demonstration
-    if (ends_with_no_stl(result, "ами")) {
-        char* temp = replace_suffix_no_stl(result, "ами", "");
-        free(result);
-        result = temp;
-    } else if (ends_with_no_stl(result, "ого")) {
-        char* temp = replace_suffix_no_stl(result, "ого", "");
-        free(result);
-        result = temp;
+    batch.num_docs = num_docs;
+    batch.num_tokens = (int)token_offsets.size();
+    batch.arena_size = (int)arena.size();
+    batch.arena = (char*)malloc(arena.size() + 1);
+    memcpy(batch.arena, arena.data(), arena.size());
+    batch.token_offsets = (int*)malloc(sizeof(int) * (batch.num_tokens + 1));
+    batch.stem_offsets = (int*)malloc(sizeof(int) * (batch.num_tokens + 1));
+    batch.doc_offsets = (int*)malloc(sizeof(int) * (num_docs + 1));
+    if (batch.num_tokens) {
+        memcpy(batch.token_offsets, token_offsets.data(), sizeof(int) * batch.num_tokens);
+        memcpy(batch.stem_offsets, stem_offsets.data(), sizeof(int) * batch.num_tokens);
     }
-    // ... more rules would be here in a full implementation
+    batch.token_offsets[batch.num_tokens] = batch.arena_size;
+    batch.stem_offsets[batch.num_tokens] = batch.arena_size;
+    memcpy(batch.doc_offsets, doc_offsets.data(), sizeof(int) * (num_docs + 1));
+    return batch;
+}
 
-    return result;
+void free_token_batch(TokenBatch batch) {
+    free(batch.arena);
+    free(batch.token_offsets);
+    free(batch.stem_offsets);
+    free(batch.doc_offsets);
 }
 
 // =================================================================================
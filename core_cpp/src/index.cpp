@@ -1,23 +1,20 @@
 #include "index_api.h"
 #include "core_api.h"
+#include "index_internal.h"
+#include "query_eval.h"
+#include "search_cursor.h"
 #include <cstdlib>
 #include <cstring>
 #include <cstdio>
-#include <vector>
 #include <string>
-#include <sstream>
+#include <vector>
 #include <algorithm>
-#include <iterator>
-#include <set>
 
 // =================================================================================
 // CUSTOM NON-STL DATA STRUCTURES
 // =================================================================================
-typedef struct { int* data; int size; int capacity; } DynamicIntArray;
-typedef struct HashNode { char* key; DynamicIntArray* doc_ids; struct HashNode* next; } HashNode;
-struct InvertedIndex { HashNode** buckets; int num_buckets; };
-// ... (Implementation of DynamicIntArray and HashTable from previous step remains the same)
-// ... (create_dynamic_array, da_push_back, destroy_dynamic_array, hash, create_index_internal, etc.)
+// Structures are declared in index_internal.h so the mapped index writer can walk them.
+// Terms live in a StringTable (string_table.h); the posting arrays are stored inline in it.
 
 DynamicIntArray* create_dynamic_array() {
     DynamicIntArray* arr = (DynamicIntArray*)malloc(sizeof(DynamicIntArray));
@@ -28,62 +25,135 @@ DynamicIntArray* create_dynamic_array() {
 }
 void da_push_back(DynamicIntArray* arr, int value) {
     if (arr->size == arr->capacity) {
-        arr->capacity *= 2;
+        // Most terms occur in a single document, so inline arrays start empty and small.
+        arr->capacity = arr->capacity ? arr->capacity * 2 : 2;
         arr->data = (int*)realloc(arr->data, sizeof(int) * arr->capacity);
     }
     arr->data[arr->size++] = value;
 }
+// Sets arr[index], growing the array with zeros as needed.
+void da_set(DynamicIntArray* arr, int index, int value) {
+    if (index >= arr->capacity) {
+        int capacity = arr->capacity ? arr->capacity : 8;
+        while (capacity <= index) capacity *= 2;
+        arr->data = (int*)realloc(arr->data, sizeof(int) * capacity);
+        arr->capacity = capacity;
+    }
+    if (index >= arr->size) {
+        memset(arr->data + arr->size, 0, sizeof(int) * (index + 1 - arr->size));
+        arr->size = index + 1;
+    }
+    arr->data[index] = value;
+}
+// Inserts value at position `at`, shifting the tail.
+void da_insert_at(DynamicIntArray* arr, int at, int value) {
+    da_push_back(arr, value);
+    memmove(arr->data + at + 1, arr->data + at, sizeof(int) * (arr->size - 1 - at));
+    arr->data[at] = value;
+}
+// Finds a doc id in sorted postings, inserting it if missing, and returns its position.
+// Documents normally arrive in increasing id order, which makes this an append.
+int da_find_or_insert_sorted(DynamicIntArray* ids, int value, bool* inserted) {
+    *inserted = true;
+    if (ids->size == 0 || ids->data[ids->size - 1] < value) {
+        da_push_back(ids, value);
+        return ids->size - 1;
+    }
+    int at = (int)(std::lower_bound(ids->data, ids->data + ids->size, value) - ids->data);
+    if (ids->data[at] == value) *inserted = false;
+    else da_insert_at(ids, at, value);
+    return at;
+}
 void destroy_dynamic_array(DynamicIntArray* arr) {
     free(arr->data);
     free(arr);
 }
-unsigned int hash_func(const char* key, int num_buckets) {
-    unsigned long hash = 5381;
-    int c;
-    while ((c = *key++)) hash = ((hash << 5) + hash) + c;
-    return hash % num_buckets;
-}
-InvertedIndex* create_index_internal(int num_buckets) {
-    InvertedIndex* index = (InvertedIndex*)malloc(sizeof(InvertedIndex));
-    index->num_buckets = num_buckets;
-    index->buckets = (HashNode**)calloc(num_buckets, sizeof(HashNode*));
+InvertedIndex* create_index_internal(size_t expected_terms) {
+    InvertedIndex* index = new InvertedIndex{StringTable<TermPostings>(expected_terms), create_dynamic_array(), 0, std::vector<long>()};
     return index;
 }
 void destroy_index_internal(InvertedIndex* index) {
-    for (int i = 0; i < index->num_buckets; ++i) {
-        HashNode* current = index->buckets[i];
-        while (current) {
-            HashNode* to_delete = current;
-            current = current->next;
-            free(to_delete->key);
-            destroy_dynamic_array(to_delete->doc_ids);
-            free(to_delete);
-        }
+    for (size_t t = 0; t < index->terms.size(); ++t) {
+        TermPostings& postings = index->terms.value(t);
+        free(postings.doc_ids.data);
+        free(postings.freqs.data);
+        free(postings.positions.data);
+        free(postings.position_starts.data);
     }
-    free(index->buckets);
-    free(index);
+    destroy_dynamic_array(index->doc_lengths);
+    delete index;
 }
 
 
 // =================================================================================
-// SEARCH LOGIC (using STL internally for parsing and set operations)
+// SEARCH LOGIC (query evaluation is shared with the mapped index, see query_eval.h)
 // =================================================================================
 namespace {
-    std::vector<std::string> split_query(const std::string& query) {
-        std::istringstream iss(query);
-        return std::vector<std::string>{std::istream_iterator<std::string>{iss}, std::istream_iterator<std::string>{}};
+    ArrayCursor find_term_ids(const InvertedIndex* index, const std::string& term, bool with_positions) {
+        long t = index->terms.find(term.data(), term.size());
+        if (t < 0) return ArrayCursor();
+        const TermPostings& postings = index->terms.value(t);
+        if (!with_positions || !index->store_positions) return ArrayCursor(postings.doc_ids.data, postings.doc_ids.size);
+        return ArrayCursor(postings.doc_ids.data, postings.doc_ids.size, postings.freqs.data,
+                           postings.positions.data, postings.position_starts.data);
     }
 
-    DynamicIntArray* find_term_ids(const InvertedIndex* index, const std::string& term) {
-        unsigned int bucket_index = hash_func(term.c_str(), index->num_buckets);
-        HashNode* current = index->buckets[bucket_index];
-        while (current) {
-            if (strcmp(current->key, term.c_str()) == 0) {
-                return current->doc_ids;
+    // Lookup for query evaluation: the cursor over a term's postings.
+    struct TermLookup {
+        const InvertedIndex* index;
+        ArrayCursor operator()(const std::string& term, bool with_positions) const {
+            return find_term_ids(index, term, with_positions);
+        }
+    };
+
+    uint32_t term_doc_freq(const InvertedIndex* index, const std::string& term) {
+        return find_term_ids(index, term, false).cost();
+    }
+
+    std::vector<int> matching_ids(const InvertedIndex* index, const char* query) {
+        return query_eval::evaluate_ids(query, TermLookup{index});
+    }
+}
+
+// =================================================================================
+// INDEXING
+// =================================================================================
+namespace {
+    // Returns the number of the term's entry, adding the term with empty postings if it is new.
+    uint32_t find_or_create_term(InvertedIndex* index, const char* stem) {
+        return index->terms.insert(stem, strlen(stem));
+    }
+
+    // A term occurrence: the term's entry number and the position of the stem in the document.
+    // Entry numbers, unlike pointers into the table, stay valid while later stems grow it.
+    typedef std::pair<uint32_t, int> Occurrence;
+
+    // Posts doc_id once to every distinct term of the document, with the number of times the
+    // term occurs (and where, in a positional index). Duplicates are counted here, over the
+    // document's own terms, instead of being looked up in the postings.
+    void post_document(InvertedIndex* index, int doc_id, std::vector<Occurrence>& occurrences) {
+        if (doc_id >= 0) da_set(index->doc_lengths, doc_id, (int)occurrences.size());
+        std::sort(occurrences.begin(), occurrences.end()); // By term, then by position.
+        for (size_t i = 0; i < occurrences.size();) {
+            uint32_t term = occurrences[i].first;
+            TermPostings& postings = index->terms.value(term);
+            size_t run = i + 1;
+            while (run < occurrences.size() && occurrences[run].first == term) ++run;
+
+            bool inserted;
+            int at = da_find_or_insert_sorted(&postings.doc_ids, doc_id, &inserted);
+            int freq = (int)(run - i);
+            if (inserted) da_insert_at(&postings.freqs, at, freq);
+            else postings.freqs.data[at] = freq; // Re-added document.
+            if (index->store_positions) {
+                // Positions are append-only; position_starts (parallel to doc_ids) points into them.
+                int start = postings.positions.size;
+                for (size_t j = i; j < run; ++j) da_push_back(&postings.positions, occurrences[j].second);
+                if (inserted) da_insert_at(&postings.position_starts, at, start);
+                else postings.position_starts.data[at] = start;
             }
-            current = current->next;
+            i = run;
         }
-        return nullptr;
     }
 }
 
@@ -91,30 +161,82 @@ namespace {
 // C API IMPLEMENTATION
 // =================================================================================
 extern "C" {
-    // ... (create_index, add_document_to_index, destroy_index remain the same)
-    InvertedIndex* create_index() { return create_index_internal(10000); }
-    void add_document_to_index(InvertedIndex* index, int doc_id, StringArray stems) { /* ... same as before ... */ 
-        for (int i = 0; i < stems.count; ++i) {
-            const char* stem = stems.strings[i];
-            unsigned int bucket_index = hash_func(stem, index->num_buckets);
-            HashNode* current = index->buckets[bucket_index], *prev = nullptr;
-            while (current != nullptr && strcmp(current->key, stem) != 0) {
-                prev = current; current = current->next;
+    InvertedIndex* create_index() { return create_index_internal(0); }
+    InvertedIndex* create_positional_index() {
+        InvertedIndex* index = create_index_internal(0);
+        index->store_positions = 1;
+        return index;
+    }
+    void add_document_to_index(InvertedIndex* index, int doc_id, StringArray stems) {
+        std::vector<Occurrence> occurrences;
+        occurrences.reserve(stems.count);
+        for (int i = 0; i < stems.count; ++i) occurrences.push_back(Occurrence(find_or_create_term(index, stems.strings[i]), i));
+        post_document(index, doc_id, occurrences);
+    }
+    void add_documents_to_index(InvertedIndex* index, int num_docs, const int* doc_ids,
+                                const int* stem_offsets, const char* stems_buffer, int buffer_size) {
+        std::vector<Occurrence> occurrences; // Reused across documents.
+        const char* p = stems_buffer;
+        const char* end = stems_buffer + buffer_size;
+        for (int d = 0; d < num_docs; ++d) {
+            occurrences.clear();
+            for (int i = stem_offsets[d]; i < stem_offsets[d + 1] && p < end; ++i) {
+                occurrences.push_back(Occurrence(find_or_create_term(index, p), i - stem_offsets[d]));
+                p += strlen(p) + 1;
             }
-            if (current == nullptr) {
-                HashNode* new_node = (HashNode*)malloc(sizeof(HashNode));
-                new_node->key = strdup(stem);
-                new_node->doc_ids = create_dynamic_array();
-                new_node->next = nullptr;
-                da_push_back(new_node->doc_ids, doc_id);
-                if (prev == nullptr) index->buckets[bucket_index] = new_node;
-                else prev->next = new_node;
-            } else {
-                DynamicIntArray* ids = current->doc_ids; bool found = false;
-                for (int j = 0; j < ids->size; ++j) if (ids->data[j] == doc_id) { found = true; break; }
-                if (!found) da_push_back(ids, doc_id);
+            post_document(index, doc_ids[d], occurrences);
+        }
+    }
+    TermDictionary* create_term_dictionary() { return new TermDictionary(); }
+    int term_dictionary_size(const TermDictionary* dictionary) { return (int)dictionary->terms.size(); }
+    void encode_terms(TermDictionary* dictionary, const char* terms, int count, int buffer_size, unsigned int* ids) {
+        const char* p = terms;
+        const char* end = terms + buffer_size;
+        for (int i = 0; i < count && p < end; ++i) {
+            size_t len = strlen(p);
+            ids[i] = dictionary->terms.insert(p, len);
+            p += len + 1;
+        }
+    }
+    TokenText get_dictionary_terms(const TermDictionary* dictionary, int first_id) {
+        size_t first = first_id > 0 ? (size_t)first_id : 0, size = 0;
+        for (size_t t = first; t < dictionary->terms.size(); ++t) size += dictionary->terms.entry(t).key_len + 1;
+        TokenText text;
+        text.count = first < dictionary->terms.size() ? (int)(dictionary->terms.size() - first) : 0;
+        text.size = (int)size;
+        text.text = (char*)malloc(size + 1);
+        char* out = text.text;
+        for (size_t t = first; t < dictionary->terms.size(); ++t) {
+            const StringTable<uint8_t>::Entry& entry = dictionary->terms.entry(t);
+            memcpy(out, entry.key, entry.key_len + 1);
+            out += entry.key_len + 1;
+        }
+        return text;
+    }
+    void destroy_term_dictionary(TermDictionary* dictionary) { delete dictionary; }
+    int add_encoded_documents_to_index(InvertedIndex* index, const TermDictionary* dictionary, int num_docs,
+                                       const int* doc_ids, const int* term_offsets, const unsigned int* term_ids) {
+        std::vector<long>& known = index->dictionary_terms;
+        int rejected = 0;
+        if (known.size() < dictionary->terms.size()) known.resize(dictionary->terms.size(), -1);
+        std::vector<Occurrence> occurrences;
+        for (int d = 0; d < num_docs; ++d) {
+            occurrences.clear();
+            for (int i = term_offsets[d]; i < term_offsets[d + 1]; ++i) {
+                unsigned int id = term_ids[i];
+                if (id >= known.size()) {
+                    ++rejected;
+                    continue;
+                }
+                if (known[id] < 0) {
+                    const StringTable<uint8_t>::Entry& term = dictionary->terms.entry(id);
+                    known[id] = index->terms.insert(term.key, term.key_len);
+                }
+                occurrences.push_back(Occurrence((uint32_t)known[id], i - term_offsets[d]));
             }
+            post_document(index, doc_ids[d], occurrences);
         }
+        return rejected;
     }
     void destroy_index(InvertedIndex* index) { if (index) destroy_index_internal(index); }
     void free_int_array(IntArray arr) { if (arr.ids) free(arr.ids); }
@@ -124,17 +246,16 @@ extern "C" {
         FILE* fp = fopen(path, "wb");
         if (!fp) return -1;
 
-        fwrite(&index->num_buckets, sizeof(int), 1, fp);
-        for (int i = 0; i < index->num_buckets; ++i) {
-            HashNode* current = index->buckets[i];
-            while (current) {
-                int key_len = strlen(current->key);
-                fwrite(&key_len, sizeof(int), 1, fp);
-                fwrite(current->key, sizeof(char), key_len, fp);
-                fwrite(&current->doc_ids->size, sizeof(int), 1, fp);
-                fwrite(current->doc_ids->data, sizeof(int), current->doc_ids->size, fp);
-                current = current->next;
-            }
+        // The leading int used to be the bucket count; it now tells the loader how many terms to expect.
+        int num_terms = (int)index->terms.size();
+        fwrite(&num_terms, sizeof(int), 1, fp);
+        for (int t = 0; t < num_terms; ++t) {
+            const StringTable<TermPostings>::Entry& entry = index->terms.entry(t);
+            int key_len = (int)entry.key_len;
+            fwrite(&key_len, sizeof(int), 1, fp);
+            fwrite(entry.key, sizeof(char), key_len, fp);
+            fwrite(&entry.value.doc_ids.size, sizeof(int), 1, fp);
+            fwrite(entry.value.doc_ids.data, sizeof(int), entry.value.doc_ids.size, fp);
         }
         fclose(fp);
         return 0;
@@ -144,77 +265,58 @@ extern "C" {
         FILE* fp = fopen(path, "rb");
         if (!fp) return nullptr;
 
-        int num_buckets;
-        fread(&num_buckets, sizeof(int), 1, fp);
-        InvertedIndex* index = create_index_internal(num_buckets);
+        int expected_terms = 0; // The bucket count (10000) in files from the chained table.
+        fread(&expected_terms, sizeof(int), 1, fp);
+        InvertedIndex* index = create_index_internal(expected_terms > 0 ? std::min(expected_terms, 1 << 24) : 0);
 
+        std::string key;
         while (!feof(fp)) {
             int key_len, num_ids;
             if (fread(&key_len, sizeof(int), 1, fp) != 1) break;
-            
-            char* key = (char*)malloc(key_len + 1);
-            fread(key, sizeof(char), key_len, fp);
-            key[key_len] = '\0';
-            
+
+            key.resize(key_len);
+            fread(&key[0], sizeof(char), key_len, fp);
+
             fread(&num_ids, sizeof(int), 1, fp);
-            DynamicIntArray* ids = create_dynamic_array();
+            TermPostings& postings = index->terms.value(index->terms.insert(key.data(), key.size()));
+            DynamicIntArray* ids = &postings.doc_ids;
             for(int i=0; i<num_ids; ++i) {
                 int doc_id;
                 fread(&doc_id, sizeof(int), 1, fp);
                 da_push_back(ids, doc_id);
             }
-
-            unsigned int bucket = hash_func(key, num_buckets);
-            HashNode* new_node = (HashNode*)malloc(sizeof(HashNode));
-            new_node->key = key;
-            new_node->doc_ids = ids;
-            new_node->next = index->buckets[bucket];
-            index->buckets[bucket] = new_node;
+            // Files written before postings were kept sorted may hold them in insertion order.
+            if (!std::is_sorted(ids->data, ids->data + ids->size)) std::sort(ids->data, ids->data + ids->size);
+            // This format keeps no frequencies: every term counts once, and a document's
+            // length becomes its number of distinct terms.
+            DynamicIntArray* freqs = &postings.freqs;
+            for (int i = 0; i < ids->size; ++i) {
+                da_push_back(freqs, 1);
+                int doc_id = ids->data[i];
+                if (doc_id < 0) continue;
+                int length = doc_id < index->doc_lengths->size ? index->doc_lengths->data[doc_id] : 0;
+                da_set(index->doc_lengths, doc_id, length + 1);
+            }
+            // This format keeps no positions either, so the loaded index is not positional.
         }
         fclose(fp);
         return index;
     }
 
     IntArray search_index(const InvertedIndex* index, const char* query) {
-        auto tokens = split_query(query);
-        if (tokens.empty()) return {nullptr, 0};
-
-        std::set<int> result_ids;
-        DynamicIntArray* initial_ids = find_term_ids(index, tokens[0]);
-        if (initial_ids) {
-            result_ids.insert(initial_ids->data, initial_ids->data + initial_ids->size);
-        }
+        std::vector<int> ids = matching_ids(index, query);
+        return query_eval::to_int_array(ids.data(), ids.size());
+    }
 
-        for (size_t i = 1; i < tokens.size(); i += 2) {
-            if (i + 1 >= tokens.size()) break;
-            std::string op = tokens[i];
-            std::string term = tokens[i+1];
-            DynamicIntArray* term_ids_arr = find_term_ids(index, term);
-            
-            std::set<int> term_ids;
-            if(term_ids_arr) {
-                term_ids.insert(term_ids_arr->data, term_ids_arr->data + term_ids_arr->size);
-            }
+    int count_index_matches(const InvertedIndex* index, const char* query) {
+        return query_eval::count_matches(query, TermLookup{index},
+                                         [index](const std::string& term) { return term_doc_freq(index, term); },
+                                         [](int) { return true; });
+    }
 
-            if (op == "AND") {
-                std::set<int> intersection;
-                std::set_intersection(result_ids.begin(), result_ids.end(), term_ids.begin(), term_ids.end(),
-                                      std::inserter(intersection, intersection.begin()));
-                result_ids = intersection;
-            } else if (op == "OR") {
-                result_ids.insert(term_ids.begin(), term_ids.end());
-            } else if (op == "NOT") {
-                std::set<int> difference;
-                std::set_difference(result_ids.begin(), result_ids.end(), term_ids.begin(), term_ids.end(),
-                                    std::inserter(difference, difference.begin()));
-                result_ids = difference;
-            }
-        }
-        
-        IntArray final_result;
-        final_result.count = result_ids.size();
-        final_result.ids = (int*)malloc(sizeof(int) * final_result.count);
-        std::copy(result_ids.begin(), result_ids.end(), final_result.ids);
-        return final_result;
+    SearchCursor* open_search_cursor(const InvertedIndex* index, const char* query) {
+        return make_search_cursor(query, TermLookup{index},
+                                  [index](const std::string& term) { return term_doc_freq(index, term); },
+                                  [](int) { return true; });
     }
 }
@@ -0,0 +1,19 @@
+#ifndef INDEX_INTERNAL_H
+#define INDEX_INTERNAL_H
+
+// Internal layout of the in-memory InvertedIndex. Not part of the public C API.
+
+#include "string_table.h"
+
+typedef struct { int* data; int size; int capacity; } DynamicIntArray;
+// Postings of one term, stored inline in the term table. freqs[i] is the number of occurrences
+// of the term in document doc_ids[i]. In a positional index they are at
+// positions[position_starts[i]] onwards, ascending; otherwise both arrays stay empty.
+struct TermPostings { DynamicIntArray doc_ids; DynamicIntArray freqs; DynamicIntArray positions; DynamicIntArray position_starts; };
+// doc_lengths->data[doc_id] is the number of stems of the document, 0 if it is not indexed.
+// dictionary_terms[id] is the entry in `terms` of term dictionary id `id`, or -1 if not looked up yet.
+struct InvertedIndex { StringTable<TermPostings> terms; DynamicIntArray* doc_lengths; int store_positions; std::vector<long> dictionary_terms; };
+// A term's id is the number of its entry in the table.
+struct TermDictionary { StringTable<uint8_t> terms; };
+
+#endif // INDEX_INTERNAL_H
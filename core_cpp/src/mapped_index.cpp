@@ -0,0 +1,613 @@
+#include "index_api.h"
+#include "core_api.h"
+#include "index_internal.h"
+#include "query_eval.h"
+#include "postings_codec.h"
+#include "ranking.h"
+#include "postings_cache.h"
+#include "search_cursor.h"
+#include <cstdlib>
+#include <cstring>
+#include <cstdio>
+#include <cstdint>
+#include <string>
+#include <vector>
+#include <algorithm>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+
+// =================================================================================
+// ON-DISK FORMAT
+// =================================================================================
+// [MappedHeader]
+// [TermEntry x num_terms]      sorted by key bytes, binary searched in place
+// [key heap]                   term keys, not NUL-terminated
+// [padding to 8 bytes]
+// [doc lengths]                uint32 x num_lengths, indexed by doc id (0 = not in this file)
+// [postings]                   one compressed run per term, addressed by TermEntry
+//                              (delta + varint with skip blocks, see postings_codec.h)
+// [padding to 8 bytes]         positional index only:
+// [uint64 x num_terms]         start of each term's positions stream, in dictionary order
+// [positions]                  one stream per term (see postings_codec.h)
+namespace {
+    const char MAPPED_MAGIC[8] = {'I', 'N', 'F', 'S', 'I', 'D', 'X', '\0'};
+    const uint32_t MAPPED_VERSION = 4;
+
+    struct MappedHeader {
+        char magic[8];
+        uint32_t version;
+        uint32_t num_terms;
+        uint64_t dict_offset;
+        uint64_t keys_offset;
+        uint64_t lengths_offset;
+        uint64_t postings_offset;
+        uint64_t file_size;
+        uint32_t num_lengths;
+        uint32_t num_docs;       // Documents with a non-zero length.
+        uint64_t total_length;   // Sum of all document lengths.
+        uint64_t positions_offset; // 0 when the index has no positions.
+    };
+
+    struct TermEntry {
+        uint32_t key_offset;     // Offset into the key heap.
+        uint32_t key_len;
+        uint32_t doc_freq;       // Number of postings.
+        uint32_t max_freq;       // Largest term frequency in the list.
+        uint32_t min_length;     // Shortest document holding the term.
+        uint32_t collection_freq; // Sum of the term frequencies over every document of the file.
+        uint64_t postings_start; // Byte offset of the encoded list in the postings section.
+    };
+
+    uint64_t align8(uint64_t value) { return (value + 7) & ~(uint64_t)7; }
+    size_t align4(size_t value) { return (value + 3) & ~(size_t)3; }
+
+    typedef StringTable<TermPostings>::Entry IndexTerm; // A term of the in-memory index.
+    bool entry_key_less(const IndexTerm* a, const IndexTerm* b) { return strcmp(a->key, b->key) < 0; }
+
+    int compare_key(const char* key, uint32_t key_len, const char* term, size_t term_len) {
+        size_t n = key_len < term_len ? key_len : term_len;
+        int cmp = memcmp(key, term, n);
+        if (cmp != 0) return cmp;
+        if (key_len == term_len) return 0;
+        return key_len < term_len ? -1 : 1;
+    }
+}
+
+struct MappedIndex {
+    void* base;
+    size_t size;
+    const MappedHeader* header;
+    const TermEntry* terms;
+    const char* keys;
+    const uint32_t* lengths;
+    const unsigned char* postings;
+    const uint64_t* position_starts; // Null without positions.
+    const unsigned char* positions;
+    PostingsCache* cache;            // Decoded lists of hot terms, shared by concurrent searches.
+};
+
+// =================================================================================
+// LOOKUP
+// =================================================================================
+namespace {
+    const TermEntry* find_mapped_entry(const MappedIndex* index, const std::string& term) {
+        int lo = 0, hi = (int)index->header->num_terms - 1;
+        while (lo <= hi) {
+            int mid = lo + (hi - lo) / 2;
+            const TermEntry* entry = &index->terms[mid];
+            int cmp = compare_key(index->keys + entry->key_offset, entry->key_len, term.data(), term.size());
+            if (cmp == 0) return entry;
+            if (cmp < 0) lo = mid + 1;
+            else hi = mid - 1;
+        }
+        return nullptr;
+    }
+
+    postings_codec::Cursor term_cursor(const MappedIndex* index, const TermEntry* entry, bool with_positions) {
+        const unsigned char* positions = nullptr;
+        if (with_positions && index->positions) positions = index->positions + index->position_starts[entry - index->terms];
+        return postings_codec::Cursor(index->postings + entry->postings_start, entry->doc_freq, positions);
+    }
+
+    // Lookup for boolean evaluation: long lists come decoded from the postings cache.
+    MappedCursor find_cached_term(const MappedIndex* index, const std::string& term, bool with_positions) {
+        const TermEntry* entry = find_mapped_entry(index, term);
+        if (!entry) return MappedCursor();
+        if (with_positions || entry->doc_freq < MIN_CACHED_DOC_FREQ) return MappedCursor(term_cursor(index, entry, with_positions));
+
+        CachedIds ids = index->cache->get(term);
+        if (!ids) {
+            std::shared_ptr<std::vector<int>> decoded = std::make_shared<std::vector<int>>();
+            decoded->reserve(entry->doc_freq);
+            for (postings_codec::Cursor cursor = term_cursor(index, entry, false); cursor.valid(); cursor.next()) {
+                decoded->push_back(cursor.doc());
+            }
+            ids = decoded;
+            index->cache->put(term, ids);
+        }
+        return MappedCursor(ids);
+    }
+
+    // The terms a ranked query scores: every term of the parsed query except the negated ones.
+    void collect_ranked_terms(const query_eval::QueryNode& node, std::vector<std::string>& terms) {
+        if (node.kind == query_eval::NODE_NOT) return;
+        if (node.kind == query_eval::NODE_TERM) {
+            if (!node.term.empty() && std::find(terms.begin(), terms.end(), node.term) == terms.end()) terms.push_back(node.term);
+            return;
+        }
+        for (const query_eval::QueryNode& child : node.children) collect_ranked_terms(child, terms);
+    }
+
+    // Bit `doc` of a live-docs bitmap is set while the document is part of the segment
+    // and has not been deleted; ids past the end of the bitmap are not live.
+    bool is_live(const unsigned char* live_docs, int size, int doc) {
+        return doc >= 0 && (doc >> 3) < size && ((live_docs[doc >> 3] >> (doc & 7)) & 1);
+    }
+
+    // Lookup for boolean evaluation: the cursor over a term's postings, cached if long.
+    struct MappedTermLookup {
+        const MappedIndex* index;
+        MappedCursor operator()(const std::string& term, bool with_positions) const {
+            return find_cached_term(index, term, with_positions);
+        }
+    };
+
+    uint32_t mapped_doc_freq(const MappedIndex* index, const std::string& term) {
+        const TermEntry* entry = find_mapped_entry(index, term);
+        return entry ? entry->doc_freq : 0;
+    }
+
+    // Matches of a boolean query, leaving out documents whose live bit is clear (all live if null).
+    std::vector<int> matching_ids(const MappedIndex* index, const char* query,
+                                  const unsigned char* live_docs, int live_docs_size) {
+        std::vector<int> ids = query_eval::evaluate_ids(query, MappedTermLookup{index}, [index](const std::string& term) {
+            return mapped_doc_freq(index, term);
+        });
+        if (live_docs) {
+            ids.erase(std::remove_if(ids.begin(), ids.end(), [&](int doc) { return !is_live(live_docs, live_docs_size, doc); }),
+                      ids.end());
+        }
+        return ids;
+    }
+
+    bool header_is_valid(const MappedHeader* h, size_t file_size) {
+        if (memcmp(h->magic, MAPPED_MAGIC, sizeof(MAPPED_MAGIC)) != 0) return false;
+        if (h->version != MAPPED_VERSION) return false;
+        if (h->file_size != file_size) return false;
+        if (h->dict_offset + (uint64_t)h->num_terms * sizeof(TermEntry) > h->keys_offset) return false;
+        if (h->keys_offset > h->lengths_offset) return false;
+        if (h->lengths_offset + (uint64_t)h->num_lengths * sizeof(uint32_t) > h->postings_offset) return false;
+        if (h->postings_offset > file_size) return false;
+        if (h->positions_offset) {
+            if (h->positions_offset < h->postings_offset || (h->positions_offset % sizeof(uint64_t)) != 0) return false;
+            if (h->positions_offset + (uint64_t)h->num_terms * sizeof(uint64_t) > file_size) return false;
+        }
+        return (h->lengths_offset % sizeof(uint64_t)) == 0 && (h->postings_offset % sizeof(uint64_t)) == 0;
+    }
+}
+
+// =================================================================================
+// WRITER
+// =================================================================================
+namespace {
+    // Collects terms in key order and writes them out as one mapped index file.
+    class MappedIndexWriter {
+    public:
+        // Document lengths, indexed by doc id. Must be set before the first add_term(),
+        // since they feed the score bounds stored with the postings.
+        void set_doc_lengths(std::vector<uint32_t> lengths) { lengths_.swap(lengths); }
+
+        // Makes the file positional; every add_term() must then pass positions.
+        void set_positional(bool positional) { positional_ = positional; }
+
+        // `ids` must be sorted and free of duplicates; keys must arrive in increasing order.
+        // `positions` holds freqs[i] ascending positions per posting, posting after posting.
+        void add_term(const char* key, uint32_t key_len, const int* ids, const int* freqs, int count,
+                      const int* positions = nullptr) {
+            // Skip tables hold uint32 fields, keep them aligned.
+            if (postings_codec::has_skip_table((uint32_t)count)) postings_.resize(align4(postings_.size()), 0);
+
+            TermEntry entry;
+            entry.key_offset = (uint32_t)keys_.size();
+            entry.key_len = key_len;
+            entry.doc_freq = (uint32_t)count;
+            entry.max_freq = 0;
+            entry.min_length = UINT32_MAX;
+            entry.collection_freq = 0;
+            for (int i = 0; i < count; ++i) {
+                uint32_t length = (uint32_t)ids[i] < lengths_.size() ? lengths_[ids[i]] : 0;
+                entry.max_freq = std::max(entry.max_freq, (uint32_t)freqs[i]);
+                entry.min_length = std::min(entry.min_length, length);
+                entry.collection_freq += (uint32_t)freqs[i];
+            }
+            entry.postings_start = postings_.size();
+            entries_.push_back(entry);
+            keys_.append(key, key_len);
+            postings_codec::encode(ids, freqs, count, lengths_.data(), lengths_.size(), postings_);
+            if (positional_) {
+                if (postings_codec::has_skip_table((uint32_t)count)) positions_.resize(align4(positions_.size()), 0);
+                position_starts_.push_back(positions_.size());
+                postings_codec::encode_positions(freqs, count, positions, positions_);
+            }
+        }
+
+        int write(const char* path) const {
+            MappedHeader header;
+            memset(&header, 0, sizeof(header));
+            memcpy(header.magic, MAPPED_MAGIC, sizeof(MAPPED_MAGIC));
+            header.version = MAPPED_VERSION;
+            header.num_terms = (uint32_t)entries_.size();
+            header.dict_offset = sizeof(MappedHeader);
+            header.keys_offset = header.dict_offset + entries_.size() * sizeof(TermEntry);
+            header.lengths_offset = align8(header.keys_offset + keys_.size());
+            header.num_lengths = (uint32_t)lengths_.size();
+            header.postings_offset = align8(header.lengths_offset + lengths_.size() * sizeof(uint32_t));
+            header.file_size = header.postings_offset + postings_.size();
+            if (positional_) {
+                header.positions_offset = align8(header.file_size);
+                header.file_size = header.positions_offset + position_starts_.size() * sizeof(uint64_t) + positions_.size();
+            }
+            for (uint32_t length : lengths_) {
+                if (length) ++header.num_docs;
+                header.total_length += length;
+            }
+
+            // Write next to the target and rename, so processes that still map the
+            // old file keep a consistent view until they reopen it.
+            std::string tmp_path = std::string(path) + ".tmp";
+            FILE* fp = fopen(tmp_path.c_str(), "wb");
+            if (!fp) return -1;
+
+            static const char padding[8] = {0};
+            fwrite(&header, sizeof(header), 1, fp);
+            if (!entries_.empty()) fwrite(entries_.data(), sizeof(TermEntry), entries_.size(), fp);
+            fwrite(keys_.data(), 1, keys_.size(), fp);
+            fwrite(padding, 1, header.lengths_offset - (header.keys_offset + keys_.size()), fp);
+            if (!lengths_.empty()) fwrite(lengths_.data(), sizeof(uint32_t), lengths_.size(), fp);
+            fwrite(padding, 1, header.postings_offset - (header.lengths_offset + lengths_.size() * sizeof(uint32_t)), fp);
+            if (!postings_.empty()) fwrite(postings_.data(), 1, postings_.size(), fp);
+            if (positional_) {
+                fwrite(padding, 1, header.positions_offset - (header.postings_offset + postings_.size()), fp);
+                // Stream starts are relative to the end of this table.
+                if (!position_starts_.empty()) fwrite(position_starts_.data(), sizeof(uint64_t), position_starts_.size(), fp);
+                if (!positions_.empty()) fwrite(positions_.data(), 1, positions_.size(), fp);
+            }
+
+            bool ok = ferror(fp) == 0;
+            if (fclose(fp) != 0) ok = false;
+            if (!ok || rename(tmp_path.c_str(), path) != 0) {
+                remove(tmp_path.c_str());
+                return -1;
+            }
+            return 0;
+        }
+
+    private:
+        std::vector<TermEntry> entries_;
+        std::string keys_;
+        std::vector<uint32_t> lengths_;
+        std::vector<unsigned char> postings_;
+        bool positional_ = false;
+        std::vector<uint64_t> position_starts_;
+        std::vector<unsigned char> positions_;
+    };
+
+    // A posting while merging; its positions, if any, start at position_start in a side buffer.
+    struct Posting {
+        int doc;
+        int freq;
+        size_t position_start;
+        bool operator<(const Posting& other) const { return doc < other.doc; }
+    };
+}
+
+// =================================================================================
+// C API IMPLEMENTATION
+// =================================================================================
+extern "C" {
+    int save_index_mapped(const InvertedIndex* index, const char* path) {
+        std::vector<const IndexTerm*> terms;
+        terms.reserve(index->terms.size());
+        for (size_t t = 0; t < index->terms.size(); ++t) terms.push_back(&index->terms.entry(t));
+        std::sort(terms.begin(), terms.end(), entry_key_less);
+
+        MappedIndexWriter writer;
+        const DynamicIntArray* doc_lengths = index->doc_lengths;
+        writer.set_doc_lengths(std::vector<uint32_t>(doc_lengths->data, doc_lengths->data + doc_lengths->size));
+        writer.set_positional(index->store_positions != 0);
+        std::vector<int> positions;
+        for (const IndexTerm* term : terms) {
+            // Postings are already sorted by add_document_to_index.
+            const TermPostings& postings = term->value;
+            const int* term_positions = nullptr;
+            if (index->store_positions) {
+                positions.clear();
+                for (int i = 0; i < postings.doc_ids.size; ++i) {
+                    const int* start = postings.positions.data + postings.position_starts.data[i];
+                    positions.insert(positions.end(), start, start + postings.freqs.data[i]);
+                }
+                term_positions = positions.data();
+            }
+            writer.add_term(term->key, term->key_len, postings.doc_ids.data, postings.freqs.data,
+                            postings.doc_ids.size, term_positions);
+        }
+        return writer.write(path);
+    }
+
+    int merge_mapped_indexes(const char* const* paths, const unsigned char* const* live_docs,
+                             const int* live_docs_sizes, int num_paths, const char* out_path) {
+        std::vector<MappedIndex*> segments;
+        for (int s = 0; s < num_paths; ++s) {
+            MappedIndex* segment = open_mapped_index(paths[s]);
+            if (!segment) {
+                for (MappedIndex* opened : segments) close_mapped_index(opened);
+                return -1;
+            }
+            segments.push_back(segment);
+        }
+
+        // A document live in several inputs is taken whole from the last of them: its length
+        // here and its postings below, so an older copy never leaves terms behind.
+        std::vector<uint32_t> lengths;
+        std::vector<int> owner; // Input each document is taken from, -1 for none.
+        for (size_t s = 0; s < segments.size(); ++s) {
+            const MappedIndex* segment = segments[s];
+            if (segment->header->num_lengths > lengths.size()) {
+                lengths.resize(segment->header->num_lengths, 0);
+                owner.resize(segment->header->num_lengths, -1);
+            }
+            for (uint32_t doc = 0; doc < segment->header->num_lengths; ++doc) {
+                if (!segment->lengths[doc]) continue;
+                if (live_docs && live_docs[s] && !is_live(live_docs[s], live_docs_sizes[s], (int)doc)) continue;
+                lengths[doc] = segment->lengths[doc];
+                owner[doc] = (int)s;
+            }
+        }
+        MappedIndexWriter writer;
+        writer.set_doc_lengths(std::move(lengths));
+        bool positional = !segments.empty();
+        for (const MappedIndex* segment : segments) positional = positional && segment->positions;
+        writer.set_positional(positional);
+
+        // k-way merge of the sorted dictionaries; k is the number of build workers, so a
+        // linear scan for the smallest key is cheaper than maintaining a heap.
+        std::vector<uint32_t> next(segments.size(), 0);
+        std::vector<Posting> merged;
+        std::vector<int> ids, freqs, merged_positions, positions, posting_positions;
+        for (;;) {
+            const TermEntry* smallest = nullptr;
+            const MappedIndex* smallest_segment = nullptr;
+            for (size_t s = 0; s < segments.size(); ++s) {
+                if (next[s] >= segments[s]->header->num_terms) continue;
+                const TermEntry* entry = &segments[s]->terms[next[s]];
+                if (!smallest || compare_key(segments[s]->keys + entry->key_offset, entry->key_len,
+                                             smallest_segment->keys + smallest->key_offset, smallest->key_len) < 0) {
+                    smallest = entry;
+                    smallest_segment = segments[s];
+                }
+            }
+            if (!smallest) break;
+
+            const char* key = smallest_segment->keys + smallest->key_offset;
+            uint32_t key_len = smallest->key_len;
+            merged.clear();
+            merged_positions.clear();
+            for (size_t s = 0; s < segments.size(); ++s) {
+                if (next[s] >= segments[s]->header->num_terms) continue;
+                const TermEntry* entry = &segments[s]->terms[next[s]];
+                if (compare_key(segments[s]->keys + entry->key_offset, entry->key_len, key, key_len) != 0) continue;
+                postings_codec::Cursor cursor = term_cursor(segments[s], entry, positional);
+                ++next[s];
+                size_t run_start = merged.size();
+                for (; cursor.valid(); cursor.next()) {
+                    // Skips deleted documents and those a later input holds too.
+                    if ((size_t)cursor.doc() >= owner.size() || owner[cursor.doc()] != (int)s) continue;
+                    merged.push_back({cursor.doc(), (int)cursor.freq(), merged_positions.size()});
+                    if (positional) {
+                        cursor.positions(posting_positions);
+                        merged_positions.insert(merged_positions.end(), posting_positions.begin(), posting_positions.end());
+                    }
+                }
+                // Inputs usually cover disjoint, increasing id ranges, which makes this a no-op.
+                std::inplace_merge(merged.begin(), merged.begin() + run_start, merged.end());
+            }
+            // A term whose documents were all deleted is dropped from the dictionary.
+            if (merged.empty()) continue;
+            ids.clear();
+            freqs.clear();
+            positions.clear();
+            for (const Posting& posting : merged) {
+                ids.push_back(posting.doc);
+                freqs.push_back(posting.freq);
+                if (positional) {
+                    const int* start = merged_positions.data() + posting.position_start;
+                    positions.insert(positions.end(), start, start + posting.freq);
+                }
+            }
+            writer.add_term(key, key_len, ids.data(), freqs.data(), (int)ids.size(), positional ? positions.data() : nullptr);
+        }
+
+        int result = writer.write(out_path);
+        for (MappedIndex* segment : segments) close_mapped_index(segment);
+        return result;
+    }
+
+    MappedIndex* open_mapped_index(const char* path) {
+        int fd = open(path, O_RDONLY);
+        if (fd < 0) return nullptr;
+
+        struct stat st;
+        if (fstat(fd, &st) != 0 || (size_t)st.st_size < sizeof(MappedHeader)) {
+            close(fd);
+            return nullptr;
+        }
+        size_t size = (size_t)st.st_size;
+        void* base = mmap(nullptr, size, PROT_READ, MAP_SHARED, fd, 0);
+        close(fd); // The mapping keeps the file alive.
+        if (base == MAP_FAILED) return nullptr;
+
+        const MappedHeader* header = (const MappedHeader*)base;
+        if (!header_is_valid(header, size)) {
+            munmap(base, size);
+            return nullptr;
+        }
+
+        MappedIndex* index = (MappedIndex*)malloc(sizeof(MappedIndex));
+        const char* bytes = (const char*)base;
+        index->base = base;
+        index->size = size;
+        index->header = header;
+        index->terms = (const TermEntry*)(bytes + header->dict_offset);
+        index->keys = bytes + header->keys_offset;
+        index->lengths = (const uint32_t*)(bytes + header->lengths_offset);
+        index->position_starts = nullptr;
+        index->positions = nullptr;
+        if (header->positions_offset) {
+            index->position_starts = (const uint64_t*)(bytes + header->positions_offset);
+            index->positions = (const unsigned char*)(index->position_starts + header->num_terms);
+        }
+        index->cache = new PostingsCache(DEFAULT_POSTINGS_CACHE_BYTES);
+        index->postings = (const unsigned char*)(bytes + header->postings_offset);
+        return index;
+    }
+
+    IntArray search_mapped_index(const MappedIndex* index, const char* query) {
+        return search_mapped_index_live(index, query, nullptr, 0);
+    }
+
+    IntArray search_mapped_index_live(const MappedIndex* index, const char* query,
+                                      const unsigned char* live_docs, int live_docs_size) {
+        std::vector<int> ids = matching_ids(index, query, live_docs, live_docs_size);
+        return query_eval::to_int_array(ids.data(), ids.size());
+    }
+
+    int count_mapped_index_matches(const MappedIndex* index, const char* query,
+                                   const unsigned char* live_docs, int live_docs_size) {
+        return query_eval::count_matches(query, MappedTermLookup{index},
+                                         [index](const std::string& term) { return mapped_doc_freq(index, term); },
+                                         [&](int doc) { return !live_docs || is_live(live_docs, live_docs_size, doc); });
+    }
+
+    SearchCursor* open_mapped_search_cursor(const MappedIndex* index, const char* query,
+                                            const unsigned char* live_docs, int live_docs_size) {
+        // The cursor outlives this call, so it keeps a copy of the live-docs bitmap.
+        std::vector<unsigned char> live;
+        if (live_docs) live.assign(live_docs, live_docs + std::max(live_docs_size, 0));
+        bool filtered = live_docs != nullptr;
+        return make_search_cursor(query, MappedTermLookup{index},
+                                  [index](const std::string& term) { return mapped_doc_freq(index, term); },
+                                  [live = std::move(live), filtered](int doc) {
+                                      return !filtered || is_live(live.data(), (int)live.size(), doc);
+                                  });
+    }
+
+    ScoredArray search_mapped_index_ranked(const MappedIndex* index, const char* query, int k,
+                                           const unsigned char* live_docs, int live_docs_size) {
+        ScoredArray result = {nullptr, nullptr, 0};
+        query_eval::QueryParser parser(query);
+        if (parser.empty() || k <= 0) return result;
+        std::vector<std::string> query_terms;
+        collect_ranked_terms(parser.parse(), query_terms);
+
+        const MappedHeader* header = index->header;
+        ranking::CollectionStats stats;
+        stats.num_docs = header->num_docs;
+        stats.avg_length = header->num_docs ? (float)header->total_length / (float)header->num_docs : 1.0f;
+        if (stats.avg_length <= 0.0f) stats.avg_length = 1.0f;
+        stats.lengths = index->lengths;
+        stats.num_lengths = header->num_lengths;
+
+        std::vector<ranking::TermScorer> terms;
+        for (const std::string& term : query_terms) {
+            const TermEntry* entry = find_mapped_entry(index, term);
+            if (!entry) continue;
+            ranking::TermScorer scorer;
+            scorer.cursor = term_cursor(index, entry, false);
+            scorer.idf = ranking::idf(entry->doc_freq, std::max(stats.num_docs, entry->doc_freq));
+            scorer.max_score = scorer.score(entry->max_freq, entry->min_length, stats);
+            terms.push_back(scorer);
+        }
+
+        std::vector<ranking::ScoredDoc> top = ranking::top_k(terms, k, stats, [&](int doc) {
+            return !live_docs || is_live(live_docs, live_docs_size, doc);
+        });
+        result.count = (int)top.size();
+        if (!result.count) return result;
+        result.ids = (int*)malloc(sizeof(int) * result.count);
+        result.scores = (float*)malloc(sizeof(float) * result.count);
+        for (int i = 0; i < result.count; ++i) {
+            result.ids[i] = top[i].doc;
+            result.scores[i] = top[i].score;
+        }
+        return result;
+    }
+
+    void free_scored_array(ScoredArray arr) {
+        free(arr.ids);
+        free(arr.scores);
+    }
+
+    TermStatsArray get_mapped_term_stats(const MappedIndex* index, const unsigned char* live_docs, int live_docs_size) {
+        uint32_t num_terms = index->header->num_terms;
+        std::vector<int> doc_freqs;
+        std::vector<unsigned long long> collection_freqs;
+        std::string terms;
+        doc_freqs.reserve(num_terms);
+        collection_freqs.reserve(num_terms);
+        for (uint32_t t = 0; t < num_terms; ++t) {
+            const TermEntry* entry = &index->terms[t];
+            uint32_t doc_freq = entry->doc_freq;
+            unsigned long long collection_freq = entry->collection_freq;
+            if (live_docs) {
+                // Deleted documents need the postings themselves.
+                doc_freq = 0;
+                collection_freq = 0;
+                for (postings_codec::Cursor cursor = term_cursor(index, entry, false); cursor.valid(); cursor.next()) {
+                    if (live_docs && !is_live(live_docs, live_docs_size, cursor.doc())) continue;
+                    ++doc_freq;
+                    collection_freq += cursor.freq();
+                }
+            }
+            if (!doc_freq) continue;
+            terms.append(index->keys + entry->key_offset, entry->key_len);
+            terms.push_back('\0');
+            doc_freqs.push_back((int)doc_freq);
+            collection_freqs.push_back(collection_freq);
+        }
+
+        TermStatsArray result = {nullptr, nullptr, nullptr, (int)doc_freqs.size(), (int)terms.size()};
+        if (!result.count) return result;
+        result.terms = (char*)malloc(terms.size());
+        memcpy(result.terms, terms.data(), terms.size());
+        result.doc_freqs = (int*)malloc(sizeof(int) * doc_freqs.size());
+        memcpy(result.doc_freqs, doc_freqs.data(), sizeof(int) * doc_freqs.size());
+        result.collection_freqs = (unsigned long long*)malloc(sizeof(unsigned long long) * collection_freqs.size());
+        memcpy(result.collection_freqs, collection_freqs.data(), sizeof(unsigned long long) * collection_freqs.size());
+        return result;
+    }
+
+    void free_term_stats_array(TermStatsArray arr) {
+        free(arr.terms);
+        free(arr.doc_freqs);
+        free(arr.collection_freqs);
+    }
+
+    void set_postings_cache_limit(MappedIndex* index, long long max_bytes) {
+        index->cache->set_limit(max_bytes > 0 ? (size_t)max_bytes : 0);
+    }
+
+    PostingsCacheStats get_postings_cache_stats(const MappedIndex* index) {
+        PostingsCacheStats stats;
+        index->cache->stats(&stats.hits, &stats.misses, &stats.entries, &stats.bytes);
+        return stats;
+    }
+
+    void close_mapped_index(MappedIndex* index) {
+        if (!index) return;
+        delete index->cache;
+        munmap(index->base, index->size);
+        free(index);
+    }
+}
@@ -0,0 +1,116 @@
+#ifndef POSTINGS_CACHE_H
+#define POSTINGS_CACHE_H
+
+// Internal cache of decoded posting lists for a mapped index. Not part of the public C API.
+//
+// Decoding a long varint list costs far more than walking a flat array, and the
+// same frequent terms come back in query after query. The cache keeps the
+// decoded doc ids of hot terms, bounded by bytes with least-recently-used
+// eviction. It belongs to one mapped index handle, so reopening a rebuilt file
+// starts from an empty cache.
+
+#include "query_eval.h"
+#include "postings_codec.h"
+#include <cstdint>
+#include <list>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <unordered_map>
+#include <utility>
+#include <vector>
+
+// Lists shorter than one block decode in a few hundred nanoseconds; caching them only churns.
+const uint32_t MIN_CACHED_DOC_FREQ = POSTINGS_BLOCK_SIZE;
+const size_t DEFAULT_POSTINGS_CACHE_BYTES = 16u << 20;
+
+typedef std::shared_ptr<const std::vector<int>> CachedIds;
+
+class PostingsCache {
+public:
+    explicit PostingsCache(size_t max_bytes) : max_bytes_(max_bytes), bytes_(0), hits_(0), misses_(0) {}
+
+    // Returns the cached ids of `term`, or null (and counts a miss).
+    CachedIds get(const std::string& term) {
+        std::lock_guard<std::mutex> lock(mutex_);
+        auto found = entries_.find(term);
+        if (found == entries_.end()) {
+            ++misses_;
+            return nullptr;
+        }
+        order_.splice(order_.begin(), order_, found->second.second);
+        ++hits_;
+        return found->second.first;
+    }
+
+    void put(const std::string& term, CachedIds ids) {
+        size_t size = entry_size(term, *ids);
+        std::lock_guard<std::mutex> lock(mutex_);
+        if (size > max_bytes_ || entries_.count(term)) return;
+        order_.push_front(term);
+        entries_.emplace(term, std::make_pair(ids, order_.begin()));
+        bytes_ += size;
+        evict_locked();
+    }
+
+    void set_limit(size_t max_bytes) {
+        std::lock_guard<std::mutex> lock(mutex_);
+        max_bytes_ = max_bytes;
+        evict_locked();
+    }
+
+    void stats(unsigned long long* hits, unsigned long long* misses, unsigned long long* entries, unsigned long long* bytes) {
+        std::lock_guard<std::mutex> lock(mutex_);
+        *hits = hits_;
+        *misses = misses_;
+        *entries = entries_.size();
+        *bytes = bytes_;
+    }
+
+private:
+    static size_t entry_size(const std::string& term, const std::vector<int>& ids) {
+        return ids.size() * sizeof(int) + term.size() + 64; // 64: rough node and bookkeeping overhead.
+    }
+
+    void evict_locked() {
+        while (bytes_ > max_bytes_ && !order_.empty()) {
+            auto victim = entries_.find(order_.back());
+            bytes_ -= entry_size(victim->first, *victim->second.first);
+            entries_.erase(victim);
+            order_.pop_back();
+        }
+    }
+
+    std::mutex mutex_;
+    size_t max_bytes_;
+    size_t bytes_;
+    uint64_t hits_;
+    uint64_t misses_;
+    std::list<std::string> order_; // Most recently used first.
+    std::unordered_map<std::string, std::pair<CachedIds, std::list<std::string>::iterator>> entries_;
+};
+
+// Cursor over either a cached, decoded list or the encoded one in the file.
+class MappedCursor {
+public:
+    MappedCursor() {}
+    explicit MappedCursor(const postings_codec::Cursor& encoded) : encoded_(encoded) {}
+    explicit MappedCursor(CachedIds ids) : ids_(std::move(ids)), array_(ids_->data(), (int)ids_->size()) {}
+
+    bool valid() const { return ids_ ? array_.valid() : encoded_.valid(); }
+    int doc() const { return ids_ ? array_.doc() : encoded_.doc(); }
+    uint32_t cost() const { return ids_ ? array_.cost() : encoded_.cost(); }
+    void next() { if (ids_) array_.next(); else encoded_.next(); }
+    void advance(int target) { if (ids_) array_.advance(target); else encoded_.advance(target); }
+
+    // Cached lists hold ids only; positional lookups always read the file.
+    bool has_positions() const { return !ids_ && encoded_.has_positions(); }
+    void positions(std::vector<int>& out) const { encoded_.positions(out); }
+
+private:
+    CachedIds ids_; // Keeps the list alive even if the cache evicts it meanwhile.
+    ArrayCursor array_;
+    postings_codec::Cursor encoded_;
+};
+
+#endif // POSTINGS_CACHE_H
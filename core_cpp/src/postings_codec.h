@@ -0,0 +1,223 @@
+#ifndef POSTINGS_CODEC_H
+#define POSTINGS_CODEC_H
+
+// Internal postings codec for the mapped index. Not part of the public C API.
+//
+// A posting list is a sorted run of (doc id, term frequency) pairs stored as
+// variable-byte integers: the id as a delta from the previous id, then the
+// frequency. Lists longer than one block are prefixed with a skip table, one
+// entry per block of POSTINGS_BLOCK_SIZE postings:
+//
+//   [SkipEntry x num_blocks]   only when doc_freq > POSTINGS_BLOCK_SIZE
+//   [varint pairs]             the first delta of a block is taken from the
+//                              last id of the previous block, so every block
+//                              can be decoded on its own
+//
+// Skip entries also carry the largest frequency and the shortest document of
+// their block, which bound the score any document of the block can reach
+// (block-max WAND, see ranking.h).
+//
+// Short lists (the Zipf tail, i.e. most terms) carry no skip table at all.
+//
+// Positions live in a separate stream so an index built without them pays
+// nothing. Per term, in posting order, each posting's positions are varint
+// deltas (the first one absolute). Lists with a skip table get a matching
+// table of block offsets into that stream:
+//
+//   [uint32 x num_blocks]      only when doc_freq > POSTINGS_BLOCK_SIZE
+//   [varint position deltas]
+
+#include <cstdint>
+#include <cstddef>
+#include <vector>
+
+const int POSTINGS_BLOCK_SIZE = 128;
+
+typedef struct {
+    uint32_t last_doc;    // Largest id in the block.
+    uint32_t data_offset; // Offset of the block's first varint, relative to the end of the skip table.
+    uint32_t max_freq;    // Largest term frequency in the block.
+    uint32_t min_length;  // Shortest document length in the block.
+} SkipEntry;
+
+namespace postings_codec {
+    inline int num_blocks(uint32_t doc_freq) {
+        return (int)((doc_freq + POSTINGS_BLOCK_SIZE - 1) / POSTINGS_BLOCK_SIZE);
+    }
+
+    inline bool has_skip_table(uint32_t doc_freq) { return doc_freq > (uint32_t)POSTINGS_BLOCK_SIZE; }
+
+    inline void put_varint(std::vector<unsigned char>& out, uint32_t value) {
+        while (value >= 0x80) {
+            out.push_back((unsigned char)(value | 0x80));
+            value >>= 7;
+        }
+        out.push_back((unsigned char)value);
+    }
+
+    inline uint32_t get_varint(const unsigned char*& p) {
+        uint32_t value = *p & 0x7F;
+        int shift = 7;
+        while (*p++ & 0x80) {
+            value |= (uint32_t)(*p & 0x7F) << shift;
+            shift += 7;
+        }
+        return value;
+    }
+
+    // Appends the encoded form of `ids` (sorted, no duplicates) and their `freqs` to `out`.
+    // `lengths` maps a doc id to its length (ids >= num_lengths count as 0) and feeds the
+    // per-block score bounds. `out` must be 4-byte aligned at the current position when a
+    // skip table is written.
+    inline void encode(const int* ids, const int* freqs, int count, const uint32_t* lengths, size_t num_lengths,
+                       std::vector<unsigned char>& out) {
+        std::vector<unsigned char> data;
+        std::vector<SkipEntry> skips;
+        uint32_t prev = 0;
+        for (int i = 0; i < count; ++i) {
+            if (i % POSTINGS_BLOCK_SIZE == 0) skips.push_back({0, (uint32_t)data.size(), 0, UINT32_MAX});
+            put_varint(data, (uint32_t)ids[i] - prev);
+            put_varint(data, (uint32_t)freqs[i]);
+            prev = (uint32_t)ids[i];
+            SkipEntry& skip = skips.back();
+            uint32_t length = prev < num_lengths ? lengths[prev] : 0;
+            skip.last_doc = prev;
+            if ((uint32_t)freqs[i] > skip.max_freq) skip.max_freq = (uint32_t)freqs[i];
+            if (length < skip.min_length) skip.min_length = length;
+        }
+        if (has_skip_table((uint32_t)count)) {
+            const unsigned char* raw = (const unsigned char*)skips.data();
+            out.insert(out.end(), raw, raw + skips.size() * sizeof(SkipEntry));
+        }
+        out.insert(out.end(), data.begin(), data.end());
+    }
+
+    // Appends the positions stream of one term. `positions` holds freqs[i] ascending
+    // positions per posting, posting after posting. Same alignment rule as encode().
+    inline void encode_positions(const int* freqs, int count, const int* positions, std::vector<unsigned char>& out) {
+        std::vector<unsigned char> data;
+        std::vector<uint32_t> block_offsets;
+        for (int i = 0; i < count; ++i) {
+            if (i % POSTINGS_BLOCK_SIZE == 0) block_offsets.push_back((uint32_t)data.size());
+            int prev = 0;
+            for (int j = 0; j < freqs[i]; ++j, ++positions) {
+                put_varint(data, (uint32_t)(*positions - prev));
+                prev = *positions;
+            }
+        }
+        if (has_skip_table((uint32_t)count)) {
+            const unsigned char* raw = (const unsigned char*)block_offsets.data();
+            out.insert(out.end(), raw, raw + block_offsets.size() * sizeof(uint32_t));
+        }
+        out.insert(out.end(), data.begin(), data.end());
+    }
+
+    // Forward-only cursor that decodes one posting at a time and uses the skip
+    // table to jump over whole blocks in advance().
+    class Cursor {
+    public:
+        Cursor() : skips_(nullptr), data_(nullptr), p_(nullptr), doc_freq_(0), num_blocks_(0),
+                   block_(0), left_in_block_(0), remaining_(0), doc_(0), freq_(0), valid_(false),
+                   position_blocks_(nullptr), position_data_(nullptr), position_p_(nullptr) {}
+
+        // `positions` is the term's positions stream, or null if the index has none.
+        Cursor(const unsigned char* postings, uint32_t doc_freq, const unsigned char* positions = nullptr)
+            : skips_(nullptr), data_(postings), p_(postings), doc_freq_(doc_freq), num_blocks_(num_blocks(doc_freq)),
+              block_(0), left_in_block_(0), remaining_(doc_freq), doc_(0), freq_(0), valid_(false),
+              position_blocks_(nullptr), position_data_(positions), position_p_(positions) {
+            if (has_skip_table(doc_freq)) {
+                skips_ = (const SkipEntry*)postings;
+                data_ = postings + num_blocks_ * sizeof(SkipEntry);
+                p_ = data_;
+                if (positions) {
+                    position_blocks_ = (const uint32_t*)positions;
+                    position_data_ = positions + num_blocks_ * sizeof(uint32_t);
+                    position_p_ = position_data_;
+                }
+            }
+            left_in_block_ = remaining_ < (uint32_t)POSTINGS_BLOCK_SIZE ? remaining_ : POSTINGS_BLOCK_SIZE;
+            next();
+        }
+
+        bool valid() const { return valid_; }
+        int doc() const { return (int)doc_; }
+        uint32_t cost() const { return doc_freq_; }
+        uint32_t freq() const { return freq_; }
+
+        // The skip entry of the current block, or nullptr for a list short enough to have none.
+        const SkipEntry* block() const { return skips_ ? &skips_[block_] : nullptr; }
+
+        bool has_positions() const { return position_p_ != nullptr; }
+
+        // Positions of the term in the current document, ascending.
+        void positions(std::vector<int>& out) const {
+            out.clear();
+            const unsigned char* p = position_p_;
+            int position = 0;
+            for (uint32_t i = 0; i < freq_; ++i) {
+                position += (int)get_varint(p);
+                out.push_back(position);
+            }
+        }
+
+        void next() {
+            if (position_p_ && valid_) {
+                // Step over the positions of the posting we are leaving.
+                for (uint32_t i = 0; i < freq_; ++i) {
+                    while (*position_p_++ & 0x80) {}
+                }
+            }
+            if (remaining_ == 0) { valid_ = false; return; }
+            if (left_in_block_ == 0) {
+                ++block_;
+                left_in_block_ = remaining_ < (uint32_t)POSTINGS_BLOCK_SIZE ? remaining_ : POSTINGS_BLOCK_SIZE;
+            }
+            doc_ += get_varint(p_);
+            freq_ = get_varint(p_);
+            --left_in_block_;
+            --remaining_;
+            valid_ = true;
+        }
+
+        // Moves to the first id >= target. Never moves backwards.
+        void advance(int target) {
+            if (!valid_ || (int)doc_ >= target) return;
+            if (skips_ && skips_[block_].last_doc < (uint32_t)target) {
+                int b = block_ + 1;
+                while (b < num_blocks_ && skips_[b].last_doc < (uint32_t)target) ++b;
+                if (b == num_blocks_) { remaining_ = 0; valid_ = false; return; }
+                seek_block(b);
+            }
+            while (valid_ && (int)doc_ < target) next();
+        }
+
+    private:
+        void seek_block(int b) {
+            block_ = b;
+            p_ = data_ + skips_[b].data_offset;
+            doc_ = skips_[b - 1].last_doc; // b > 0: we only ever skip forward.
+            remaining_ = doc_freq_ - (uint32_t)b * POSTINGS_BLOCK_SIZE;
+            left_in_block_ = remaining_ < (uint32_t)POSTINGS_BLOCK_SIZE ? remaining_ : POSTINGS_BLOCK_SIZE;
+            if (position_blocks_) position_p_ = position_data_ + position_blocks_[b];
+            valid_ = false; // The positions pointer already sits on the block's first posting.
+            next();
+        }
+
+        const SkipEntry* skips_;
+        const unsigned char* data_;
+        const unsigned char* p_;
+        uint32_t doc_freq_;
+        int num_blocks_;
+        int block_;
+        uint32_t left_in_block_;
+        uint32_t remaining_;
+        uint32_t doc_;
+        uint32_t freq_;
+        bool valid_;
+        const uint32_t* position_blocks_;
+        const unsigned char* position_data_;
+        const unsigned char* position_p_;
+    };
+}
+
+#endif // POSTINGS_CODEC_H
@@ -0,0 +1,504 @@
+#ifndef QUERY_EVAL_H
+#define QUERY_EVAL_H
+
+// Internal header shared by the in-memory and the memory-mapped index.
+// Not part of the public C API.
+
+#include "index_api.h"
+#include "query_parser.h"
+#include <climits>
+#include <cstdlib>
+#include <cstdint>
+#include <cstring>
+#include <vector>
+#include <string>
+#include <utility>
+#include <algorithm>
+
+namespace query_eval {
+    // Exponential search: returns the first position in [from, count) whose id is >= target.
+    // Costs O(log distance) instead of O(log count), which is what makes skewed intersections cheap.
+    inline int gallop(const int* ids, int from, int count, int target) {
+        if (from >= count || ids[from] >= target) return from;
+        int lo = from, step = 1;
+        while (lo + step < count && ids[lo + step] < target) {
+            lo += step;
+            step <<= 1;
+        }
+        int hi = lo + step < count ? lo + step : count;
+        return (int)(std::lower_bound(ids + lo + 1, ids + hi, target) - ids);
+    }
+}
+
+// Cursor over a sorted, uncompressed posting list owned by the in-memory index.
+// Positions are optional: posting i has freqs[i] positions starting at positions[position_starts[i]].
+class ArrayCursor {
+public:
+    ArrayCursor() : ids_(nullptr), count_(0), pos_(0), freqs_(nullptr), positions_(nullptr), position_starts_(nullptr) {}
+    ArrayCursor(const int* ids, int count, const int* freqs = nullptr,
+                const int* positions = nullptr, const int* position_starts = nullptr)
+        : ids_(ids), count_(count), pos_(0), freqs_(freqs), positions_(positions), position_starts_(position_starts) {}
+
+    bool valid() const { return pos_ < count_; }
+    int doc() const { return ids_[pos_]; }
+    uint32_t cost() const { return (uint32_t)count_; }
+    void next() { ++pos_; }
+    void advance(int target) { pos_ = query_eval::gallop(ids_, pos_, count_, target); }
+
+    bool has_positions() const { return positions_ != nullptr; }
+    // Positions of the term in the current document, ascending.
+    void positions(std::vector<int>& out) const {
+        const int* start = positions_ + position_starts_[pos_];
+        out.assign(start, start + freqs_[pos_]);
+    }
+
+private:
+    const int* ids_;
+    int count_;
+    int pos_;
+    const int* freqs_;
+    const int* positions_;
+    const int* position_starts_;
+};
+
+namespace query_eval {
+    // Keeps the ids of `result` that are (keep_matches) or are not (!keep_matches) in `cursor`.
+    // Works in place. The shorter side drives: a short result probes the list with
+    // advance(), a short list gallops through the result.
+    template <typename Cursor>
+    void filter_in_place(std::vector<int>& result, Cursor& cursor, bool keep_matches) {
+        size_t write = 0;
+        if (keep_matches && cursor.cost() < result.size()) {
+            int pos = 0, count = (int)result.size();
+            for (; cursor.valid() && pos < count; cursor.next()) {
+                pos = gallop(result.data(), pos, count, cursor.doc());
+                if (pos < count && result[pos] == cursor.doc()) result[write++] = result[pos++];
+            }
+        } else {
+            for (size_t read = 0; read < result.size(); ++read) {
+                int id = result[read];
+                cursor.advance(id);
+                bool matches = cursor.valid() && cursor.doc() == id;
+                if (matches == keep_matches) result[write++] = id;
+            }
+        }
+        result.resize(write);
+    }
+
+    // Linear merge of `result` and `cursor` into `scratch`, which then becomes the result.
+    template <typename Cursor>
+    void union_into(std::vector<int>& result, Cursor& cursor, std::vector<int>& scratch) {
+        scratch.clear();
+        scratch.reserve(result.size() + cursor.cost());
+        size_t i = 0;
+        while (i < result.size() && cursor.valid()) {
+            int a = result[i], b = cursor.doc();
+            if (a < b) { scratch.push_back(a); ++i; }
+            else if (b < a) { scratch.push_back(b); cursor.next(); }
+            else { scratch.push_back(a); ++i; cursor.next(); }
+        }
+        scratch.insert(scratch.end(), result.begin() + i, result.end());
+        for (; cursor.valid(); cursor.next()) scratch.push_back(cursor.doc());
+        result.swap(scratch);
+    }
+
+    // Removes from `result` every id that is also in `excluded` (both sorted), in place.
+    inline void subtract_in_place(std::vector<int>& result, const std::vector<int>& excluded) {
+        size_t write = 0, j = 0;
+        for (size_t read = 0; read < result.size(); ++read) {
+            int id = result[read];
+            j = (size_t)gallop(excluded.data(), (int)j, (int)excluded.size(), id);
+            if (j == excluded.size() || excluded[j] != id) result[write++] = id;
+        }
+        result.resize(write);
+    }
+
+    // True if some position p of lists[0] has p + i in lists[i] for every i (a phrase match).
+    inline bool consecutive_positions(const std::vector<std::vector<int>>& lists) {
+        std::vector<size_t> at(lists.size(), 0);
+        for (int start : lists[0]) {
+            bool matched = true;
+            for (size_t i = 1; i < lists.size() && matched; ++i) {
+                const std::vector<int>& list = lists[i];
+                at[i] = (size_t)gallop(list.data(), (int)at[i], (int)list.size(), start + (int)i);
+                matched = at[i] < list.size() && list[at[i]] == start + (int)i;
+                if (at[i] == list.size()) return false;
+            }
+            if (matched) return true;
+        }
+        return false;
+    }
+
+    // True if one position from every list fits in a window of `distance` (a NEAR/k match).
+    // Classic smallest-range scan: keep one head per list, always step the smallest one.
+    inline bool positions_within(const std::vector<std::vector<int>>& lists, int distance) {
+        std::vector<size_t> at(lists.size(), 0);
+        for (;;) {
+            size_t lowest = 0;
+            int low = lists[0][at[0]], high = low;
+            for (size_t i = 1; i < lists.size(); ++i) {
+                int position = lists[i][at[i]];
+                if (position < low) { low = position; lowest = i; }
+                if (position > high) high = position;
+            }
+            if (high - low <= distance) return true;
+            if (++at[lowest] == lists[lowest].size()) return false;
+        }
+    }
+
+    // Evaluates a planned query tree over flat sorted arrays.
+    // `lookup(term, with_positions)` maps a term to a cursor (valid/doc/next/advance/cost, plus
+    // has_positions/positions when asked for); an unknown term yields an empty cursor.
+    // Only the cheapest AND operand is ever materialized from postings; every other operand,
+    // including negations, is applied as a filter over those candidates.
+    // Phrases and NEAR intersect doc ids first and only read the positions of documents that hold
+    // every term; without positions in the index they match like an AND of their terms.
+    template <typename Lookup>
+    class Evaluator {
+    public:
+        explicit Evaluator(Lookup& lookup) : lookup_(lookup) {}
+
+        // All documents matching `node`. A bare negation has no universe to complement and matches nothing.
+        void materialize(const QueryNode& node, std::vector<int>& out) {
+            out.clear();
+            if (node.kind == NODE_TERM) {
+                auto cursor = lookup_(node.term, false);
+                out.reserve(cursor.cost());
+                for (; cursor.valid(); cursor.next()) out.push_back(cursor.doc());
+            } else if (node.kind == NODE_OR) {
+                std::vector<int> scratch, child_ids;
+                for (const QueryNode& child : node.children) {
+                    if (child.kind == NODE_TERM) {
+                        auto cursor = lookup_(child.term, false);
+                        union_into(out, cursor, scratch);
+                    } else {
+                        materialize(child, child_ids);
+                        ArrayCursor cursor(child_ids.data(), (int)child_ids.size());
+                        union_into(out, cursor, scratch);
+                    }
+                }
+            } else if (node.kind == NODE_AND && node.children[0].kind != NODE_NOT) {
+                materialize(node.children[0], out);
+                for (size_t i = 1; i < node.children.size() && !out.empty(); ++i) restrict(node.children[i], out);
+            } else if (node.kind == NODE_PHRASE || node.kind == NODE_NEAR) {
+                match_positional(node, nullptr, out);
+            }
+        }
+
+        // Keeps only the candidates that match `node`.
+        void restrict(const QueryNode& node, std::vector<int>& candidates) {
+            if (candidates.empty()) return;
+            switch (node.kind) {
+                case NODE_TERM: {
+                    auto cursor = lookup_(node.term, false);
+                    filter_in_place(candidates, cursor, true);
+                    break;
+                }
+                case NODE_AND:
+                    for (const QueryNode& child : node.children) {
+                        restrict(child, candidates);
+                        if (candidates.empty()) break;
+                    }
+                    break;
+                case NODE_NOT: {
+                    const QueryNode& child = node.children[0];
+                    if (child.kind == NODE_TERM) {
+                        auto cursor = lookup_(child.term, false);
+                        filter_in_place(candidates, cursor, false);
+                    } else {
+                        std::vector<int> matched(candidates);
+                        restrict(child, matched);
+                        subtract_in_place(candidates, matched);
+                    }
+                    break;
+                }
+                case NODE_PHRASE:
+                case NODE_NEAR: {
+                    std::vector<int> matched;
+                    match_positional(node, &candidates, matched);
+                    candidates.swap(matched);
+                    break;
+                }
+                case NODE_OR: {
+                    // Each branch only tests the candidates no earlier branch has matched.
+                    std::vector<int> rest(candidates), branch, scratch;
+                    candidates.clear();
+                    for (const QueryNode& child : node.children) {
+                        branch = rest;
+                        restrict(child, branch);
+                        if (branch.empty()) continue;
+                        ArrayCursor cursor(branch.data(), (int)branch.size());
+                        union_into(candidates, cursor, scratch);
+                        subtract_in_place(rest, branch);
+                        if (rest.empty()) break;
+                    }
+                    break;
+                }
+            }
+        }
+
+    private:
+        // Documents (out of `candidates`, or all if null) where the terms of a phrase or NEAR node
+        // occur at matching positions.
+        void match_positional(const QueryNode& node, const std::vector<int>* candidates, std::vector<int>& out) {
+            out.clear();
+            typedef decltype(lookup_(node.term, true)) Cursor;
+            std::vector<Cursor> cursors;
+            bool positional = true;
+            for (const QueryNode& child : node.children) {
+                cursors.push_back(lookup_(child.term, true));
+                if (!cursors.back().valid()) return;
+                positional = positional && cursors.back().has_positions();
+            }
+            // The rarest list leads the doc-id intersection.
+            size_t lead = 0;
+            for (size_t i = 1; i < cursors.size(); ++i) {
+                if (cursors[i].cost() < cursors[lead].cost()) lead = i;
+            }
+
+            std::vector<std::vector<int>> positions(cursors.size());
+            size_t next_candidate = 0;
+            for (;;) {
+                int doc;
+                if (candidates) {
+                    if (next_candidate == candidates->size()) break;
+                    doc = (*candidates)[next_candidate++];
+                    cursors[lead].advance(doc);
+                    if (!cursors[lead].valid()) break;
+                    if (cursors[lead].doc() != doc) continue;
+                } else {
+                    if (!cursors[lead].valid()) break;
+                    doc = cursors[lead].doc();
+                }
+                // Leapfrog: every other list must reach doc exactly.
+                bool all_match = true, exhausted = false;
+                for (size_t i = 0; i < cursors.size() && all_match; ++i) {
+                    cursors[i].advance(doc);
+                    if (!cursors[i].valid()) { exhausted = true; break; }
+                    if (cursors[i].doc() != doc) {
+                        all_match = false;
+                        if (!candidates) cursors[lead].advance(cursors[i].doc());
+                    }
+                }
+                if (exhausted) break;
+                if (!all_match) continue;
+
+                bool matches = true;
+                if (positional) {
+                    for (size_t i = 0; i < cursors.size(); ++i) cursors[i].positions(positions[i]);
+                    matches = node.kind == NODE_PHRASE ? consecutive_positions(positions)
+                                                       : positions_within(positions, node.distance);
+                }
+                if (matches) out.push_back(doc);
+                if (!candidates) cursors[lead].next();
+            }
+        }
+
+        Lookup& lookup_;
+    };
+
+    const int NO_MORE_DOCS = INT_MAX;
+
+    // Evaluates a planned query tree lazily: the same matches as Evaluator::materialize, in
+    // ascending order, one at a time, each posting list read only as far as the last match
+    // handed out (and skipped through with advance()). As in Evaluator, the first operand of an
+    // AND, the branches of an OR, phrases and terms generate candidates, and the other AND
+    // operands, with everything below them, are tested on one candidate at a time.
+    // The cursors are kept from one match to the next, so the index must outlive the matcher.
+    template <typename Lookup>
+    class LazyMatcher {
+    public:
+        LazyMatcher(const QueryNode& root, const Lookup& lookup) : lookup_(lookup) { build(root, root_); }
+
+        // The next match, or NO_MORE_DOCS once there are none.
+        int next() {
+            if (root_.current != NO_MORE_DOCS) generate(root_, root_.current + 1);
+            return root_.current;
+        }
+
+    private:
+        typedef decltype(std::declval<const Lookup&>()(std::string(), false)) Cursor;
+
+        struct State {
+            const QueryNode* node;
+            std::vector<Cursor> cursors;     // A term's cursor, or one per phrase term (with positions).
+            std::vector<State> children;
+            bool positional = false;         // Phrases: every term has positions.
+            int current = -1;                // Generators: the current candidate, -1 before the first.
+        };
+
+        void build(const QueryNode& node, State& state) {
+            state.node = &node;
+            if (node.kind == NODE_TERM) {
+                state.cursors.push_back(lookup_(node.term, false));
+            } else if (node.kind == NODE_PHRASE || node.kind == NODE_NEAR) {
+                state.positional = true;
+                for (const QueryNode& child : node.children) {
+                    state.cursors.push_back(lookup_(child.term, true));
+                    state.positional = state.positional && state.cursors.back().has_positions();
+                }
+            } else {
+                state.children.resize(node.children.size());
+                for (size_t i = 0; i < node.children.size(); ++i) build(node.children[i], state.children[i]);
+            }
+        }
+
+        // Moves a generator to its first candidate >= target.
+        void generate(State& state, int target) {
+            if (state.current >= target) return;
+            const QueryNode& node = *state.node;
+            if (node.kind == NODE_TERM) {
+                Cursor& cursor = state.cursors[0];
+                cursor.advance(target);
+                state.current = cursor.valid() ? cursor.doc() : NO_MORE_DOCS;
+            } else if (node.kind == NODE_OR) {
+                int lowest = NO_MORE_DOCS;
+                for (State& child : state.children) {
+                    generate(child, target);
+                    lowest = std::min(lowest, child.current);
+                }
+                state.current = lowest;
+            } else if (node.kind == NODE_AND && node.children[0].kind != NODE_NOT) {
+                State& lead = state.children[0];
+                for (;;) {
+                    generate(lead, target);
+                    if (lead.current == NO_MORE_DOCS) break;
+                    bool all_match = true;
+                    for (size_t i = 1; i < state.children.size() && all_match; ++i) all_match = matches(state.children[i], lead.current);
+                    if (all_match) break;
+                    target = lead.current + 1;
+                }
+                state.current = lead.current;
+            } else if (node.kind == NODE_PHRASE || node.kind == NODE_NEAR) {
+                state.current = next_positional(state, target);
+            } else {
+                state.current = NO_MORE_DOCS; // A bare negation has no universe to complement.
+            }
+        }
+
+        // Whether `doc` matches a filter; called with ascending docs.
+        bool matches(State& state, int doc) {
+            const QueryNode& node = *state.node;
+            switch (node.kind) {
+                case NODE_TERM: {
+                    Cursor& cursor = state.cursors[0];
+                    cursor.advance(doc);
+                    return cursor.valid() && cursor.doc() == doc;
+                }
+                case NODE_AND:
+                    for (State& child : state.children) {
+                        if (!matches(child, doc)) return false;
+                    }
+                    return true;
+                case NODE_NOT:
+                    return !matches(state.children[0], doc);
+                case NODE_OR:
+                    for (State& child : state.children) {
+                        if (matches(child, doc)) return true;
+                    }
+                    return false;
+                case NODE_PHRASE:
+                case NODE_NEAR:
+                    for (Cursor& cursor : state.cursors) {
+                        cursor.advance(doc);
+                        if (!cursor.valid() || cursor.doc() != doc) return false;
+                    }
+                    return positions_match(state);
+            }
+            return false;
+        }
+
+        // First document >= target holding every term of a phrase or NEAR node at matching positions.
+        int next_positional(State& state, int target) {
+            for (;;) {
+                // Leapfrog until one pass finds every list on the same document.
+                bool aligned = false;
+                while (!aligned) {
+                    aligned = true;
+                    for (Cursor& cursor : state.cursors) {
+                        cursor.advance(target);
+                        if (!cursor.valid()) return NO_MORE_DOCS;
+                        if (cursor.doc() != target) {
+                            target = cursor.doc();
+                            aligned = false;
+                        }
+                    }
+                }
+                if (positions_match(state)) return target;
+                ++target;
+            }
+        }
+
+        bool positions_match(State& state) {
+            if (!state.positional) return true; // Without positions a phrase matches like an AND.
+            positions_.resize(state.cursors.size());
+            for (size_t i = 0; i < state.cursors.size(); ++i) state.cursors[i].positions(positions_[i]);
+            return state.node->kind == NODE_PHRASE ? consecutive_positions(positions_)
+                                                   : positions_within(positions_, state.node->distance);
+        }
+
+        const Lookup& lookup_;
+        State root_;
+        std::vector<std::vector<int>> positions_;
+    };
+
+    // Parses and plans a boolean query (see query_parser.h for the syntax) into `root`.
+    // Returns false for a query without terms, which matches nothing.
+    template <typename DocFreq>
+    bool parse_query(const char* query, DocFreq doc_freq, QueryNode& root) {
+        QueryParser parser(query);
+        if (parser.empty()) return false;
+        root = parser.parse();
+        plan(root, doc_freq);
+        return true;
+    }
+
+    // Number of matches of a query for which is_live(doc) holds, counted without collecting them.
+    template <typename Lookup, typename DocFreq, typename IsLive>
+    int count_matches(const char* query, const Lookup& lookup, DocFreq doc_freq, IsLive is_live) {
+        QueryNode root;
+        if (!parse_query(query, doc_freq, root)) return 0;
+        LazyMatcher<Lookup> matcher(root, lookup);
+        int count = 0;
+        for (int doc = matcher.next(); doc != NO_MORE_DOCS; doc = matcher.next()) {
+            if (is_live(doc)) ++count;
+        }
+        return count;
+    }
+
+    // Copies `count` ids into a malloc'd IntArray for the caller to free with free_int_array.
+    inline IntArray to_int_array(const int* ids, size_t count) {
+        IntArray result;
+        result.count = (int)count;
+        result.ids = count ? (int*)malloc(sizeof(int) * count) : nullptr;
+        if (count) memcpy(result.ids, ids, sizeof(int) * count);
+        return result;
+    }
+
+    // Parses, plans and evaluates a boolean query (see query_parser.h for the syntax) into
+    // the ascending ids of the matching documents.
+    // `doc_freq` gives the planner a term's df without building a cursor.
+    template <typename Lookup, typename DocFreq>
+    std::vector<int> evaluate_ids(const char* query, Lookup lookup, DocFreq doc_freq) {
+        std::vector<int> result_ids;
+        QueryNode root;
+        if (!parse_query(query, doc_freq, root)) return result_ids;
+
+        Evaluator<Lookup> evaluator(lookup);
+        evaluator.materialize(root, result_ids);
+        return result_ids;
+    }
+
+    template <typename Lookup>
+    std::vector<int> evaluate_ids(const char* query, Lookup lookup) {
+        return evaluate_ids(query, lookup, [&lookup](const std::string& term) { return lookup(term, false).cost(); });
+    }
+
+    template <typename Lookup>
+    IntArray evaluate(const char* query, Lookup lookup) {
+        std::vector<int> result_ids = evaluate_ids(query, lookup);
+        return to_int_array(result_ids.data(), result_ids.size());
+    }
+}
+
+#endif // QUERY_EVAL_H
@@ -0,0 +1,263 @@
+#ifndef QUERY_PARSER_H
+#define QUERY_PARSER_H
+
+// Internal boolean query parser and planner. Not part of the public C API.
+//
+// Grammar (operators are upper-case, binding from loosest to tightest):
+//   or_expr   := and_expr ("OR" and_expr)*
+//   and_expr  := unary (["AND"] unary)*          adjacent operands are ANDed
+//   unary     := "NOT" unary | near_expr          "a NOT b" reads as "a AND NOT b"
+//   near_expr := primary ("NEAR/" k primary)*     all operands within k positions
+//   primary   := "(" or_expr ")" | '"' term* '"' | term
+//
+// A quoted phrase matches its terms at consecutive positions. NEAR/k takes
+// terms as operands; with anything else it falls back to AND.
+//
+// The parser is lenient: a missing ")" or closing quote is implied, a stray
+// ")" or a dangling operator is dropped, so any input yields a tree.
+
+#include <cstdint>
+#include <string>
+#include <vector>
+#include <algorithm>
+
+namespace query_eval {
+    // NODE_PHRASE and NODE_NEAR have only NODE_TERM children and need positions to be
+    // told apart from NODE_AND.
+    enum NodeKind { NODE_TERM, NODE_AND, NODE_OR, NODE_NOT, NODE_PHRASE, NODE_NEAR };
+
+    struct QueryNode {
+        NodeKind kind;
+        std::string term;                 // NODE_TERM only.
+        std::vector<QueryNode> children;
+        uint32_t cost;                    // Upper bound on matching documents, set by plan().
+        int distance;                     // NODE_NEAR only: largest allowed span in positions.
+    };
+
+    const uint32_t UNBOUNDED_COST = UINT32_MAX;
+
+    // Returns k for a "NEAR/k" token, -1 for anything else.
+    inline int near_distance(const std::string& token) {
+        if (token.compare(0, 5, "NEAR/") != 0 || token.size() == 5 || token.size() > 11) return -1;
+        int k = 0;
+        for (size_t i = 5; i < token.size(); ++i) {
+            if (token[i] < '0' || token[i] > '9') return -1;
+            k = k * 10 + (token[i] - '0');
+        }
+        return k;
+    }
+
+    inline bool is_operator(const std::string& token) {
+        return token == "AND" || token == "OR" || token == "NOT" || near_distance(token) >= 0;
+    }
+
+    // Splits a query into words, "(", ")" and '"'. Inside quotes parentheses are plain separators.
+    inline std::vector<std::string> lex_query(const char* query) {
+        std::vector<std::string> tokens;
+        std::string current;
+        int depth = 0;
+        bool in_phrase = false;
+        for (const char* p = query; ; ++p) {
+            char c = *p;
+            bool is_space = c == ' ' || c == '\t' || c == '\n' || c == '\r';
+            if (c == '\0' || is_space || c == '(' || c == ')' || c == '"') {
+                if (!current.empty()) {
+                    tokens.push_back(current);
+                    current.clear();
+                }
+                if (c == '"') {
+                    tokens.push_back("\"");
+                    in_phrase = !in_phrase;
+                } else if (in_phrase) {
+                    // Parentheses inside a phrase separate words and nothing else.
+                } else if (c == '(') {
+                    tokens.push_back("(");
+                    ++depth;
+                } else if (c == ')' && depth > 0) {
+                    tokens.push_back(")");
+                    --depth;
+                }
+                if (c == '\0') break;
+            } else {
+                current += c;
+            }
+        }
+        return tokens;
+    }
+
+    class QueryParser {
+    public:
+        explicit QueryParser(const char* query) : tokens_(lex_query(query)), pos_(0) {}
+
+        bool empty() const { return tokens_.empty(); }
+
+        QueryNode parse() { return parse_or(); }
+
+    private:
+        bool at(const char* token) const { return pos_ < tokens_.size() && tokens_[pos_] == token; }
+        bool at_end() const { return pos_ >= tokens_.size(); }
+
+        static QueryNode make(NodeKind kind) {
+            QueryNode node;
+            node.kind = kind;
+            node.cost = 0;
+            node.distance = 0;
+            return node;
+        }
+
+        QueryNode parse_or() {
+            QueryNode node = parse_and();
+            while (at("OR")) {
+                ++pos_;
+                if (at_end() || at(")")) break;
+                if (node.kind != NODE_OR) {
+                    QueryNode wrapper = make(NODE_OR);
+                    wrapper.children.push_back(node);
+                    node = wrapper;
+                }
+                node.children.push_back(parse_and());
+            }
+            return node;
+        }
+
+        QueryNode parse_and() {
+            QueryNode node = parse_unary();
+            for (;;) {
+                if (at("AND")) ++pos_;
+                if (at_end() || at(")") || at("OR")) break;
+                if (near_distance(tokens_[pos_]) >= 0) { ++pos_; continue; } // Dangling NEAR.
+                if (node.kind != NODE_AND) {
+                    QueryNode wrapper = make(NODE_AND);
+                    wrapper.children.push_back(node);
+                    node = wrapper;
+                }
+                node.children.push_back(parse_unary());
+            }
+            return node;
+        }
+
+        QueryNode parse_unary() {
+            if (at("NOT")) {
+                ++pos_;
+                QueryNode node = make(NODE_NOT);
+                node.children.push_back(parse_unary());
+                return node;
+            }
+            return parse_near();
+        }
+
+        QueryNode parse_near() {
+            QueryNode node = parse_primary();
+            while (!at_end() && near_distance(tokens_[pos_]) >= 0) {
+                int distance = near_distance(tokens_[pos_++]);
+                if (at_end() || at(")") || at("OR") || at("AND") || at("NOT")) break;
+                QueryNode operand = parse_primary();
+                bool extends = node.kind == NODE_NEAR && node.distance == distance;
+                if (operand.kind == NODE_TERM && (node.kind == NODE_TERM || extends)) {
+                    if (!extends) {
+                        QueryNode wrapper = make(NODE_NEAR);
+                        wrapper.distance = distance;
+                        wrapper.children.push_back(node);
+                        node = wrapper;
+                    }
+                    node.children.push_back(operand);
+                } else {
+                    QueryNode wrapper = make(NODE_AND);
+                    wrapper.children.push_back(node);
+                    wrapper.children.push_back(operand);
+                    node = wrapper;
+                }
+            }
+            return node;
+        }
+
+        QueryNode parse_primary() {
+            while (at("AND") || at("OR") || (!at_end() && near_distance(tokens_[pos_]) >= 0)) ++pos_; // Dangling operator.
+            if (at("(")) {
+                ++pos_;
+                QueryNode node = parse_or();
+                if (at(")")) ++pos_;
+                return node;
+            }
+            if (at("\"")) {
+                ++pos_;
+                QueryNode node = make(NODE_PHRASE);
+                while (!at_end() && !at("\"")) {
+                    QueryNode term = make(NODE_TERM);
+                    term.term = tokens_[pos_++];
+                    node.children.push_back(term);
+                }
+                if (at("\"")) ++pos_;
+                if (node.children.size() == 1) return node.children[0];
+                if (node.children.empty()) return make(NODE_TERM); // An empty phrase matches nothing.
+                return node;
+            }
+            QueryNode node = make(NODE_TERM);
+            if (!at_end() && !at(")")) node.term = tokens_[pos_++]; // An empty term matches nothing.
+            return node;
+        }
+
+        std::vector<std::string> tokens_;
+        size_t pos_;
+    };
+
+    // Rewrites the tree for evaluation:
+    //  - nested ANDs/ORs are flattened and double negations removed;
+    //  - every node gets a cost from the document frequencies (`doc_freq` maps a term to its df);
+    //  - AND operands are ordered rarest first with negations last, so the cheapest
+    //    operand produces the candidates and everything else only filters them.
+    template <typename DocFreq>
+    void plan(QueryNode& node, DocFreq doc_freq) {
+        if (node.kind == NODE_TERM) {
+            node.cost = doc_freq(node.term);
+            return;
+        }
+        if (node.kind == NODE_NOT) {
+            QueryNode& child = node.children[0];
+            if (child.kind == NODE_NOT) {
+                QueryNode inner = child.children[0];
+                node = inner;
+                plan(node, doc_freq);
+                return;
+            }
+            plan(child, doc_freq);
+            node.cost = UNBOUNDED_COST;
+            return;
+        }
+        if (node.kind == NODE_PHRASE || node.kind == NODE_NEAR) {
+            // Term order matters to a phrase, so the children stay as they are.
+            node.cost = UNBOUNDED_COST;
+            for (QueryNode& child : node.children) {
+                plan(child, doc_freq);
+                node.cost = std::min(node.cost, child.cost);
+            }
+            return;
+        }
+
+        std::vector<QueryNode> flat;
+        for (QueryNode& child : node.children) {
+            plan(child, doc_freq);
+            if (child.kind == node.kind) {
+                for (QueryNode& grandchild : child.children) flat.push_back(grandchild);
+            } else {
+                flat.push_back(child);
+            }
+        }
+        node.children.swap(flat);
+
+        if (node.kind == NODE_AND) {
+            std::stable_sort(node.children.begin(), node.children.end(), [](const QueryNode& a, const QueryNode& b) {
+                bool a_not = a.kind == NODE_NOT, b_not = b.kind == NODE_NOT;
+                if (a_not != b_not) return !a_not;
+                return a.cost < b.cost;
+            });
+            node.cost = node.children[0].cost; // Negations sort last, so this is UNBOUNDED only if all are.
+        } else {
+            uint64_t total = 0;
+            for (const QueryNode& child : node.children) total += child.cost;
+            node.cost = total > UNBOUNDED_COST ? UNBOUNDED_COST : (uint32_t)total;
+        }
+    }
+}
+
+#endif // QUERY_PARSER_H
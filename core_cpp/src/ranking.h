@@ -0,0 +1,165 @@
+#ifndef RANKING_H
+#define RANKING_H
+
+// Internal BM25 top-k retrieval over mapped postings. Not part of the public C API.
+//
+// Documents are scored with Okapi BM25 over the union of the query terms and the
+// k best are kept in a min-heap. Block-max WAND keeps this from scoring every
+// candidate: once the heap is full, its smallest score is a threshold, and a
+// document is only decoded and scored if the score bounds of its terms (whole
+// list first, then the current block) can beat it. Frequent terms are mostly
+// skipped block by block, so broad queries cost about as much as their k best.
+
+#include "postings_codec.h"
+#include <cmath>
+#include <cstdint>
+#include <vector>
+#include <algorithm>
+
+namespace ranking {
+    const float BM25_K1 = 1.2f;
+    const float BM25_B = 0.75f;
+
+    struct ScoredDoc {
+        int doc;
+        float score;
+    };
+
+    // Corpus statistics BM25 needs beyond the postings.
+    struct CollectionStats {
+        uint32_t num_docs;
+        float avg_length;
+        const uint32_t* lengths; // Indexed by doc id.
+        uint32_t num_lengths;
+
+        uint32_t length(int doc) const { return doc >= 0 && (uint32_t)doc < num_lengths ? lengths[doc] : 0; }
+    };
+
+    // One query term: its postings plus what is needed to score and bound them.
+    struct TermScorer {
+        postings_codec::Cursor cursor;
+        float idf;
+        float max_score; // Bound over the whole list.
+
+        // BM25 contribution of a posting. Increasing in freq and decreasing in length,
+        // so (largest freq, shortest length) of a block bounds every posting in it.
+        float score(uint32_t freq, uint32_t length, const CollectionStats& stats) const {
+            float norm = BM25_K1 * (1.0f - BM25_B + BM25_B * (float)length / stats.avg_length);
+            return idf * (float)freq * (BM25_K1 + 1.0f) / ((float)freq + norm);
+        }
+
+        // Bound for the block holding the current posting, and the last id that bound covers.
+        float block_max_score(const CollectionStats& stats) const {
+            const SkipEntry* block = cursor.block();
+            return block ? score(block->max_freq, block->min_length, stats) : max_score;
+        }
+        int block_last_doc() const {
+            const SkipEntry* block = cursor.block();
+            return block ? (int)block->last_doc : INT32_MAX;
+        }
+    };
+
+    inline float idf(uint32_t doc_freq, uint32_t num_docs) {
+        // The "+1" form never goes negative, even for terms in more than half of the documents.
+        return std::log(1.0f + ((float)num_docs - (float)doc_freq + 0.5f) / ((float)doc_freq + 0.5f));
+    }
+
+    inline bool better(const ScoredDoc& a, const ScoredDoc& b) {
+        return a.score > b.score || (a.score == b.score && a.doc < b.doc);
+    }
+
+    // Keeps the k best documents; the worst of them sits on top of the heap.
+    class TopK {
+    public:
+        explicit TopK(int k) : k_(k) { heap_.reserve(k); }
+
+        // Score a new document must beat to enter.
+        float threshold() const { return (int)heap_.size() < k_ ? 0.0f : heap_.front().score; }
+
+        void push(int doc, float score) {
+            ScoredDoc entry = {doc, score};
+            if ((int)heap_.size() < k_) {
+                heap_.push_back(entry);
+                std::push_heap(heap_.begin(), heap_.end(), better);
+            } else if (better(entry, heap_.front())) {
+                std::pop_heap(heap_.begin(), heap_.end(), better);
+                heap_.back() = entry;
+                std::push_heap(heap_.begin(), heap_.end(), better);
+            }
+        }
+
+        // Best first.
+        std::vector<ScoredDoc> sorted() {
+            std::sort_heap(heap_.begin(), heap_.end(), better);
+            return heap_;
+        }
+
+    private:
+        int k_;
+        std::vector<ScoredDoc> heap_;
+    };
+
+    // Block-max WAND over `terms`. `accept(doc)` can veto a document (e.g. a deleted one)
+    // before it is scored.
+    template <typename Accept>
+    std::vector<ScoredDoc> top_k(std::vector<TermScorer>& terms, int k, const CollectionStats& stats, Accept accept) {
+        TopK top(k);
+        if (k <= 0) return top.sorted();
+
+        std::vector<TermScorer*> live;
+        for (TermScorer& term : terms) {
+            if (term.cursor.valid()) live.push_back(&term);
+        }
+        auto by_doc = [](const TermScorer* a, const TermScorer* b) { return a->cursor.doc() < b->cursor.doc(); };
+
+        while (!live.empty()) {
+            std::sort(live.begin(), live.end(), by_doc); // A handful of terms: cheap.
+            float threshold = top.threshold();
+
+            // Pivot: the first term at which the summed list bounds could beat the threshold.
+            // No document before the pivot's can make it into the top k.
+            float bound = 0.0f;
+            size_t pivot = 0;
+            for (; pivot < live.size(); ++pivot) {
+                bound += live[pivot]->max_score;
+                if (bound > threshold) break;
+            }
+            if (pivot == live.size()) break;
+            int pivot_doc = live[pivot]->cursor.doc();
+            while (pivot + 1 < live.size() && live[pivot + 1]->cursor.doc() == pivot_doc) ++pivot;
+
+            if (live[0]->cursor.doc() != pivot_doc) {
+                // Bring the lagging terms up to the pivot; they skip whole blocks on the way.
+                for (size_t i = 0; i < pivot && live[i]->cursor.doc() < pivot_doc; ++i) live[i]->cursor.advance(pivot_doc);
+            } else {
+                // Every term up to the pivot sits on pivot_doc: check the tighter block bounds first.
+                float block_bound = 0.0f;
+                for (size_t i = 0; i <= pivot; ++i) block_bound += live[i]->block_max_score(stats);
+
+                if (block_bound > threshold && accept(pivot_doc)) {
+                    uint32_t length = stats.length(pivot_doc);
+                    float score = 0.0f;
+                    for (size_t i = 0; i <= pivot; ++i) score += live[i]->score(live[i]->cursor.freq(), length, stats);
+                    if (score > threshold) top.push(pivot_doc, score);
+                    for (size_t i = 0; i <= pivot; ++i) live[i]->cursor.next();
+                } else if (block_bound > threshold) {
+                    for (size_t i = 0; i <= pivot; ++i) live[i]->cursor.next();
+                } else {
+                    // Nothing up to the end of the shortest of these blocks can win, unless
+                    // a term that is further ahead joins in first.
+                    int skip_to = INT32_MAX;
+                    for (size_t i = 0; i <= pivot; ++i) skip_to = std::min(skip_to, live[i]->block_last_doc());
+                    if (skip_to != INT32_MAX) ++skip_to;
+                    if (pivot + 1 < live.size()) skip_to = std::min(skip_to, live[pivot + 1]->cursor.doc());
+                    if (skip_to <= pivot_doc) skip_to = pivot_doc + 1;
+                    for (size_t i = 0; i <= pivot; ++i) live[i]->cursor.advance(skip_to);
+                }
+            }
+            live.erase(std::remove_if(live.begin(), live.end(), [](const TermScorer* t) { return !t->cursor.valid(); }),
+                       live.end());
+        }
+        return top.sorted();
+    }
+}
+
+#endif // RANKING_H
@@ -0,0 +1,160 @@
+#include "russian_stemmer.h"
+#include "string_table.h"
+#include <cstdint>
+#include <cstring>
+
+// =================================================================================
+// SNOWBALL RUSSIAN STEMMER
+// =================================================================================
+// https://snowballstem.org/algorithms/russian/stemmer.html. Every step removes a suffix
+// found inside RV, the part of the word after its first vowel; the derivational step
+// also requires it inside R2. Cyrillic letters are two bytes in UTF-8, so suffixes are
+// matched on bytes and only the region boundaries need decoding.
+namespace {
+    typedef const char* const SuffixList[];
+
+    // Endings preceded by "а" or "я" (which stay) are listed separately from the ones that are not.
+    SuffixList PERFECTIVE_GERUND_1 = {"вшись", "вши", "в", nullptr};
+    SuffixList PERFECTIVE_GERUND_2 = {"ившись", "ывшись", "ивши", "ывши", "ив", "ыв", nullptr};
+    SuffixList ADJECTIVE = {"ими", "ыми", "его", "ого", "ему", "ому", "ее", "ие", "ые", "ое", "ей", "ий", "ый", "ой",
+                            "ем", "им", "ым", "ом", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею", nullptr};
+    SuffixList PARTICIPLE_1 = {"ем", "нн", "вш", "ющ", "щ", nullptr};
+    SuffixList PARTICIPLE_2 = {"ивш", "ывш", "ующ", nullptr};
+    SuffixList REFLEXIVE = {"ся", "сь", nullptr};
+    SuffixList VERB_1 = {"ете", "йте", "ешь", "нно", "ла", "на", "ли", "ем", "ло", "но", "ет", "ют", "ны", "ть",
+                         "й", "л", "н", nullptr};
+    SuffixList VERB_2 = {"ейте", "уйте", "ила", "ыла", "ена", "ите", "или", "ыли", "ило", "ыло", "ено", "ует",
+                         "уют", "ены", "ить", "ыть", "ишь", "ей", "уй", "ил", "ыл", "им", "ым", "ен", "ят", "ит",
+                         "ыт", "ую", "ю", nullptr};
+    SuffixList NOUN = {"иями", "ями", "ами", "ией", "иям", "ием", "иях", "ев", "ов", "ие", "ье", "еи", "ии", "ей",
+                       "ой", "ий", "ям", "ем", "ам", "ом", "ах", "ях", "ию", "ью", "ия", "ья", "а", "е", "и", "й",
+                       "о", "у", "ы", "ь", "ю", "я", nullptr};
+    SuffixList SUPERLATIVE = {"ейше", "ейш", nullptr};
+    SuffixList DERIVATIONAL = {"ость", "ост", nullptr};
+
+    bool ends_with(const char* word, size_t len, size_t start, const char* suffix, size_t suffix_len) {
+        return len >= start + suffix_len && memcmp(word + len - suffix_len, suffix, suffix_len) == 0;
+    }
+
+    // Length of the longest suffix of word[start, len) in the list, 0 if none.
+    size_t longest_suffix(const char* word, size_t len, size_t start, SuffixList suffixes) {
+        size_t best = 0;
+        for (const char* const* s = suffixes; *s; ++s) {
+            size_t suffix_len = strlen(*s);
+            if (suffix_len > best && ends_with(word, len, start, *s, suffix_len)) best = suffix_len;
+        }
+        return best;
+    }
+
+    // Like longest_suffix over two groups, where a group-1 ending only counts after "а" or "я".
+    // As in Snowball, the longest ending wins before that condition is checked.
+    size_t longest_suffix_after_a(const char* word, size_t len, size_t start, SuffixList group1, SuffixList group2) {
+        size_t first = longest_suffix(word, len, start, group1);
+        size_t second = longest_suffix(word, len, start, group2);
+        if (second >= first) return second;
+        size_t rest = len - first;
+        if (ends_with(word, rest, start, "а", 2) || ends_with(word, rest, start, "я", 2)) return first;
+        return 0;
+    }
+
+    size_t utf8_char_length(unsigned char c) {
+        if (c < 0x80) return 1;
+        if (c >= 0xF0) return 4;
+        if (c >= 0xE0) return 3;
+        return 2;
+    }
+
+    bool is_vowel(const char* p) {
+        static const char* const VOWELS[] = {"а", "е", "и", "о", "у", "ы", "э", "ю", "я"};
+        for (const char* vowel : VOWELS) {
+            if (p[0] == vowel[0] && p[1] == vowel[1]) return true;
+        }
+        return false;
+    }
+
+    // Offset just past the first vowel of word[from, len) (RV from 0), or the end of the word if there is none.
+    size_t after_first_vowel(const char* word, size_t len, size_t from) {
+        for (size_t i = from; i < len; i += utf8_char_length(word[i])) {
+            if (i + 1 < len && is_vowel(word + i)) return i + 2;
+        }
+        return len;
+    }
+
+    // Offset just past the first non-vowel that follows a vowel in word[from, len): R1 from 0, R2 from R1.
+    size_t after_vowel_consonant(const char* word, size_t len, size_t from) {
+        bool seen_vowel = false;
+        for (size_t i = from; i < len;) {
+            size_t char_len = utf8_char_length(word[i]);
+            bool vowel = i + 1 < len && is_vowel(word + i);
+            if (seen_vowel && !vowel) return i + char_len < len ? i + char_len : len;
+            seen_vowel = seen_vowel || vowel;
+            i += char_len;
+        }
+        return len;
+    }
+
+    size_t adjectival(const char* word, size_t len, size_t rv) {
+        size_t n = longest_suffix(word, len, rv, ADJECTIVE);
+        if (!n) return 0;
+        return n + longest_suffix_after_a(word, len - n, rv, PARTICIPLE_1, PARTICIPLE_2);
+    }
+}
+
+size_t russian_stem_length(const char* word, size_t len) {
+    size_t rv = after_first_vowel(word, len, 0);
+    size_t r1 = after_vowel_consonant(word, len, 0);
+    size_t r2 = after_vowel_consonant(word, len, r1);
+
+    // Step 1: a perfective gerund, or else an optional reflexive ending followed by the first
+    // of an adjectival, verb or noun ending.
+    size_t n = longest_suffix_after_a(word, len, rv, PERFECTIVE_GERUND_1, PERFECTIVE_GERUND_2);
+    if (n) {
+        len -= n;
+    } else {
+        len -= longest_suffix(word, len, rv, REFLEXIVE);
+        if ((n = adjectival(word, len, rv)) || (n = longest_suffix_after_a(word, len, rv, VERB_1, VERB_2)) ||
+            (n = longest_suffix(word, len, rv, NOUN))) {
+            len -= n;
+        }
+    }
+    // Step 2: a final "и".
+    if (ends_with(word, len, rv, "и", 2)) len -= 2;
+    // Step 3: a derivational ending inside R2.
+    len -= longest_suffix(word, len, r2, DERIVATIONAL);
+    // Step 4: a superlative ending and then "нн" -> "н", or "нн" -> "н", or a final soft sign.
+    if ((n = longest_suffix(word, len, rv, SUPERLATIVE))) {
+        len -= n;
+        if (ends_with(word, len, rv, "нн", 4)) len -= 2;
+    } else if (ends_with(word, len, rv, "нн", 4)) {
+        len -= 2;
+    } else if (ends_with(word, len, rv, "ь", 2)) {
+        len -= 2;
+    }
+    return len;
+}
+
+// =================================================================================
+// STEM MEMO
+// =================================================================================
+// Word frequencies follow Zipf's law: a few thousand forms make up most of the text, so
+// most words are stemmed once per thread. Each thread keeps its own table, so lookups take
+// no lock; when it is full it starts over, which the frequent forms survive by coming back.
+namespace {
+    const size_t STEM_CACHE_ENTRIES = 1 << 16;
+    const size_t MAX_CACHED_WORD_BYTES = 64; // Longer words are rare, and this keeps stem lengths in a byte.
+
+    struct StemCache {
+        StringTable<uint8_t> stems{STEM_CACHE_ENTRIES};
+    };
+}
+
+size_t cached_stem_length(const char* word, size_t len) {
+    if (len > MAX_CACHED_WORD_BYTES) return russian_stem_length(word, len);
+    thread_local StemCache cache;
+    long found = cache.stems.find(word, len);
+    if (found >= 0) return cache.stems.value(found);
+    if (cache.stems.size() >= STEM_CACHE_ENTRIES) cache = StemCache();
+    size_t stem_len = russian_stem_length(word, len);
+    cache.stems.value(cache.stems.insert(word, len)) = (uint8_t)stem_len;
+    return stem_len;
+}
@@ -0,0 +1,15 @@
+#ifndef RUSSIAN_STEMMER_H
+#define RUSSIAN_STEMMER_H
+
+// Internal Russian stemmer used by the tokenizer. Not part of the public C API.
+
+#include <cstddef>
+
+// Snowball's Russian stemming algorithm over a lower-case UTF-8 word. The algorithm only ever
+// strips suffixes, so the stem is returned as the length in bytes of the word's prefix.
+size_t russian_stem_length(const char* word, size_t len);
+
+// russian_stem_length behind a bounded per-thread memo of recent words.
+size_t cached_stem_length(const char* word, size_t len);
+
+#endif // RUSSIAN_STEMMER_H
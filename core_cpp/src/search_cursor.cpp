@@ -0,0 +1,29 @@
+#include "index_api.h"
+#include "core_api.h"
+#include "query_eval.h"
+#include "search_cursor.h"
+#include <algorithm>
+
+// =================================================================================
+// C API IMPLEMENTATION (cursors are opened by index.cpp and mapped_index.cpp)
+// =================================================================================
+extern "C" {
+    int search_cursor_count(const SearchCursor* cursor) {
+        return cursor ? cursor->count() : 0;
+    }
+
+    void search_cursor_seek(SearchCursor* cursor, int offset) {
+        if (cursor) cursor->seek(offset);
+    }
+
+    IntArray search_cursor_next(SearchCursor* cursor, int max_count) {
+        if (!cursor || max_count <= 0) return {nullptr, 0};
+        std::vector<int> chunk;
+        cursor->next(max_count, chunk);
+        return query_eval::to_int_array(chunk.data(), chunk.size());
+    }
+
+    void close_search_cursor(SearchCursor* cursor) {
+        delete cursor;
+    }
+}
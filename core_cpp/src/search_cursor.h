@@ -0,0 +1,95 @@
+#ifndef SEARCH_CURSOR_H
+#define SEARCH_CURSOR_H
+
+// Internal layout of a SearchCursor. Not part of the public C API.
+
+#include "query_eval.h"
+#include <cstddef>
+#include <memory>
+#include <utility>
+#include <vector>
+
+// The matches of one query, handed out in chunks. Nothing is evaluated up front: the cursor
+// walks the posting lists as far as the matches asked for, and reads the index throughout,
+// so it must be closed before the index (and an in-memory index must not change meanwhile).
+struct SearchCursor {
+    virtual ~SearchCursor() {}
+    virtual int count() const = 0;                                // All matches, whatever the position.
+    virtual void seek(int offset) = 0;                            // Skips to the match with rank `offset`.
+    virtual void next(int max_count, std::vector<int>& out) = 0; // The next matches, ascending.
+};
+
+// A cursor over a parsed query. `is_live(doc)` leaves out deleted documents and must not refer
+// to memory the caller may free, so it owns a copy of any live-docs bitmap.
+template <typename Lookup, typename IsLive>
+class LazySearchCursor : public SearchCursor {
+public:
+    LazySearchCursor(query_eval::QueryNode root, bool has_terms, Lookup lookup, IsLive is_live)
+        : root_(std::move(root)), has_terms_(has_terms), lookup_(std::move(lookup)), is_live_(std::move(is_live)),
+          position_(0), count_(-1) {
+        restart();
+    }
+
+    int count() const override {
+        // Counted once, by a matcher of its own, so the position is left alone.
+        if (count_ < 0) {
+            count_ = 0;
+            if (has_terms_) {
+                Matcher matcher(root_, lookup_);
+                while (next_live(matcher) != query_eval::NO_MORE_DOCS) ++count_;
+            }
+        }
+        return count_;
+    }
+
+    void seek(int offset) override {
+        size_t target = (size_t)std::max(offset, 0);
+        if (target < position_) restart(); // Posting lists only move forwards.
+        if (!matcher_) return;
+        while (position_ < target && next_live(*matcher_) != query_eval::NO_MORE_DOCS) ++position_;
+        if (position_ < target) count_ = (int)position_; // Ran off the end, so this is the count.
+    }
+
+    void next(int max_count, std::vector<int>& out) override {
+        out.clear();
+        while (matcher_ && (int)out.size() < max_count) {
+            int doc = next_live(*matcher_);
+            if (doc == query_eval::NO_MORE_DOCS) break;
+            out.push_back(doc);
+        }
+        position_ += out.size();
+    }
+
+private:
+    typedef query_eval::LazyMatcher<Lookup> Matcher;
+
+    void restart() {
+        matcher_.reset(has_terms_ ? new Matcher(root_, lookup_) : nullptr);
+        position_ = 0;
+    }
+
+    int next_live(Matcher& matcher) const {
+        for (;;) {
+            int doc = matcher.next();
+            if (doc == query_eval::NO_MORE_DOCS || is_live_(doc)) return doc;
+        }
+    }
+
+    query_eval::QueryNode root_;
+    bool has_terms_;
+    Lookup lookup_;
+    IsLive is_live_;
+    std::unique_ptr<Matcher> matcher_; // Null for a query without terms.
+    size_t position_;                  // Rank of the next match to hand out.
+    mutable int count_;                // -1 until known.
+};
+
+// Parses and plans `query` into a heap-allocated cursor for the C API.
+template <typename Lookup, typename DocFreq, typename IsLive>
+SearchCursor* make_search_cursor(const char* query, Lookup lookup, DocFreq doc_freq, IsLive is_live) {
+    query_eval::QueryNode root;
+    bool has_terms = query_eval::parse_query(query, doc_freq, root);
+    return new LazySearchCursor<Lookup, IsLive>(std::move(root), has_terms, std::move(lookup), std::move(is_live));
+}
+
+#endif // SEARCH_CURSOR_H
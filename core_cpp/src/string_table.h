@@ -0,0 +1,154 @@
+#ifndef STRING_TABLE_H
+#define STRING_TABLE_H
+
+// Internal hash table keyed by strings, shared by the in-memory index and the
+// frequency map. Not part of the public C API.
+//
+// Open addressing with linear probing over a power-of-two slot array that
+// doubles whenever it gets 70% full. A slot is 8 bytes: the key's hash and the
+// number of its entry, so a probe compares hashes within one cache line and
+// touches a key only when the hashes match, and growing the table rehashes
+// nothing. Entries (key, value) are kept densely in insertion order and are
+// addressed by their number, which stays valid as the table grows. Keys are
+// copied into a bump-allocated arena instead of being strdup'ed one by one.
+
+#include <algorithm>
+#include <cstddef>
+#include <cstdint>
+#include <cstring>
+#include <memory>
+#include <vector>
+
+// FNV-1a with a final avalanche, so the low bits used for the slot are well mixed.
+inline uint32_t string_hash(const char* key, size_t len) {
+    uint64_t hash = 1469598103934665603ull;
+    for (size_t i = 0; i < len; ++i) {
+        hash ^= (unsigned char)key[i];
+        hash *= 1099511628211ull;
+    }
+    hash ^= hash >> 33;
+    hash *= 0xff51afd7ed558ccdull;
+    hash ^= hash >> 33;
+    return (uint32_t)hash;
+}
+
+// Append-only storage for NUL-terminated copies of strings, freed all at once.
+class StringArena {
+public:
+    StringArena() : next_(nullptr), remaining_(0) {}
+
+    const char* store(const char* s, size_t len) {
+        size_t need = len + 1;
+        char* out;
+        if (need > CHUNK_SIZE / 4) {
+            // Long strings get a block of their own rather than wasting the rest of the current one.
+            chunks_.emplace_back(new char[need]);
+            out = chunks_.back().get();
+        } else {
+            if (need > remaining_) {
+                chunks_.emplace_back(new char[CHUNK_SIZE]);
+                next_ = chunks_.back().get();
+                remaining_ = CHUNK_SIZE;
+            }
+            out = next_;
+            next_ += need;
+            remaining_ -= need;
+        }
+        memcpy(out, s, len);
+        out[len] = '\0';
+        return out;
+    }
+
+private:
+    static const size_t CHUNK_SIZE = 64 * 1024;
+    std::vector<std::unique_ptr<char[]>> chunks_;
+    char* next_;
+    size_t remaining_;
+};
+
+template <typename Value>
+class StringTable {
+public:
+    struct Entry {
+        const char* key; // NUL-terminated, owned by the table's arena.
+        uint32_t key_len;
+        Value value;
+    };
+
+    explicit StringTable(size_t expected_size = 0) : size_mask_(0) {
+        size_t capacity = MIN_CAPACITY;
+        while (capacity * MAX_LOAD_PERCENT / 100 < expected_size) capacity *= 2;
+        slots_.assign(capacity, Slot{0, EMPTY});
+        size_mask_ = capacity - 1;
+        entries_.reserve(expected_size);
+    }
+
+    // Returns the number of the entry holding `key`, or -1.
+    long find(const char* key, size_t len) const {
+        uint32_t hash = string_hash(key, len);
+        for (size_t i = hash & size_mask_;; i = (i + 1) & size_mask_) {
+            const Slot& slot = slots_[i];
+            if (slot.entry == EMPTY) return -1;
+            if (slot.hash == hash && matches(entries_[slot.entry], key, len)) return (long)slot.entry;
+        }
+    }
+
+    // Returns the number of the entry holding `key`, adding it with a value-initialized
+    // Value if it is new.
+    uint32_t insert(const char* key, size_t len, bool* inserted = nullptr) {
+        uint32_t hash = string_hash(key, len);
+        size_t i = hash & size_mask_;
+        for (;; i = (i + 1) & size_mask_) {
+            const Slot& slot = slots_[i];
+            if (slot.entry == EMPTY) break;
+            if (slot.hash == hash && matches(entries_[slot.entry], key, len)) {
+                if (inserted) *inserted = false;
+                return slot.entry;
+            }
+        }
+        uint32_t entry = (uint32_t)entries_.size();
+        entries_.push_back(Entry{arena_.store(key, len), (uint32_t)len, Value()});
+        slots_[i] = Slot{hash, entry};
+        if ((entries_.size() + 1) * 100 > slots_.size() * MAX_LOAD_PERCENT) grow();
+        if (inserted) *inserted = true;
+        return entry;
+    }
+
+    size_t size() const { return entries_.size(); }
+    size_t capacity() const { return slots_.size(); }
+    Entry& entry(size_t n) { return entries_[n]; }
+    const Entry& entry(size_t n) const { return entries_[n]; }
+    Value& value(size_t n) { return entries_[n].value; }
+    const Value& value(size_t n) const { return entries_[n].value; }
+
+private:
+    struct Slot { uint32_t hash; uint32_t entry; };
+    static const uint32_t EMPTY = UINT32_MAX;
+    static const size_t MIN_CAPACITY = 16;
+    static const size_t MAX_LOAD_PERCENT = 70;
+
+    static bool matches(const Entry& entry, const char* key, size_t len) {
+        return entry.key_len == len && memcmp(entry.key, key, len) == 0;
+    }
+
+    // Doubles the slot array, placing entries by their stored hashes.
+    void grow() {
+        std::vector<Slot> slots(slots_.size() * 2, Slot{0, EMPTY});
+        size_t mask = slots.size() - 1;
+        for (const Slot& slot : slots_) {
+            if (slot.entry == EMPTY) continue;
+            size_t i = slot.hash & mask;
+            while (slots[i].entry != EMPTY) i = (i + 1) & mask;
+            slots[i] = slot;
+        }
+        slots_.swap(slots);
+        size_mask_ = mask;
+    }
+
+    std::vector<Slot> slots_;
+    size_t size_mask_;
+    std::vector<Entry> entries_;
+    StringArena arena_;
+};
+
+#endif // STRING_TABLE_H
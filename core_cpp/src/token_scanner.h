@@ -0,0 +1,158 @@
+#ifndef TOKEN_SCANNER_H
+#define TOKEN_SCANNER_H
+
+// Internal streaming tokenizer. Not part of the public C API.
+//
+// A token is a maximal run of ASCII letters and Cyrillic letters (U+0400..U+04FF without
+// the signs and combining marks U+0482..U+0489, which separate words like punctuation).
+// The scanner reads its input once, byte class by byte class from a lookup table,
+// and writes a lower-cased copy of it in which "ё" is folded to "е". Every folding
+// keeps the byte length of a letter, so a token's (start, length) is the same in
+// the input and in the normalized copy, and tokens are reported as offsets into
+// that copy instead of as strings. Input may arrive in chunks of any size: a word
+// or a UTF-8 sequence cut by a chunk boundary is carried over to the next chunk.
+
+#include <cstdint>
+#include <cstring>
+#include <string>
+#include <vector>
+
+namespace token_scanner {
+    enum ByteClass : uint8_t { SEPARATOR, ASCII_LETTER, CYRILLIC_LEAD };
+
+    struct Tables {
+        uint8_t byte_class[256];
+        uint8_t ascii_lower[128];
+        uint16_t cyrillic_lower[256]; // Code point U+0400 + i -> its folded form.
+        bool cyrillic_letter[256];    // Whether code point U+0400 + i is a letter.
+
+        Tables() {
+            for (int c = 0; c < 256; ++c) byte_class[c] = SEPARATOR;
+            for (int c = 0; c < 128; ++c) ascii_lower[c] = (uint8_t)c;
+            for (int c = 'A'; c <= 'Z'; ++c) {
+                byte_class[c] = byte_class[c + 32] = ASCII_LETTER;
+                ascii_lower[c] = (uint8_t)(c + 32);
+            }
+            for (int c = 0xD0; c <= 0xD3; ++c) byte_class[c] = CYRILLIC_LEAD; // U+0400..U+04FF
+            for (int i = 0; i < 256; ++i) {
+                uint16_t code = (uint16_t)(0x400 + i);
+                if (code <= 0x40F) code += 0x50;                      // Ѐ..Џ
+                else if (code <= 0x42F) code += 0x20;                 // А..Я
+                else if (code >= 0x460 && code <= 0x4BF && code != 0x482 && !(code >= 0x483 && code <= 0x489))
+                    code |= 1;                                        // Ѡ..ҿ come in upper/lower pairs
+                else if (code == 0x4C0) code = 0x4CF;                 // Ӏ
+                else if (code >= 0x4C1 && code <= 0x4CE) code += code & 1; // Ӂ..ӎ, odd/even pairs
+                else if (code >= 0x4D0) code |= 1;                    // Ӑ..ӿ
+                if (code == 0x451) code = 0x435;                      // ё -> е
+                cyrillic_lower[i] = code;
+                cyrillic_letter[i] = !(i >= 0x82 && i <= 0x89);       // ҂ and the combining marks
+            }
+        }
+    };
+
+    inline const Tables& tables() {
+        static const Tables instance;
+        return instance;
+    }
+
+    inline bool is_continuation(unsigned char c) { return (c & 0xC0) == 0x80; }
+
+    class Scanner {
+    public:
+        Scanner() : written_(0), pending_lead_(0), in_word_(false) {}
+
+        // Tokenizes the next `len` bytes of the stream. `out` receives the normalized stream bytes
+        // from offset `*base` on (the start of a word left open by the previous chunk), and
+        // `starts`/`lengths` the tokens completed so far, as stream offsets. Byte k of `out` is
+        // byte *base + k of the stream. When `last` is set the stream ends and no word stays open.
+        void feed(const char* data, size_t len, bool last, std::string& out, long long* base,
+                  std::vector<long long>& starts, std::vector<int>& lengths) {
+            const Tables& t = tables();
+            *base = written_ - (long long)carry_.size();
+            // Every input byte yields one output byte (plus a lead byte held over from the last chunk),
+            // so the output is sized once and written through a pointer.
+            out.resize(carry_.size() + len + 1);
+            memcpy(&out[0], carry_.data(), carry_.size());
+            char* o = &out[0];
+            size_t n = carry_.size();
+            size_t word_start = in_word_ ? 0 : NO_WORD;
+            size_t i = 0;
+
+            if (pending_lead_ && (len || last)) { // A letter split between the previous chunk and this one.
+                unsigned char lead = pending_lead_;
+                pending_lead_ = 0;
+                if (len && is_continuation((unsigned char)data[0])) {
+                    n = put_cyrillic(t, o, n, lead, (unsigned char)data[0], *base, word_start, starts, lengths);
+                    i = 1;
+                } else {
+                    close_word(*base, n, word_start, starts, lengths);
+                    o[n++] = (char)lead;
+                }
+            }
+
+            for (; i < len; ++i) {
+                unsigned char c = (unsigned char)data[i];
+                uint8_t cls = t.byte_class[c];
+                if (cls == ASCII_LETTER) {
+                    if (word_start == NO_WORD) word_start = n;
+                    o[n++] = (char)t.ascii_lower[c];
+                } else if (cls == CYRILLIC_LEAD && i + 1 < len && is_continuation((unsigned char)data[i + 1])) {
+                    n = put_cyrillic(t, o, n, c, (unsigned char)data[++i], *base, word_start, starts, lengths);
+                } else if (cls == CYRILLIC_LEAD && i + 1 == len && !last) {
+                    pending_lead_ = c; // Decided by the first byte of the next chunk.
+                } else {
+                    close_word(*base, n, word_start, starts, lengths);
+                    o[n++] = (char)c;
+                }
+            }
+
+            written_ = *base + (long long)n;
+            if (last || word_start == NO_WORD) {
+                close_word(*base, n, word_start, starts, lengths);
+                carry_.clear();
+                in_word_ = false;
+            } else {
+                // The open word is reported with the next chunk, already normalized.
+                carry_.assign(o + word_start, n - word_start);
+                n = word_start;
+                in_word_ = true;
+            }
+            out.resize(n);
+        }
+
+    private:
+        static const size_t NO_WORD = (size_t)-1;
+
+        // Writes a two-byte Cyrillic character: a letter folded and within a word, anything else as is, ending the word.
+        static size_t put_cyrillic(const Tables& t, char* o, size_t n, unsigned char lead, unsigned char cont, long long base,
+                                   size_t& word_start, std::vector<long long>& starts, std::vector<int>& lengths) {
+            int index = ((lead & 0x1F) << 6 | (cont & 0x3F)) - 0x400;
+            if (!t.cyrillic_letter[index]) {
+                close_word(base, n, word_start, starts, lengths);
+                o[n] = (char)lead;
+                o[n + 1] = (char)cont;
+                return n + 2;
+            }
+            if (word_start == NO_WORD) word_start = n;
+            uint16_t code = t.cyrillic_lower[index];
+            o[n] = (char)(0xC0 | (code >> 6));
+            o[n + 1] = (char)(0x80 | (code & 0x3F));
+            return n + 2;
+        }
+
+        static void close_word(long long base, size_t end, size_t& word_start,
+                               std::vector<long long>& starts, std::vector<int>& lengths) {
+            if (word_start == NO_WORD) return;
+            starts.push_back(base + (long long)word_start);
+            lengths.push_back((int)(end - word_start));
+            word_start = NO_WORD;
+        }
+
+        long long written_;           // Stream bytes normalized so far, including the carry.
+        unsigned char pending_lead_;  // First byte of a letter cut off by the end of the last chunk.
+        bool in_word_;
+        std::string carry_;           // Normalized bytes of the word left open by the last chunk.
+    };
+}
+
+#endif // TOKEN_SCANNER_H
@@ -1,31 +1,26 @@
 #include "zipf_api.h"
 #include "core_api.h"
+#include "string_table.h"
+#include <algorithm>
 #include <cstdlib>
 #include <cstring>
+#include <vector>
 
 // =================================================================================
-// CUSTOM NON-STL HASH TABLE FOR FREQUENCIES
+// FREQUENCY MAP (the same string table as the indexer, see string_table.h)
 // =================================================================================
 
-typedef struct FreqNode {
-    char* key;
-    int frequency;
-    struct FreqNode* next;
-} FreqNode;
-
 struct FrequencyMap {
-    FreqNode** buckets;
-    int num_buckets;
+    StringTable<int> frequencies;
     int total_stems;
 };
 
-// Using the same hash function as the indexer
-extern unsigned int hash_func(const char* key, int num_buckets);
-
+// Frequency descending, ties by stem, so both outputs below list the stems in one stable order.
 int compare_freq_pairs(const void* a, const void* b) {
     FreqPair* pairA = (FreqPair*)a;
     FreqPair* pairB = (FreqPair*)b;
-    return (pairB->frequency - pairA->frequency);
+    if (pairA->frequency != pairB->frequency) return pairA->frequency > pairB->frequency ? -1 : 1;
+    return strcmp(pairA->stem, pairB->stem);
 }
 
 // =================================================================================
@@ -33,63 +28,25 @@ int compare_freq_pairs(const void* a, const void* b) {
 // =================================================================================
 extern "C" {
     FrequencyMap* create_freq_map() {
-        FrequencyMap* map = (FrequencyMap*)malloc(sizeof(FrequencyMap));
-        map->num_buckets = 20000; // Larger bucket size for lots of unique words
-        map->buckets = (FreqNode**)calloc(map->num_buckets, sizeof(FreqNode*));
-        map->total_stems = 0;
-        return map;
+        return new FrequencyMap{StringTable<int>(), 0};
     }
 
     void add_stems_to_freq_map(FrequencyMap* map, StringArray stems) {
         for (int i = 0; i < stems.count; ++i) {
             const char* stem = stems.strings[i];
-            unsigned int bucket_index = hash_func(stem, map->num_buckets);
-            bool found = false;
-
-            for (FreqNode* current = map->buckets[bucket_index]; current != nullptr; current = current->next) {
-                if (strcmp(current->key, stem) == 0) {
-                    current->frequency++;
-                    map->total_stems++;
-                    found = true;
-                    break; 
-                }
-            }
-
-            if (found) {
-                continue; // Move to the next stem
-            }
-
-            // Not found, create a new node
-            FreqNode* new_node = (FreqNode*)malloc(sizeof(FreqNode));
-            new_node->key = strdup(stem);
-            new_node->frequency = 1;
-            new_node->next = map->buckets[bucket_index];
-            map->buckets[bucket_index] = new_node;
+            map->frequencies.value(map->frequencies.insert(stem, strlen(stem)))++;
             map->total_stems++;
         }
     }
 
     FreqArray get_freq_map_as_array(FrequencyMap* map) {
         FreqArray array;
-        array.count = 0;
-        
-        // First, count how many unique stems we have
-        for(int i = 0; i < map->num_buckets; ++i) {
-            for(FreqNode* node = map->buckets[i]; node != nullptr; node = node->next) {
-                array.count++;
-            }
-        }
-
+        array.count = (int)map->frequencies.size();
         array.pairs = (FreqPair*)malloc(sizeof(FreqPair) * array.count);
-        
-        // Now, populate the array
-        int k = 0;
-        for(int i = 0; i < map->num_buckets; ++i) {
-            for(FreqNode* node = map->buckets[i]; node != nullptr; node = node->next) {
-                array.pairs[k].stem = strdup(node->key);
-                array.pairs[k].frequency = node->frequency;
-                k++;
-            }
+        for (int k = 0; k < array.count; ++k) {
+            const StringTable<int>::Entry& entry = map->frequencies.entry(k);
+            array.pairs[k].stem = strdup(entry.key);
+            array.pairs[k].frequency = entry.value;
         }
 
         // Sort the array by frequency
@@ -98,19 +55,38 @@ extern "C" {
         return array;
     }
 
-    void destroy_freq_map(FrequencyMap* map) {
-        if (!map) return;
-        for (int i = 0; i < map->num_buckets; ++i) {
-            FreqNode* current = map->buckets[i];
-            while (current) {
-                FreqNode* to_delete = current;
-                current = current->next;
-                free(to_delete->key);
-                free(to_delete);
-            }
+    FreqColumns get_freq_map_columns(FrequencyMap* map) {
+        const StringTable<int>& table = map->frequencies;
+        std::vector<uint32_t> order(table.size());
+        size_t stems_size = 0;
+        for (uint32_t k = 0; k < order.size(); ++k) {
+            order[k] = k;
+            stems_size += table.entry(k).key_len + 1;
         }
-        free(map->buckets);
-        free(map);
+        std::sort(order.begin(), order.end(), [&table](uint32_t a, uint32_t b) {
+            const StringTable<int>::Entry& x = table.entry(a);
+            const StringTable<int>::Entry& y = table.entry(b);
+            return x.value != y.value ? x.value > y.value : strcmp(x.key, y.key) < 0;
+        });
+
+        FreqColumns columns;
+        columns.count = (int)order.size();
+        columns.stems_size = (int)stems_size;
+        columns.stems = (char*)malloc(stems_size + 1);
+        columns.frequencies = (int*)malloc(sizeof(int) * (order.size() + 1));
+        char* out = columns.stems;
+        for (size_t i = 0; i < order.size(); ++i) {
+            const StringTable<int>::Entry& entry = table.entry(order[i]);
+            size_t len = entry.key_len + 1;
+            memcpy(out, entry.key, len);
+            out += len;
+            columns.frequencies[i] = entry.value;
+        }
+        return columns;
+    }
+
+    void destroy_freq_map(FrequencyMap* map) {
+        delete map;
     }
 
     void free_freq_array(FreqArray arr) {
@@ -120,5 +96,9 @@ extern "C" {
         }
         free(arr.pairs);
     }
-}
 
+    void free_freq_columns(FreqColumns columns) {
+        free(columns.stems);
+        free(columns.frequencies);
+    }
+}
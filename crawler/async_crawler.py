@@ -0,0 +1,293 @@
+# crawler/async_crawler.py
+import sys
+import os
+import re
+import time
+import asyncio
+import argparse
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+from bs4 import BeautifulSoup
+
+# Ahead of this directory, where crawler.py would shadow the crawler package.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from crawler.config import MONGO_URI, DB_NAME, ARTICLES_COLLECTION, STATE_COLLECTION
+from crawler.utils import clean_wikipedia_text
+from crawler.frontier import CrawlFrontier, FRONTIER_JOURNAL_PATH
+
+USER_AGENT = 'InfSearchBot/1.0 (https://github.com/your_repo; your_email@example.com)'
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RATE = 1.0 # Requests per second per host, as the serial crawler's time.sleep(1)
+DEFAULT_BURST = 1
+WRITE_BATCH_SIZE = 100
+MAX_RETRIES = 2
+REQUEST_TIMEOUT = 30
+ARTICLE_URL = re.compile(r'.*/wiki/[^:]+$') # Same filter as WikipediaCrawler._is_article
+
+class TokenBucket:
+    """
+    Politeness limiter: `rate` requests per second on average, up to `burst` at once.
+    Waiters are served in arrival order.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class HostRateLimiter:
+    """One token bucket per host, created on first use."""
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+
+    async def acquire(self, url):
+        host = urlsplit(url).netloc
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+        await bucket.acquire()
+
+# --- Parsing (runs in a thread pool, off the event loop) ---
+def parse_category(html, base_url):
+    """Returns the article urls and subcategory urls listed on a category page."""
+    soup = BeautifulSoup(html, 'html.parser')
+    articles = [urljoin(base_url, link['href']) for link in soup.select('#mw-pages a') if link.has_attr('href')]
+    subcategories = [urljoin(base_url, link['href']) for link in soup.select('#mw-subcategories a') if link.has_attr('href')]
+    return [url for url in articles if ARTICLE_URL.match(url)], subcategories
+
+def parse_article(url, html):
+    """Builds an article document (without its article_id) from a page, or returns None if it has no text."""
+    soup = BeautifulSoup(html, 'html.parser')
+    heading = soup.find('h1', {'id': 'firstHeading'})
+    text = clean_wikipedia_text(soup)
+    if heading is None or not text:
+        return None
+    return {
+        "title": heading.text,
+        "url": url,
+        "text": text,
+        "metadata": {
+            "word_count": len(text.split()),
+            "char_count": len(text),
+            "download_date": datetime.utcnow()
+        }
+    }
+
+class AsyncWikipediaCrawler:
+    """
+    Concurrent counterpart of WikipediaCrawler. Up to `concurrency` requests are in flight over
+    one pooled HTTP session, each host is limited to `rate` requests per second, pages are parsed
+    in a thread pool and articles are handed to `store` in batches by a single writer task,
+    which also numbers them. Throughput is thus bounded by the politeness budget, not by latency.
+
+    `store(batch)` persists a list of article documents; `known_urls` are skipped and
+    `first_article_id` is the id given to the first new article. Category and article urls go
+    through `frontier` (an in-memory one by default): a url is done once its page has been
+    processed or its article stored, so a journaled frontier resumes where a crash left off.
+    """
+    def __init__(self, base_url, start_category, store, max_articles=30000, known_urls=(), first_article_id=1,
+                 concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 batch_size=WRITE_BATCH_SIZE, frontier=None):
+        self.base_url = base_url
+        self.start_category_url = urljoin(base_url, start_category)
+        self.store = store
+        self.max_articles = max_articles
+        self.concurrency = concurrency
+        self.limiter = HostRateLimiter(rate, burst)
+        self.batch_size = batch_size
+
+        self.frontier = frontier if frontier is not None else CrawlFrontier(None)
+        if self.frontier.is_new:
+            self.frontier.add(self.start_category_url)
+        self.known_urls = set(known_urls)
+        self.article_ids = itertools.count(first_article_id)
+        self.scheduled = 0 # Articles queued or saved in this run, so max_articles is never overshot.
+        self.saved = 0
+        self.failed = 0
+
+    async def _fetch(self, session, url):
+        """Returns the page text, retrying throttled, server and connection errors with backoff, or None."""
+        for attempt in range(MAX_RETRIES + 1):
+            await self.limiter.acquire(url)
+            try:
+                async with session.get(url) as response:
+                    if response.status < 400:
+                        return await response.text()
+                    error = f"HTTP {response.status}"
+                    if response.status != 429 and response.status < 500:
+                        break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = repr(e)
+            if attempt < MAX_RETRIES:
+                await asyncio.sleep(2 ** attempt)
+        print(f"Error fetching {url}: {error}")
+        return None
+
+    def _enqueue(self, queue, url):
+        """Moves a url from the frontier to the work queue."""
+        if ARTICLE_URL.match(url):
+            self.scheduled += 1
+        queue.put_nowait(url)
+
+    def _schedule(self, queue, url):
+        if url in self.known_urls or url in self.frontier:
+            return
+        if ARTICLE_URL.match(url) and self.scheduled >= self.max_articles:
+            return # Not recorded either, so a later run with a larger budget still finds it.
+        self.frontier.add(url)
+        self._enqueue(queue, self.frontier.pop())
+
+    async def _fetch_worker(self, session, queue, parsed, parse_pool):
+        loop = asyncio.get_running_loop()
+        while True:
+            url = await queue.get()
+            try:
+                is_article = ARTICLE_URL.match(url)
+                if not is_article and self.scheduled >= self.max_articles:
+                    continue # Enough articles; the category stays pending for a later run.
+                html = await self._fetch(session, url)
+                if not is_article:
+                    if html is not None: # A category that failed stays pending for the next run.
+                        print(f"Crawling category: {url}")
+                        articles, subcategories = await loop.run_in_executor(parse_pool, parse_category, html, self.base_url)
+                        for linked_url in articles + subcategories:
+                            self._schedule(queue, linked_url)
+                        self.frontier.done(url)
+                        self.frontier.flush()
+                elif html is None:
+                    self.scheduled -= 1
+                    self.failed += 1
+                    self.frontier.done(url)
+                else:
+                    # The worker moves on to the next url while the page is parsed and written.
+                    await parsed.put((url, loop.run_in_executor(parse_pool, parse_article, url, html)))
+            finally:
+                queue.task_done()
+
+    async def _writer(self, parsed):
+        """
+        Numbers parsed articles in arrival order and stores them in batches off the event loop.
+        Their urls are marked done only once the batch is stored; a batch that fails to store is
+        logged and its urls stay pending, to be fetched again by the next run.
+        """
+        loop = asyncio.get_running_loop()
+        batch = []
+        while True:
+            item = await parsed.get()
+            if item is not None:
+                url, future = item
+                try:
+                    article = await future
+                except Exception as e:
+                    print(f"Error parsing article {url}: {e!r}")
+                    article = None
+                if article is not None:
+                    article["article_id"] = next(self.article_ids)
+                    batch.append(article)
+                else:
+                    self.scheduled -= 1
+                    self.frontier.done(url)
+            if batch and (item is None or len(batch) >= self.batch_size):
+                try:
+                    await loop.run_in_executor(None, self.store, batch)
+                except Exception as e:
+                    print(f"Error storing {len(batch)} articles: {e!r}")
+                    self.scheduled -= len(batch)
+                    self.failed += len(batch)
+                else:
+                    for article in batch:
+                        self.frontier.done(article["url"])
+                    self.frontier.flush()
+                    self.saved += len(batch)
+                    print(f"Saved {self.saved} articles.")
+                batch = []
+            parsed.task_done()
+            if item is None:
+                return
+
+    async def crawl(self):
+        queue = asyncio.Queue()
+        parsed = asyncio.Queue(maxsize=4 * self.batch_size) # Back-pressure on fetching if writes fall behind.
+        while self.frontier:
+            url = self.frontier.pop()
+            if url in self.known_urls: # Stored by a batch whose store call failed part way.
+                self.frontier.done(url)
+            else:
+                self._enqueue(queue, url)
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        with ThreadPoolExecutor(max_workers=max(1, min(4, os.cpu_count() or 1))) as parse_pool:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers={'User-Agent': USER_AGENT}) as session:
+                writer = asyncio.create_task(self._writer(parsed))
+                workers = [asyncio.create_task(self._fetch_worker(session, queue, parsed, parse_pool))
+                           for _ in range(self.concurrency)]
+                # Should the writer die anyway, the workers would block on `parsed` for good,
+                # so the crawl ends with the writer's error instead.
+                joined = asyncio.create_task(queue.join())
+                try:
+                    await asyncio.wait([joined, writer], return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    joined.cancel()
+                    for worker in workers:
+                        worker.cancel()
+                    await asyncio.gather(joined, *workers, return_exceptions=True)
+                    if not writer.done():
+                        await parsed.put(None)
+                    await writer
+        print(f"Crawling finished: {self.saved} articles saved, {self.failed} failed.")
+        return self.saved
+
+def crawl_into_mongo(base_url, start_category, max_articles, journal_path=FRONTIER_JOURNAL_PATH, **options):
+    """Runs the async crawler against MongoDB: resumes from the frontier journal and inserts articles in bulk."""
+    from pymongo import MongoClient
+    client = MongoClient(MONGO_URI)
+    db = client[DB_NAME]
+    articles_collection = db[ARTICLES_COLLECTION]
+    state_collection = db[STATE_COLLECTION]
+    frontier = CrawlFrontier(journal_path)
+    try:
+        if frontier.is_new:
+            frontier.seed_from_state(state_collection.find_one({'_id': 'crawler_state'}) or {})
+        # One pass over the urls and the largest id replaces a find_one per link and a count per article.
+        known_urls = {doc['url'] for doc in articles_collection.find({}, {'url': 1, '_id': 0}) if 'url' in doc}
+        last = articles_collection.find_one({}, {'article_id': 1}, sort=[('article_id', -1)])
+        crawler = AsyncWikipediaCrawler(
+            base_url, start_category, lambda batch: articles_collection.insert_many(batch, ordered=False),
+            max_articles=max(0, max_articles - len(known_urls)), known_urls=known_urls,
+            first_article_id=(last or {}).get('article_id', 0) + 1, frontier=frontier, **options)
+        asyncio.run(crawler.crawl())
+    finally:
+        frontier.close()
+        client.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Crawl Wikipedia categories concurrently into MongoDB.")
+    parser.add_argument('--base-url', default='https://ru.wikipedia.org')
+    parser.add_argument('--category', default='/wiki/Категория:Наука', help="Start category path.")
+    parser.add_argument('--max-articles', type=int, default=15000, help="Size of the corpus to reach.")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Requests in flight at once.")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help="Requests per second per host.")
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST, help="Requests a host may get at once.")
+    args = parser.parse_args()
+
+    crawl_into_mongo(args.base_url, args.category, args.max_articles,
+                     concurrency=args.concurrency, rate=args.rate, burst=args.burst)
@@ -9,12 +9,14 @@ from urllib.parse import urljoin
 
 from config import MONGO_URI, DB_NAME, ARTICLES_COLLECTION, STATE_COLLECTION
 from utils import clean_wikipedia_text
+from frontier import CrawlFrontier, FRONTIER_JOURNAL_PATH
 
 class WikipediaCrawler:
-    def __init__(self, base_url, start_category, max_articles=30000):
+    def __init__(self, base_url, start_category, max_articles=30000, journal_path=FRONTIER_JOURNAL_PATH):
         self.base_url = base_url
         self.start_category_url = urljoin(base_url, start_category)
         self.max_articles = max_articles
+        self.journal_path = journal_path
         
         self.client = MongoClient(MONGO_URI)
         self.db = self.client[DB_NAME]
@@ -29,21 +31,30 @@ class WikipediaCrawler:
     def _get_state(self):
         return self.state_collection.find_one({'_id': 'crawler_state'}) or {}
 
-    def _save_state(self, state):
-        self.state_collection.update_one({'_id': 'crawler_state'}, {'$set': state}, upsert=True)
+    def open_frontier(self):
+        """
+        Opens the crawl frontier journal. A new journal starts from the state document older
+        versions kept in MongoDB, or from the start category.
+        """
+        frontier = CrawlFrontier(self.journal_path)
+        if frontier.is_new:
+            frontier.seed_from_state(self._get_state())
+            frontier.add(self.start_category_url)
+            frontier.flush()
+        return frontier
 
     def crawl(self):
-        state = self._get_state()
-        
-        to_visit_categories = state.get('to_visit_categories', [self.start_category_url])
-        visited_categories = set(state.get('visited_categories', []))
-        visited_articles = set(state.get('visited_articles', []))
+        frontier = self.open_frontier()
         article_count = self.articles_collection.count_documents({})
+        try:
+            self._crawl(frontier, article_count)
+        finally:
+            frontier.close()
+        print("Crawling finished.")
 
-        while to_visit_categories and article_count < self.max_articles:
-            category_url = to_visit_categories.pop(0)
-            if category_url in visited_categories:
-                continue
+    def _crawl(self, frontier, article_count):
+        while frontier and article_count < self.max_articles:
+            category_url = frontier.pop()
 
             print(f"Crawling category: {category_url}")
             
@@ -53,6 +64,7 @@ class WikipediaCrawler:
                 time.sleep(1) # Delay between requests
             except requests.RequestException as e:
                 print(f"Error fetching category {category_url}: {e}")
+                frontier.done(category_url)
                 continue
 
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -60,14 +72,14 @@ class WikipediaCrawler:
             # Find articles in the current category
             for link in soup.select('#mw-pages a'):
                 article_url = urljoin(self.base_url, link['href'])
-                if article_url not in visited_articles and self._is_article(article_url):
+                if article_url not in frontier and self._is_article(article_url):
                     if self.articles_collection.find_one({'url': article_url}):
                         print(f"Skipping already downloaded article: {article_url}")
-                        visited_articles.add(article_url)
+                        frontier.mark_seen(article_url)
                         continue
                         
                     self._process_article(article_url)
-                    visited_articles.add(article_url)
+                    frontier.mark_seen(article_url)
                     article_count += 1
                     if article_count >= self.max_articles:
                         break
@@ -75,20 +87,11 @@ class WikipediaCrawler:
             # Find subcategories
             for link in soup.select('#mw-subcategories a'):
                 if link.has_attr('href'):
-                    subcategory_url = urljoin(self.base_url, link['href'])
-                    if subcategory_url not in visited_categories and subcategory_url not in to_visit_categories:
-                        to_visit_categories.append(subcategory_url)
+                    frontier.add(urljoin(self.base_url, link['href']))
 
-            visited_categories.add(category_url)
-            
-            # Save state periodically
-            self._save_state({
-                'to_visit_categories': to_visit_categories,
-                'visited_categories': list(visited_categories),
-                'visited_articles': list(visited_articles)
-            })
-
-        print("Crawling finished.")
+            # Checkpoint: a few journal records per category, whatever the size of the crawl.
+            frontier.done(category_url)
+            frontier.flush()
 
     def _is_article(self, url):
         # Basic check to filter out special Wikipedia pages
@@ -120,8 +123,6 @@ class WikipediaCrawler:
             "title": title,
             "url": url,
             "text": text,
-            "tokens": [],
-            "stems": [],
             "metadata": {
                 "word_count": word_count,
                 "char_count": char_count,
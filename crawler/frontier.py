@@ -0,0 +1,154 @@
+# crawler/frontier.py
+import os
+import hashlib
+from collections import deque
+
+FRONTIER_JOURNAL_PATH = "crawl_frontier.journal"
+
+# Journal records, one per line, appended as the crawl goes:
+#   Q <url>    url added to the frontier (seen and pending)
+#   D <url>    url processed, no longer pending
+#   S <url>    url seen without being queued (e.g. an article fetched on the spot)
+#   H <hex>    hash of a seen url; compaction writes these instead of S and D records
+# Replaying the journal gives back the pending urls, in order, and the seen-set. A url taken
+# from the frontier but never marked done is pending again after a restart.
+
+def url_hash(url) -> int:
+    """64-bit hash of a url; the seen-set keeps these instead of the urls themselves."""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little')
+
+class CrawlFrontier:
+    """
+    FIFO crawl frontier with a hashed seen-set, persisted as an append-only journal.
+    Every operation appends at most one record, so saving the state costs the same at
+    any crawl size. `journal_path=None` keeps the frontier in memory only.
+    """
+    def __init__(self, journal_path=FRONTIER_JOURNAL_PATH):
+        self.journal_path = journal_path
+        self._queue = deque()
+        self._active = set() # Taken with pop() and not yet done.
+        self._seen = set()
+        self._journal = None
+        self.records = 0 # Records in the journal file.
+        self.is_new = True
+        if journal_path is not None:
+            if os.path.exists(journal_path):
+                self._replay()
+            self._journal = open(journal_path, 'ab')
+            # Compacting drops the S and D records; worth it once they dominate the file.
+            if self.records > 2 * (len(self._seen) + 1000):
+                self.compact()
+
+    def _replay(self):
+        pending = {}
+        good_size = 0
+        with open(self.journal_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break # Torn write from a crash; the record never happened.
+                good_size += len(line)
+                self.records += 1
+                kind, value = line[:1], line[2:-1].decode('utf-8')
+                if kind == b'H':
+                    self._seen.add(int(value, 16))
+                    continue
+                self._seen.add(url_hash(value))
+                if kind == b'Q':
+                    pending[value] = None
+                elif kind == b'D':
+                    pending.pop(value, None)
+        if good_size < os.path.getsize(self.journal_path):
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(good_size)
+        self._queue.extend(pending)
+        self.is_new = self.records == 0
+
+    def _append(self, kind, value):
+        if self._journal is not None:
+            self._journal.write(kind + b' ' + value.encode('utf-8') + b'\n')
+            self.records += 1
+        self.is_new = False
+
+    def __len__(self):
+        """Number of urls waiting to be taken."""
+        return len(self._queue)
+
+    def __contains__(self, url):
+        return url_hash(url) in self._seen
+
+    @property
+    def seen_count(self):
+        return len(self._seen)
+
+    def add(self, url) -> bool:
+        """Queues a url unless it has been seen before; returns whether it was queued."""
+        h = url_hash(url)
+        if h in self._seen:
+            return False
+        self._seen.add(h)
+        self._queue.append(url)
+        self._append(b'Q', url)
+        return True
+
+    def mark_seen(self, url) -> bool:
+        """Records a url as seen without queueing it; returns False if it was already seen."""
+        h = url_hash(url)
+        if h in self._seen:
+            return False
+        self._seen.add(h)
+        self._append(b'S', url)
+        return True
+
+    def pop(self):
+        """Takes the oldest pending url. It stays pending in the journal until done() is called."""
+        url = self._queue.popleft()
+        self._active.add(url)
+        return url
+
+    def done(self, url):
+        """Marks a url taken with pop() as processed."""
+        self._active.discard(url)
+        self._append(b'D', url)
+
+    def pending(self) -> list:
+        """Urls not processed yet: the ones taken and not done, then the queued ones."""
+        return list(self._active) + list(self._queue)
+
+    def flush(self):
+        """Hands the records appended so far to the operating system; call once per crawl step."""
+        if self._journal is not None:
+            self._journal.flush()
+
+    def compact(self):
+        """Rewrites the journal as the seen hashes plus the pending urls, replacing it atomically."""
+        if self.journal_path is None:
+            return
+        pending = self.pending()
+        pending_hashes = {url_hash(url) for url in pending}
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            for h in self._seen:
+                if h not in pending_hashes:
+                    f.write(b'H %016x\n' % h)
+            for url in pending:
+                f.write(b'Q ' + url.encode('utf-8') + b'\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal.close()
+        os.replace(tmp_path, self.journal_path)
+        self._journal = open(self.journal_path, 'ab')
+        self.records = len(self._seen)
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._journal.close()
+            self._journal = None
+
+    def seed_from_state(self, state):
+        """Imports the crawler_state document the crawlers used to keep in MongoDB."""
+        for url in state.get('visited_categories', []) + state.get('visited_articles', []):
+            self.mark_seen(url)
+        for url in state.get('to_visit_categories', []):
+            self.add(url)
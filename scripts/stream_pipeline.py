@@ -0,0 +1,233 @@
+import sys
+import os
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Add project root to path to allow importing 'core'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from core.bridge import CoreBridge
+from search.build_boolean_index import MAPPED_INDEX_FILE_PATH
+from search.doc_store import write_doc_store, merge_doc_stores, DOC_STORE_FILE_PATH
+
+READ_BATCH_SIZE = 500 # Articles tokenized per call into the core
+SEGMENT_DOCS = 50000 # Articles held in the in-memory index before it is written out as a segment
+
+# One pass over the corpus: articles are read, tokenized and indexed by generator stages, each
+# pulling from the one before, so at most `in_flight` batches and one segment's worth of
+# postings are in memory at any time. Segments are merged into the mapped index at the end.
+
+# --- Sources: article documents with article_id and text, and optionally title and url ---
+def read_jsonl(path):
+    """Articles of a JSONL dump, one MongoDB-style article document per line."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def read_mongo(collection, batch_size=READ_BATCH_SIZE):
+    """Articles of the MongoDB collection, read once in natural order."""
+    return collection.find(
+        {"text": {"$exists": True, "$ne": ""}},
+        {"article_id": 1, "text": 1, "title": 1, "url": 1}
+    ).batch_size(batch_size)
+
+# --- Stages ---
+def batched_articles(articles, batch_size=READ_BATCH_SIZE):
+    """Groups the articles that have an id and a text into lists of batch_size."""
+    batch = []
+    for article in articles:
+        if article.get('article_id') is None or not article.get('text'):
+            continue
+        batch.append(article)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def tokenized_batches(bridge, batches, workers=None, in_flight=None):
+    """
+    Tokenizes and stems batches on a thread pool (the core releases the GIL while it works) and
+    yields (batch, [(tokens, stems), ...]) in input order. No more than `in_flight` batches are
+    read ahead of the consumer.
+    """
+    workers = workers or os.cpu_count() or 1
+    in_flight = in_flight or 2 * workers
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch in batches:
+            pending.append((batch, pool.submit(bridge.tokenize_and_stem_batch, [article['text'] for article in batch])))
+            if len(pending) >= in_flight:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+        while pending:
+            batch, future = pending.popleft()
+            yield batch, future.result()
+
+class SegmentWriter:
+    """
+    Index stage: adds documents to an in-memory index and writes it out as a mapped segment
+    every `segment_docs` documents; finish() merges the segments into the output file. With a
+    `doc_store_path`, the titles and urls of each segment are written next to it as a doc-store
+    file of their own and merged the same way, so they are never all held in memory either.
+    """
+    def __init__(self, bridge, out_path, positions=False, segment_docs=SEGMENT_DOCS, doc_store_path=None):
+        self.bridge = bridge
+        self.out_path = out_path
+        self.positions = positions
+        self.segment_docs = segment_docs
+        self.doc_store_path = doc_store_path
+        self.segment_paths = []
+        self.index_ptr = None
+        self.doc_rows = []
+        self.buffered = 0
+        self.doc_count = 0
+
+    def add(self, documents, doc_rows=()):
+        """Indexes (doc_id, stems) pairs; `doc_rows` are their (article_id, title, url) for the doc store."""
+        if self.index_ptr is None:
+            self.index_ptr = self.bridge.lib.create_positional_index() if self.positions else self.bridge.lib.create_index()
+        self.bridge.add_documents_to_index(self.index_ptr, documents)
+        if self.doc_store_path:
+            self.doc_rows.extend(doc_rows)
+        self.buffered += len(documents)
+        self.doc_count += len(documents)
+        if self.buffered >= self.segment_docs:
+            self.flush()
+
+    def flush(self):
+        if self.index_ptr is None:
+            return
+        path = f"{self.out_path}.seg{len(self.segment_paths)}"
+        try:
+            if not self.bridge.save_mapped_index(self.index_ptr, path):
+                raise IOError(f"Could not write segment '{path}'")
+            self.segment_paths.append(path)
+            if self.doc_store_path:
+                write_doc_store(path + ".docs", self.doc_rows)
+        finally:
+            self.bridge.lib.destroy_index(self.index_ptr)
+            self.index_ptr = None
+            self.doc_rows = []
+            self.buffered = 0
+
+    def finish(self):
+        """Writes the last segment and replaces the output file (and doc store) with the merged ones."""
+        if not self.segment_paths and self.index_ptr is None:
+            self.index_ptr = self.bridge.lib.create_positional_index() if self.positions else self.bridge.lib.create_index()
+        self.flush()
+        if self.doc_store_path:
+            merge_doc_stores(self.doc_store_path, [path + ".docs" for path in self.segment_paths])
+        if len(self.segment_paths) == 1:
+            os.replace(self.segment_paths.pop(), self.out_path)
+        elif not self.bridge.merge_mapped_indexes(self.segment_paths, self.out_path):
+            raise IOError(f"Could not merge segments into '{self.out_path}'")
+        self.close()
+
+    def close(self):
+        """Frees the in-memory index and removes the segment files; safe to call more than once."""
+        if self.index_ptr is not None:
+            self.bridge.lib.destroy_index(self.index_ptr)
+            self.index_ptr = None
+        self.doc_rows = []
+        for path in self.segment_paths:
+            for segment_file in (path, path + ".docs"):
+                if os.path.exists(segment_file):
+                    os.remove(segment_file)
+        self.segment_paths = []
+
+def run_pipeline(articles, out_path=MAPPED_INDEX_FILE_PATH, bridge=None, batch_size=READ_BATCH_SIZE, workers=None,
+                 in_flight=None, positions=False, segment_docs=SEGMENT_DOCS, doc_store_path=None, on_batch=None):
+    """
+    Reads, tokenizes and indexes `articles` in one pass and writes the mapped index to `out_path`.
+    `doc_store_path` also writes a doc-store file; `on_batch(batch, results)` is called with every
+    tokenized batch, e.g. to persist the stems. Returns the number of documents indexed.
+    """
+    bridge = bridge or CoreBridge()
+    writer = SegmentWriter(bridge, out_path, positions=positions, segment_docs=segment_docs, doc_store_path=doc_store_path)
+    started = time.monotonic()
+    try:
+        for batch, results in tokenized_batches(bridge, batched_articles(articles, batch_size), workers, in_flight):
+            indexed = [(article, stems) for article, (_, stems) in zip(batch, results) if stems]
+            writer.add([(article['article_id'], stems) for article, stems in indexed],
+                       [(article['article_id'], article.get('title'), article.get('url')) for article, _ in indexed])
+            if on_batch is not None:
+                on_batch(batch, results)
+            elapsed = time.monotonic() - started
+            print(f"Indexed {writer.doc_count} documents ({writer.doc_count / elapsed if elapsed > 0 else 0:.0f} docs/s)...")
+        writer.finish()
+    finally:
+        writer.close()
+    return writer.doc_count
+
+def store_stems(collection, dictionary):
+    """An on_batch hook that saves the stems of each batch to MongoDB as packed term ids, like tokenize_batch.py."""
+    from tokenizer.tokenize_batch import make_update, write_updates
+
+    def on_batch(batch, results):
+        updates = [make_update(article['_id'], tokens, stems, dictionary) for article, (tokens, stems) in zip(batch, results)]
+        if updates:
+            write_updates(collection, dictionary, updates, ordered=False)
+    return on_batch
+
+def publish_index_zipf(bridge, index_path, db=None):
+    """Zipf stats from the new index: into MongoDB and the plot artifacts, or the artifacts alone without a database."""
+    from analysis.zipf_analysis import publish_zipf_stats, zipf_rows, save_zipf_artifacts, ZIPF_PLOT_LIMIT
+    with bridge.managed_mapped_index(index_path) as index_ptr:
+        term_stats = bridge.get_mapped_term_stats(index_ptr)
+    if db is not None:
+        publish_zipf_stats(db, term_stats)
+    elif term_stats:
+        top = zipf_rows(term_stats)[:ZIPF_PLOT_LIMIT]
+        save_zipf_artifacts([row['rank'] for row in top], [row['frequency'] for row in top])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tokenize and index the corpus in a single streaming pass.")
+    parser.add_argument('--jsonl', metavar='PATH', help="Read articles from a JSONL dump instead of MongoDB.")
+    parser.add_argument('--out', default=MAPPED_INDEX_FILE_PATH, help="Path of the mapped index to write.")
+    parser.add_argument('--batch-size', type=int, default=READ_BATCH_SIZE, help="Articles per tokenizer call.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Tokenizer threads.")
+    parser.add_argument('--in-flight', type=int, default=None, help="Batches read ahead of the index stage (default: 2 per worker).")
+    parser.add_argument('--segment-docs', type=int, default=SEGMENT_DOCS,
+                        help="Articles indexed in memory before a segment is written; bounds the memory used.")
+    parser.add_argument('--positions', action='store_true', help="Store term positions, for phrase and NEAR queries.")
+    parser.add_argument('--doc-store', action='store_true', help=f"Also write titles and urls to '{DOC_STORE_FILE_PATH}'.")
+    parser.add_argument('--store-tokens', action='store_true',
+                        help="Also save each article's stems to MongoDB as term ids, as tokenize_batch.py does.")
+    parser.add_argument('--zipf', action='store_true', help="Recalculate the Zipf stats from the new index.")
+    args = parser.parse_args()
+    if args.jsonl and args.store_tokens:
+        parser.error("--store-tokens needs the articles to come from MongoDB.")
+
+    bridge = CoreBridge()
+    client, db, on_batch, dictionary = None, None, None, None
+    if args.jsonl:
+        articles = read_jsonl(args.jsonl)
+    else:
+        from pymongo import MongoClient
+        from crawler.config import MONGO_URI, DB_NAME, ARTICLES_COLLECTION
+        client = MongoClient(MONGO_URI)
+        db = client[DB_NAME]
+        articles = read_mongo(db[ARTICLES_COLLECTION], args.batch_size)
+        if args.store_tokens:
+            from search.term_dictionary import TermDictionary, TERMS_COLLECTION
+            dictionary = TermDictionary(db[TERMS_COLLECTION], bridge)
+            on_batch = store_stems(db[ARTICLES_COLLECTION], dictionary)
+
+    print(f"Starting streaming index build using C++ Core v{bridge.get_version()}...")
+    start_time = time.monotonic()
+    try:
+        doc_count = run_pipeline(articles, args.out, bridge, batch_size=args.batch_size, workers=args.workers,
+                                 in_flight=args.in_flight, positions=args.positions, segment_docs=args.segment_docs,
+                                 doc_store_path=DOC_STORE_FILE_PATH if args.doc_store else None, on_batch=on_batch)
+        print(f"Indexed {doc_count} documents into '{args.out}' in {time.monotonic() - start_time:.1f}s.")
+        if args.zipf:
+            publish_index_zipf(bridge, args.out, db)
+    finally:
+        if dictionary is not None:
+            dictionary.close()
+        if client is not None:
+            client.close()
@@ -1,58 +1,291 @@
 import sys
 import os
+import re
 import time
+import threading
 from pymongo import MongoClient
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from core.bridge import CoreBridge
 from crawler.config import MONGO_URI, DB_NAME, ARTICLES_COLLECTION
+from search.segments import SegmentedIndex, SEGMENTS_DIR
+from search.cache import LRUCache
+from search.doc_store import DocStore, DOC_STORE_FILE_PATH
 
 INDEX_FILE_PATH = "boolean_index.bin"
+MAPPED_INDEX_FILE_PATH = "boolean_index.idx"
+
+DEFAULT_TOP_K = 10 # Results returned by a ranked search unless asked otherwise
+RESULTS_PER_PAGE = 20 # Page size of search_page unless asked otherwise
+RESULT_CACHE_BYTES = 64 * 1024 * 1024 # Budget of the cache of finished result lists
+NORMALIZED_QUERY_CACHE_SIZE = 10000 # Raw queries whose normalized form is remembered
+QUERY_OPERATORS = ("AND", "OR", "NOT")
+NEAR_OPERATOR_RE = re.compile(r"NEAR/\d{1,6}", re.IGNORECASE)
+# Parentheses and quotes are tokens of their own; everything between them and whitespace is a word chunk.
+QUERY_TOKEN_RE = re.compile(r'[()"]|[^\s()"]+')
+
+class IndexHandle:
+    """
+    Owns a pointer to a core index and frees it when the last reference goes away. A search
+    holds the handle for its whole duration, so replacing the engine's index (e.g. after a
+    rebuild) never frees one that another thread is still reading.
+    """
+    def __init__(self, ptr, release):
+        self.ptr = ptr
+        self._release = release
+
+    def __del__(self):
+        if getattr(self, 'ptr', None):
+            self._release(self.ptr)
+            self.ptr = None
 
 class BooleanSearchEngine:
+    """
+    Boolean and ranked search over the C++ index. One engine can serve many threads at once:
+    the core only reads the index during a search and ctypes releases the GIL for every call
+    into it, so concurrent queries run in parallel in the core.
+    """
     def __init__(self):
         self.bridge = CoreBridge()
-        print("Loading C++ index from file...")
-        self.index_ptr = self.bridge.lib.load_index_from_file(INDEX_FILE_PATH.encode('utf-8'))
-        if not self.index_ptr:
-            raise IOError(f"Could not load index file: {INDEX_FILE_PATH}. Please build it first.")
+        self.index = None
+        self._swap_lock = threading.Lock() # Serializes remapping a rebuilt index or doc-store file
+        # An incrementally updated segment directory (see update_index.py) wins over single files.
+        self.segmented = SegmentedIndex(SEGMENTS_DIR, self.bridge) if SegmentedIndex.exists(SEGMENTS_DIR) else None
+        # Prefer the memory-mapped index: it opens instantly and its pages are
+        # shared by every process serving the same file.
+        self.mapped = False
+        if self.segmented:
+            print(f"Using segmented index in '{SEGMENTS_DIR}' ({len(self.segmented.segments)} segments).")
+        elif os.path.exists(MAPPED_INDEX_FILE_PATH):
+            print("Mapping C++ index file...")
+            self._mapped_version = self._file_version(MAPPED_INDEX_FILE_PATH)
+            index_ptr = self.bridge.open_mapped_index(MAPPED_INDEX_FILE_PATH)
+            if index_ptr:
+                self.mapped = True
+                self.index = IndexHandle(index_ptr, self.bridge.close_mapped_index)
+                index_path = MAPPED_INDEX_FILE_PATH
+            else:
+                # E.g. a file written by an older core whose format version this one rejects.
+                print(f"Warning: Could not map '{MAPPED_INDEX_FILE_PATH}' (corrupt or from another version), "
+                      f"falling back to '{INDEX_FILE_PATH}'. Rebuild the mapped index to use it.")
+        if not self.segmented and not self.mapped:
+            print("Loading C++ index from file...")
+            self.index = IndexHandle(self.bridge.lib.load_index_from_file(INDEX_FILE_PATH.encode('utf-8')),
+                                     self.bridge.lib.destroy_index)
+            index_path = INDEX_FILE_PATH
+        if not self.segmented and not self.index.ptr:
+            raise IOError(f"Could not load index file: {index_path}. Please build it first.")
+
+        # Head queries repeat a lot: finished results are cached per index generation, so an
+        # index update never serves stale hits, and the core keeps hot posting lists decoded.
+        self.result_cache = LRUCache(RESULT_CACHE_BYTES)
+        self.query_cache = LRUCache(NORMALIZED_QUERY_CACHE_SIZE, sizeof=lambda value: 1)
         
+        # Titles and urls come from the doc-store file when the build wrote one; MongoDB
+        # is only asked for documents the store does not hold (e.g. indexed since).
+        self.doc_store = None
+        self._doc_store_version = None
         client = MongoClient(MONGO_URI)
         self.articles_collection = client[DB_NAME][ARTICLES_COLLECTION]
         print("Search engine initialized.")
 
-    def __del__(self):
-        # Destructor to free the C++ index memory when the object is destroyed
-        if hasattr(self, 'index_ptr') and self.index_ptr:
-            print("Destroying C++ index.")
-            self.bridge.lib.destroy_index(self.index_ptr)
-
-    def search(self, query: str):
-        # Pre-process query: tokenize, stem, and format for C++ search
-        # (e.g., "наука И технология" -> "наук AND технолог")
-        tokens = self.bridge.tokenize(query)
+    def normalize_query(self, query: str) -> str:
+        """
+        Tokenizes and stems the words of a query while keeping operators, parentheses and
+        phrase quotes for the C++ parser (e.g., "наука and (технологии OR исследования)" ->
+        "наук AND ( технолог OR исследован )", '"закон Ципфа" near/3 корпус' ->
+        '" закон ципфа " NEAR/3 корпус'). Inside quotes every chunk is a word.
+        """
         processed_tokens = []
-        for token in tokens:
-            if token.upper() in ["AND", "OR", "NOT"]:
-                processed_tokens.append(token.upper())
+        in_phrase = False
+        for chunk in QUERY_TOKEN_RE.findall(query):
+            if chunk == '"':
+                processed_tokens.append(chunk)
+                in_phrase = not in_phrase
+            elif chunk in ("(", ")"):
+                if not in_phrase:
+                    processed_tokens.append(chunk)
+            elif not in_phrase and chunk.upper() in QUERY_OPERATORS:
+                processed_tokens.append(chunk.upper())
+            elif not in_phrase and NEAR_OPERATOR_RE.fullmatch(chunk):
+                processed_tokens.append(chunk.upper())
             else:
-                processed_tokens.append(self.bridge.stem_word(token))
-        
-        processed_query = " ".join(processed_tokens)
+                # A chunk such as "научно-технический" yields several words, ANDed by the parser.
+                processed_tokens.extend(self.bridge.stem_word(token) for token in self.bridge.tokenize(chunk))
+        return " ".join(processed_tokens)
+
+    def _normalize_cached(self, query: str) -> str:
+        processed_query = self.query_cache.get(query)
+        if processed_query is None:
+            processed_query = self.normalize_query(query)
+            self.query_cache.put(query, processed_query)
+        return processed_query
+
+    @staticmethod
+    def _file_version(path):
+        # Index files are replaced by rename, so a rebuilt file has a new inode.
+        st = os.stat(path)
+        return (st.st_ino, st.st_mtime_ns)
+
+    def index_generation(self):
+        """
+        Identifies the current state of the index; it changes whenever the index does.
+        Picks up segments added or merged by update_index.py and a rebuilt mapped file.
+        """
+        return self._snapshot()[0]
+
+    def _snapshot(self):
+        """The current (generation, index handle); the handle is None for the segmented index."""
+        if self.segmented:
+            self.segmented.refresh()
+            return ("segments", self.segmented.generation), None
+        if self.mapped:
+            try:
+                version = self._file_version(MAPPED_INDEX_FILE_PATH)
+            except FileNotFoundError:
+                version = self._mapped_version
+            if version != self._mapped_version:
+                with self._swap_lock:
+                    if version != self._mapped_version:
+                        index_ptr = self.bridge.open_mapped_index(MAPPED_INDEX_FILE_PATH)
+                        if index_ptr:
+                            print("Index file changed, remapping it.")
+                            self.index = IndexHandle(index_ptr, self.bridge.close_mapped_index)
+                            self._mapped_version = version
+            with self._swap_lock:
+                return ("mapped", self._mapped_version), self.index
+        return ("bin", 0), self.index # The legacy index is loaded once and never changes.
+
+    def search(self, query: str, mode: str = "boolean", k: int = DEFAULT_TOP_K):
+        """
+        Runs a query in one of two modes:
+          - "boolean": every matching article, by ascending article_id;
+          - "ranked": the k best articles by BM25, best first, each with a 'score'.
+        Repeated queries are answered from the result cache until the index changes.
+        """
+        results_docs, _, execution_time = self.search_page(query, offset=0, limit=None, mode=mode, k=k)
+        return results_docs, execution_time
+
+    def search_page(self, query: str, offset: int = 0, limit: int = RESULTS_PER_PAGE,
+                    mode: str = "boolean", k: int = DEFAULT_TOP_K):
+        """
+        Returns one page of a search: (articles offset .. offset + limit - 1, total matches, seconds).
+        Only the ids of the page are copied out of the core and looked up, so a broad query
+        costs about as much as a narrow one. `limit=None` returns every result from `offset` on.
+        """
+        processed_query = self._normalize_cached(query)
         print(f"Processed query: '{processed_query}'")
 
         start_time = time.time()
-        doc_ids = self.bridge.search_index(self.index_ptr, processed_query)
+        generation, index = self._snapshot()
+        cache_key = (generation, mode, k if mode == "ranked" else None, processed_query, offset, limit)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            cached_docs, total = cached
+            return [dict(doc) for doc in cached_docs], total, round(time.time() - start_time, 4)
+
+        if mode == "ranked":
+            ranked = self._search_ranked(processed_query, k, index)
+            total = len(ranked)
+            ranked = ranked[offset:None if limit is None else offset + limit]
+            doc_ids = [doc_id for doc_id, _ in ranked]
+        else:
+            doc_ids, total = self._search_boolean_page(processed_query, offset, limit, generation, index)
         end_time = time.time()
         
         execution_time = round(end_time - start_time, 4)
         
-        results_docs = list(self.articles_collection.find(
-            {"article_id": {"$in": doc_ids}},
-            {"title": 1, "url": 1, "_id": 0}
-        ))
+        results_docs = self.fetch_documents(doc_ids)
+        rank = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+        results_docs.sort(key=lambda doc: rank[doc['article_id']])
+        if mode == "ranked":
+            scores = dict(ranked)
+            for doc in results_docs:
+                doc['score'] = round(scores[doc['article_id']], 3)
+        self.result_cache.put(cache_key, ([dict(doc) for doc in results_docs], total))
         
-        return results_docs, execution_time
+        return results_docs, total, execution_time
+
+    def count(self, query: str) -> int:
+        """Number of articles matching a boolean query; nothing but the count leaves the core."""
+        processed_query = self._normalize_cached(query)
+        generation, index = self._snapshot()
+        return self._count(processed_query, generation, index)
+
+    def _count(self, processed_query: str, generation, index) -> int:
+        # Kept per generation, so the pages of a query walk its matches for the total only once.
+        cache_key = (generation, "count", None, processed_query)
+        total = self.result_cache.get(cache_key)
+        if total is None:
+            if self.segmented:
+                total = self.segmented.count(processed_query)
+            elif self.mapped:
+                total = self.bridge.count_mapped_index_matches(index.ptr, processed_query)
+            else:
+                total = self.bridge.count_index_matches(index.ptr, processed_query)
+            self.result_cache.put(cache_key, total)
+        return total
+
+    def _search_boolean_page(self, processed_query: str, offset: int, limit, generation, index):
+        # The cursor only walks the matches up to the end of the page; the total comes from _count.
+        total = self._count(processed_query, generation, index)
+        if self.segmented:
+            return self.segmented.search_page(processed_query, offset, limit, total=total)
+        if self.mapped:
+            cursor = self.bridge.open_mapped_search_cursor(index.ptr, processed_query)
+        else:
+            cursor = self.bridge.open_search_cursor(index.ptr, processed_query)
+        with self.bridge.managed_search_cursor(cursor):
+            self.bridge.search_cursor_seek(cursor, offset)
+            return self.bridge.search_cursor_next(cursor, total if limit is None else limit), total
+
+    def _current_doc_store(self):
+        """The doc store, remapped if the file was rewritten; None if there is none."""
+        try:
+            version = self._file_version(DOC_STORE_FILE_PATH)
+        except FileNotFoundError:
+            return self.doc_store
+        if version != self._doc_store_version:
+            with self._swap_lock:
+                if version != self._doc_store_version:
+                    try:
+                        # The old store is unmapped once no lookup holds it any more.
+                        self.doc_store = DocStore(DOC_STORE_FILE_PATH)
+                        self._doc_store_version = version
+                    except IOError as e:
+                        print(f"Ignoring document store: {e}")
+        return self.doc_store
+
+    def fetch_documents(self, doc_ids) -> list:
+        """Title, url and article_id of the given documents, from the doc store if possible."""
+        doc_store = self._current_doc_store()
+        if doc_store is not None:
+            results_docs, doc_ids = doc_store.lookup(doc_ids)
+        else:
+            results_docs = []
+        if doc_ids:
+            results_docs.extend(self.articles_collection.find(
+                {"article_id": {"$in": doc_ids}},
+                {"title": 1, "url": 1, "article_id": 1, "_id": 0}
+            ))
+        return results_docs
+
+    def cache_stats(self) -> dict:
+        """Hit/miss counters and sizes of the result cache and of the core's postings caches."""
+        if self.segmented:
+            postings = self.segmented.postings_cache_stats()
+        elif self.mapped:
+            postings = self.bridge.postings_cache_stats(self._snapshot()[1].ptr)
+        else:
+            postings = {} # The in-memory index has nothing to decode.
+        return {"results": self.result_cache.stats(), "queries": self.query_cache.stats(), "postings": postings}
+
+    def _search_ranked(self, processed_query: str, k: int, index) -> list:
+        if self.segmented:
+            return self.segmented.search_ranked(processed_query, k)
+        if not self.mapped:
+            raise ValueError("Ranked search needs the memory-mapped index, rebuild it with build_boolean_index.py.")
+        return self.bridge.search_mapped_index_ranked(index.ptr, processed_query, k)
 
 if __name__ == '__main__':
     engine = BooleanSearchEngine()
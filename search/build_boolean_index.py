@@ -1,17 +1,68 @@
 import sys
 import os
+import argparse
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pymongo import MongoClient
 
 # Add project root to path to allow importing 'core'
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from core.bridge import CoreBridge
 from crawler.config import MONGO_URI, DB_NAME, ARTICLES_COLLECTION
+from search.doc_store import write_doc_store, DOC_STORE_FILE_PATH
+from search.term_dictionary import TermDictionary, TERMS_COLLECTION, TERM_IDS_FIELD
 
 INDEX_FILE_PATH = "boolean_index.bin"
+MAPPED_INDEX_FILE_PATH = "boolean_index.idx"
+BATCH_SIZE = 1000 # Documents handed to the C++ core per call
 
-def build_index():
+# We need documents that have stems, stored as term ids (see search/term_dictionary.py)
+STEMMED_QUERY = {TERM_IDS_FIELD: {"$exists": True, "$ne": b""}}
+STEMMED_PROJECTION = {"article_id": 1, TERM_IDS_FIELD: 1, "_id": 0}
+
+def index_documents(bridge, index_ptr, dictionary, cursor, label=""):
+    """
+    Feeds (article_id, term ids) documents from a cursor into the index in batches; the ids are
+    resolved through the term dictionary in the core. Returns the document count.
+    """
+    doc_count = 0
+    batch = []
+    for doc in cursor:
+        doc_id = doc.get('article_id')
+        term_ids = doc.get(TERM_IDS_FIELD)
+
+        if doc_id is None or not term_ids:
+            continue
+
+        batch.append((doc_id, term_ids))
+        if len(batch) == BATCH_SIZE:
+            dictionary.add_to_index(index_ptr, batch)
+            doc_count += len(batch)
+            batch = []
+            print(f"{label}Processed {doc_count} documents...")
+
+    dictionary.add_to_index(index_ptr, batch)
+    doc_count += len(batch)
+    return doc_count
+
+def build_doc_store(articles_collection, path=DOC_STORE_FILE_PATH):
+    """Writes the title and url of every indexed article to a doc-store file, so search results need no database lookup."""
+    print(f"Saving document store to '{path}'...")
+    cursor = articles_collection.find(
+        STEMMED_QUERY,
+        {"article_id": 1, "title": 1, "url": 1, "_id": 0}
+    ).batch_size(BATCH_SIZE)
+    doc_count = write_doc_store(path, (
+        (doc['article_id'], doc.get('title'), doc.get('url')) for doc in cursor if doc.get('article_id') is not None
+    ))
+    print(f"Document store saved with {doc_count} documents.")
+
+def build_index(positions=False, doc_store=False):
     """
     Builds the inverted index using the C++ core library and saves it to a file.
+    With `positions`, the mapped index also stores term positions for phrase and NEAR queries;
+    with `doc_store`, the titles and urls of the articles are saved to a doc-store file as well.
     """
     bridge = CoreBridge()
     client = MongoClient(MONGO_URI)
@@ -19,41 +70,118 @@ def build_index():
     articles_collection = db[ARTICLES_COLLECTION]
 
     print(f"Starting index build using C++ Core v{bridge.get_version()}...")
-    
-    # Use the context manager to ensure the index is always destroyed
-    with bridge.managed_index() as index_ptr:
-        print("C++ index created in memory.")
-        
-        # We need documents that have stems
-        cursor = articles_collection.find(
-            {"stems": {"$exists": True, "$ne": []}},
-            {"article_id": 1, "stems": 1}
-        )
-
-        doc_count = 0
-        for doc in cursor:
-            doc_id = doc.get('article_id')
-            stems = doc.get('stems')
-
-            if doc_id is None or not stems:
-                continue
-
-            bridge.add_document_to_index(index_ptr, doc_id, stems)
-            doc_count += 1
-            if doc_count % 1000 == 0:
-                print(f"Processed {doc_count} documents...")
+
+    # Use the context managers to ensure the index and the dictionary are always destroyed
+    with TermDictionary(db[TERMS_COLLECTION], bridge) as dictionary, bridge.managed_index(positions=positions) as index_ptr:
+        print(f"C++ index created in memory; term dictionary loaded with {len(dictionary)} stems.")
+
+        cursor = articles_collection.find(STEMMED_QUERY, STEMMED_PROJECTION).batch_size(BATCH_SIZE)
+        doc_count = index_documents(bridge, index_ptr, dictionary, cursor)
 
         print(f"Finished processing {doc_count} documents.")
 
         print(f"Saving index to '{INDEX_FILE_PATH}'...")
-        result = bridge.save_index(index_ptr, INDEX_FILE_PATH)
-        if result == 0:
-            print("Index saved successfully (Note: C++ save is a placeholder).")
+        if bridge.save_index(index_ptr, INDEX_FILE_PATH):
+            print("Index saved successfully.")
+        else:
+            print("Failed to save index.")
+
+        print(f"Saving memory-mapped index to '{MAPPED_INDEX_FILE_PATH}'...")
+        if bridge.save_mapped_index(index_ptr, MAPPED_INDEX_FILE_PATH):
+            print("Memory-mapped index saved successfully.")
         else:
-            print("Failed to save index (Note: C++ save is a placeholder, this is expected).")
+            print("Failed to save memory-mapped index.")
+
+    if doc_store:
+        build_doc_store(articles_collection)
 
     print("Index build process complete.")
     client.close()
 
+# --- Parallel build ---
+def build_segment(first_id, last_id, segment_path, positions=False):
+    """
+    Worker process: indexes the documents with first_id <= article_id <= last_id
+    and writes them as a mapped index segment. Returns the document count.
+    """
+    bridge = CoreBridge()
+    client = MongoClient(MONGO_URI)
+    db = client[DB_NAME]
+    articles_collection = db[ARTICLES_COLLECTION]
+    try:
+        with TermDictionary(db[TERMS_COLLECTION], bridge) as dictionary, bridge.managed_index(positions=positions) as index_ptr:
+            cursor = articles_collection.find(
+                {**STEMMED_QUERY, "article_id": {"$gte": first_id, "$lte": last_id}}, STEMMED_PROJECTION
+            ).sort("article_id", 1).batch_size(BATCH_SIZE)
+            doc_count = index_documents(bridge, index_ptr, dictionary, cursor, label=f"[{first_id}-{last_id}] ")
+            if not bridge.save_mapped_index(index_ptr, segment_path):
+                raise IOError(f"Could not write segment '{segment_path}'")
+        return doc_count
+    finally:
+        client.close()
+
+def split_id_range(first_id, last_id, parts):
+    """Splits [first_id, last_id] into at most `parts` contiguous, non-empty ranges."""
+    span = last_id - first_id + 1
+    parts = max(1, min(parts, span))
+    bounds = [first_id + span * i // parts for i in range(parts + 1)]
+    return [(bounds[i], bounds[i + 1] - 1) for i in range(parts)]
+
+def build_index_parallel(workers, positions=False, doc_store=False):
+    """
+    Builds the mapped index with `workers` processes, each indexing one article_id range
+    into its own segment, then k-way merges the segments' dictionaries and postings in the core.
+    Only the memory-mapped index is written; the legacy boolean_index.bin needs build_index().
+    """
+    bridge = CoreBridge()
+    client = MongoClient(MONGO_URI)
+    articles_collection = client[DB_NAME][ARTICLES_COLLECTION]
+    bounds = [
+        articles_collection.find_one(STEMMED_QUERY, {"article_id": 1}, sort=[("article_id", direction)])
+        for direction in (1, -1)
+    ]
+    if not all(bounds):
+        client.close()
+        print("No stemmed documents found, nothing to index.")
+        return
+
+    ranges = split_id_range(bounds[0]['article_id'], bounds[1]['article_id'], workers)
+    segment_paths = [f"{MAPPED_INDEX_FILE_PATH}.seg{i}" for i in range(len(ranges))]
+    print(f"Starting parallel index build with {len(ranges)} workers using C++ Core v{bridge.get_version()}...")
+
+    start_time = time.monotonic()
+    try:
+        with ProcessPoolExecutor(max_workers=len(ranges), mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(build_segment, first, last, path, positions) for (first, last), path in zip(ranges, segment_paths)]
+            doc_count = sum(future.result() for future in futures)
+        print(f"Finished processing {doc_count} documents in {time.monotonic() - start_time:.1f}s.")
+
+        print(f"Merging {len(segment_paths)} segments into '{MAPPED_INDEX_FILE_PATH}'...")
+        if bridge.merge_mapped_indexes(segment_paths, MAPPED_INDEX_FILE_PATH):
+            print("Memory-mapped index saved successfully.")
+        else:
+            print("Failed to merge index segments.")
+        if doc_store:
+            build_doc_store(articles_collection)
+    finally:
+        client.close()
+        for path in segment_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    print(f"Index build process complete in {time.monotonic() - start_time:.1f}s.")
+
 if __name__ == '__main__':
-    build_index()
+    parser = argparse.ArgumentParser(description="Build the boolean index from the stemmed articles.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of worker processes; more than 1 builds segments in parallel and merges them.")
+    parser.add_argument('--positions', action='store_true',
+                        help="Store term positions in the mapped index, for phrase and NEAR queries.")
+    parser.add_argument('--doc-store', action='store_true',
+                        help=f"Also write article titles and urls to '{DOC_STORE_FILE_PATH}', so search skips MongoDB.")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        build_index_parallel(args.workers, positions=args.positions, doc_store=args.doc_store)
+    else:
+        build_index(positions=args.positions, doc_store=args.doc_store)
@@ -0,0 +1,164 @@
+import bisect
+import heapq
+import mmap
+import os
+import struct
+from array import array
+
+DOC_STORE_FILE_PATH = "boolean_index.docs"
+
+# File layout (native byte order, like the mapped index):
+#   header        magic, version, document count
+#   ids           int32 article_id per document, ascending, padded to 8 bytes
+#   offsets       uint64 * (2 * count + 1): document i's title is heap[offsets[2i]:offsets[2i+1]]
+#                 and its url heap[offsets[2i+1]:offsets[2i+2]]
+#   heap          UTF-8 titles and urls, back to back
+DOC_STORE_MAGIC = b"INFDOCS\0"
+DOC_STORE_VERSION = 1
+HEADER = struct.Struct("=8sII")
+
+
+def write_doc_store(path, documents) -> int:
+    """
+    Writes (article_id, title, url) triples to a doc-store file, replacing it atomically.
+    Later duplicates of an article_id win. Returns the number of documents written.
+    """
+    latest = {}
+    for article_id, title, url in documents:
+        latest[article_id] = ((title or "").encode("utf-8"), (url or "").encode("utf-8"))
+    ids = array("i", sorted(latest))
+    offsets = array("Q", [0])
+    for article_id in ids:
+        for field in latest[article_id]:
+            offsets.append(offsets[-1] + len(field))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(DOC_STORE_MAGIC, DOC_STORE_VERSION, len(ids)))
+        f.write(ids.tobytes())
+        f.write(b"\0" * (-(HEADER.size + len(ids) * ids.itemsize) % 8))
+        f.write(offsets.tobytes())
+        for article_id in ids:
+            for field in latest[article_id]:
+                f.write(field)
+    os.replace(tmp_path, path)
+    return len(ids)
+
+
+def merge_doc_stores(path, store_paths) -> int:
+    """
+    Merges doc-store files into one, replacing it atomically; an article_id held by several
+    inputs keeps the entry of the last. Titles and urls are copied as bytes from the mapped
+    inputs, so only the ids and offsets of the result are held in memory. Returns the number
+    of documents written.
+    """
+    stores = [DocStore(store_path) for store_path in store_paths]
+    try:
+        def merged():
+            # (article_id, input, position) by id; of equal ids the last input comes last and wins.
+            def run(s):
+                return ((article_id, s, i) for i, article_id in enumerate(stores[s]._ids))
+            runs = [run(s) for s in range(len(stores))]
+            previous = None
+            for entry in heapq.merge(*runs):
+                if previous is not None and previous[0] != entry[0]:
+                    yield previous
+                previous = entry
+            if previous is not None:
+                yield previous
+
+        ids = array("i")
+        offsets = array("Q", [0])
+        for article_id, s, i in merged():
+            ids.append(article_id)
+            store_offsets = stores[s]._offsets
+            offsets.append(offsets[-1] + store_offsets[2 * i + 1] - store_offsets[2 * i])
+            offsets.append(offsets[-1] + store_offsets[2 * i + 2] - store_offsets[2 * i + 1])
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(DOC_STORE_MAGIC, DOC_STORE_VERSION, len(ids)))
+            f.write(ids.tobytes())
+            f.write(b"\0" * (-(HEADER.size + len(ids) * ids.itemsize) % 8))
+            f.write(offsets.tobytes())
+            for _, s, i in merged():
+                store = stores[s]
+                f.write(store._heap[store._offsets[2 * i]:store._offsets[2 * i + 2]])
+        os.replace(tmp_path, path)
+        return len(ids)
+    finally:
+        for store in stores:
+            store.close()
+
+
+class DocStore:
+    """
+    Read-only view of a doc-store file. The file is memory-mapped and looked up in place:
+    a lookup binary-searches the id array and decodes only the title and url it returns.
+    """
+    def __init__(self, path):
+        self._map = None
+        try:
+            with open(path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, count = HEADER.unpack_from(self._map)
+            if magic != DOC_STORE_MAGIC or version != DOC_STORE_VERSION:
+                raise ValueError("bad magic or version")
+            view = memoryview(self._map)
+            ids_end = HEADER.size + 4 * count
+            offsets_start = ids_end + (-ids_end % 8)
+            heap_start = offsets_start + 8 * (2 * count + 1)
+            self._ids = view[HEADER.size:ids_end].cast("i")
+            self._offsets = view[offsets_start:heap_start].cast("Q")
+            self._heap = view[heap_start:]
+            view.release()
+            if len(self._heap) != self._offsets[-1]:
+                raise ValueError("heap size does not match the offsets")
+        except (struct.error, ValueError, TypeError) as e:
+            self.close()
+            raise IOError(f"Corrupt doc-store file: {path}") from e
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _position(self, article_id):
+        i = bisect.bisect_left(self._ids, article_id)
+        return i if i < len(self._ids) and self._ids[i] == article_id else -1
+
+    def __contains__(self, article_id):
+        return self._position(article_id) >= 0
+
+    def _field(self, n) -> str:
+        return str(self._heap[self._offsets[n]:self._offsets[n + 1]], "utf-8")
+
+    def get(self, article_id):
+        """Returns {"article_id", "title", "url"} of a document, or None if the store does not hold it."""
+        i = self._position(article_id)
+        if i < 0:
+            return None
+        return {"article_id": article_id, "title": self._field(2 * i), "url": self._field(2 * i + 1)}
+
+    def lookup(self, article_ids):
+        """Returns the documents found, in the order asked, and the list of ids the store does not hold."""
+        found, missing = [], []
+        for article_id in article_ids:
+            doc = self.get(article_id)
+            if doc is None:
+                missing.append(article_id)
+            else:
+                found.append(doc)
+        return found, missing
+
+    def close(self):
+        # Views into the map must be released before it can be closed.
+        for name in ("_ids", "_offsets", "_heap"):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __del__(self):
+        if getattr(self, "_map", None) is not None:
+            self.close()
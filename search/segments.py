@@ -0,0 +1,379 @@
+import os
+import json
+import math
+import heapq
+import threading
+from datetime import datetime
+from itertools import chain, islice
+
+from core.bridge import CoreBridge
+
+SEGMENTS_DIR = "index_segments"
+MANIFEST_NAME = "manifest.json"
+BATCH_SIZE = 1000 # Documents handed to the C++ core per call
+MERGE_FACTOR = 4 # Segments of the same size tier that trigger a merge
+PAGE_CHUNK_SIZE = 1000 # Ids read from a segment's search cursor at a time when merging pages
+
+
+def _write_atomically(path, data: bytes):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class Segment:
+    """
+    One immutable mapped index file plus its live-docs bitmap. Bit (doc_id % 8) of byte
+    (doc_id // 8) is set while the document belongs to the segment and has not been deleted;
+    deleting a document only clears its bit. The mapping is released when the last reference
+    goes away, so a search still holding a merged-away segment keeps it valid.
+    """
+    def __init__(self, bridge, directory, name, doc_count, live_docs=None):
+        self.bridge = bridge
+        self.name = name
+        self.doc_count = doc_count
+        self.index_path = os.path.join(directory, name + ".idx")
+        self.live_path = os.path.join(directory, name + ".live")
+        self.index_ptr = bridge.open_mapped_index(self.index_path)
+        if not self.index_ptr:
+            raise IOError(f"Could not open index segment: {self.index_path}")
+        if live_docs is None:
+            with open(self.live_path, "rb") as f:
+                live_docs = f.read()
+        self.live_docs = bytearray(live_docs)
+        self._term_stats = None # (live_count, stats) of the last term_stats() call
+
+    def __del__(self):
+        if getattr(self, 'index_ptr', None):
+            self.bridge.close_mapped_index(self.index_ptr)
+            self.index_ptr = None
+
+    @property
+    def live_count(self):
+        return int.from_bytes(self.live_docs, 'little').bit_count()
+
+    def delete(self, doc_ids) -> bool:
+        """Clears the bits of the given documents. Returns True if any of them was live here."""
+        changed = False
+        for doc_id in doc_ids:
+            byte, bit = doc_id >> 3, 1 << (doc_id & 7)
+            if byte < len(self.live_docs) and self.live_docs[byte] & bit:
+                self.live_docs[byte] &= ~bit
+                changed = True
+        return changed
+
+    def save_live_docs(self):
+        _write_atomically(self.live_path, bytes(self.live_docs))
+
+    def search(self, query: str) -> list:
+        return self.bridge.search_mapped_index(self.index_ptr, query, self.live_docs)
+
+    def search_ranked(self, query: str, k: int) -> list:
+        return self.bridge.search_mapped_index_ranked(self.index_ptr, query, k, self.live_docs)
+
+    def count(self, query: str) -> int:
+        return self.bridge.count_mapped_index_matches(self.index_ptr, query, self.live_docs)
+
+    def term_stats(self) -> list:
+        """
+        (term, document frequency, collection frequency) over the live documents. Read from the
+        dictionary while nothing is deleted, else from the postings; remembered until the next delete.
+        """
+        live_count = self.live_count
+        if self._term_stats is None or self._term_stats[0] != live_count:
+            live_docs = self.live_docs if live_count < self.doc_count else None
+            self._term_stats = (live_count, self.bridge.get_mapped_term_stats(self.index_ptr, live_docs))
+        return self._term_stats[1]
+
+    def open_cursor(self, query: str):
+        return self.bridge.open_mapped_search_cursor(self.index_ptr, query, self.live_docs)
+
+
+def make_live_docs(doc_ids) -> bytearray:
+    live_docs = bytearray((max(doc_ids) >> 3) + 1 if doc_ids else 0)
+    for doc_id in doc_ids:
+        live_docs[doc_id >> 3] |= 1 << (doc_id & 7)
+    return live_docs
+
+
+class SegmentedIndex:
+    """
+    An index made of immutable mapped segments listed in a JSON manifest.
+
+    New documents go into a new small segment; documents that are re-indexed or deleted are
+    removed from older segments by clearing their live-docs bits, so an update costs time
+    proportional to the change. A tiered merge policy compacts segments of similar size
+    (optionally in a background thread) and drops deleted documents while doing so.
+
+    A single process should update the index; any number of processes may search it and pick
+    up changes with refresh(). `positions` (fixed when the index is created) makes segments
+    store term positions for phrase and NEAR queries.
+    """
+    def __init__(self, directory=SEGMENTS_DIR, bridge=None, create=False, positions=False):
+        self.directory = directory
+        self.bridge = bridge or CoreBridge()
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._merge_thread = None
+        self.segments = []
+        self.generation = 0
+        self.next_segment = 1
+        self.indexed_until = None
+        self.positions = positions
+        self._manifest_mtime = None
+        if not os.path.exists(self.manifest_path):
+            if not create:
+                raise IOError(f"No segmented index in '{directory}'.")
+            os.makedirs(directory, exist_ok=True)
+            self._write_manifest()
+        self._load()
+
+    @staticmethod
+    def exists(directory=SEGMENTS_DIR) -> bool:
+        return os.path.exists(os.path.join(directory, MANIFEST_NAME))
+
+    # --- Manifest ---
+    def _load(self):
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+        open_segments = {segment.name: segment for segment in self.segments}
+        segments = []
+        for entry in manifest["segments"]:
+            segment = open_segments.get(entry["name"])
+            if segment is None:
+                segment = Segment(self.bridge, self.directory, entry["name"], entry["doc_count"])
+            else:
+                with open(segment.live_path, "rb") as f:
+                    segment.live_docs = bytearray(f.read())
+            segments.append(segment)
+        self.segments = segments
+        self.generation = manifest["generation"]
+        self.next_segment = manifest["next_segment"]
+        self.positions = manifest.get("positions", False)
+        until = manifest.get("indexed_until")
+        self.indexed_until = datetime.fromisoformat(until) if until else None
+
+    def _write_manifest(self):
+        self.generation += 1
+        manifest = {
+            "generation": self.generation,
+            "next_segment": self.next_segment,
+            "indexed_until": self.indexed_until.isoformat() if self.indexed_until else None,
+            "positions": self.positions,
+            "segments": [{"name": s.name, "doc_count": s.doc_count} for s in self.segments],
+        }
+        _write_atomically(self.manifest_path, json.dumps(manifest, indent=2).encode("utf-8"))
+        self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+
+    def refresh(self) -> bool:
+        """Reloads the manifest if another process changed it. Returns True if it did."""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._manifest_mtime:
+            return False
+        with self._lock:
+            self._load()
+        return True
+
+    def _allocate_name(self):
+        name = f"seg_{self.next_segment:06d}"
+        self.next_segment += 1
+        return name
+
+    # --- Updates ---
+    def add_documents(self, documents, indexed_until=None, dictionary=None):
+        """
+        Indexes (doc_id, stems) pairs into a new segment, or (doc_id, packed term ids) pairs encoded
+        with `dictionary` (a TermDictionary). Earlier copies of the same documents in older segments
+        are deleted, so re-crawled articles are replaced.
+        """
+        documents = list(documents)
+        with self._lock:
+            if documents:
+                name = self._allocate_name()
+                doc_ids = [doc_id for doc_id, _ in documents]
+                index_path = os.path.join(self.directory, name + ".idx")
+                with self.bridge.managed_index(positions=self.positions) as index_ptr:
+                    for i in range(0, len(documents), BATCH_SIZE):
+                        if dictionary is None:
+                            self.bridge.add_documents_to_index(index_ptr, documents[i:i + BATCH_SIZE])
+                        else:
+                            dictionary.add_to_index(index_ptr, documents[i:i + BATCH_SIZE])
+                    if not self.bridge.save_mapped_index(index_ptr, index_path):
+                        raise IOError(f"Could not write index segment: {index_path}")
+                live_docs = make_live_docs(doc_ids)
+                _write_atomically(os.path.join(self.directory, name + ".live"), bytes(live_docs))
+                segment = Segment(self.bridge, self.directory, name, len(set(doc_ids)), live_docs)
+
+                self._delete_locked(doc_ids)
+                self.segments.append(segment)
+            if indexed_until is not None:
+                self.indexed_until = indexed_until
+            self._write_manifest()
+
+    def delete_documents(self, doc_ids):
+        """Deletes documents from every segment that holds them."""
+        with self._lock:
+            self._delete_locked(list(doc_ids))
+            self._write_manifest()
+
+    def _delete_locked(self, doc_ids):
+        for segment in self.segments:
+            if segment.delete(doc_ids):
+                segment.save_live_docs()
+
+    def reset(self, positions=None):
+        """Drops every segment, e.g. before a full rebuild. `positions` can switch positions on or off."""
+        with self._lock:
+            old_segments, self.segments = self.segments, []
+            self.indexed_until = None
+            if positions is not None:
+                self.positions = positions
+            self._write_manifest()
+        for segment in old_segments:
+            self._remove_files(segment)
+
+    # --- Search ---
+    def search(self, query: str) -> list:
+        """Searches every live segment. A document lives in at most one segment, so results are disjoint."""
+        segments = self.segments # Snapshot; a concurrent merge replaces the list, never mutates it.
+        if len(segments) == 1:
+            return segments[0].search(query)
+        return sorted(doc_id for segment in segments for doc_id in segment.search(query))
+
+    def count(self, query: str) -> int:
+        return sum(segment.count(query) for segment in self.segments)
+
+    def search_page(self, query: str, offset: int, limit, total=None):
+        """
+        Matches number offset .. offset + limit - 1 in ascending id order (all from offset on if
+        limit is None), and the total number of matches. The segments' cursors are merged chunk
+        by chunk, so only the ids up to the end of the page are ever copied out of the core.
+        A `total` already known (e.g. cached by count()) spares walking every match to count them.
+        """
+        segments = self.segments
+        cursors = [segment.open_cursor(query) for segment in segments]
+        try:
+            if total is None:
+                total = sum(self.bridge.search_cursor_count(cursor) for cursor in cursors)
+            if limit is None:
+                limit = max(total - offset, 0)
+            if len(cursors) == 1:
+                self.bridge.search_cursor_seek(cursors[0], offset)
+                return self.bridge.search_cursor_next(cursors[0], limit), total
+            chunk_size = max(PAGE_CHUNK_SIZE, limit)
+            merged = heapq.merge(*(chain.from_iterable(self.bridge.iter_search_cursor(cursor, chunk_size))
+                                   for cursor in cursors))
+            return list(islice(merged, offset, offset + limit)), total
+        finally:
+            for cursor in cursors:
+                self.bridge.close_search_cursor(cursor)
+
+    def search_ranked(self, query: str, k: int) -> list:
+        """
+        The k best (doc_id, score) pairs over all segments. Each segment scores with its own
+        statistics, which drift apart little once small segments have been merged.
+        """
+        segments = self.segments
+        return heapq.nlargest(k, (hit for segment in segments for hit in segment.search_ranked(query, k)),
+                              key=lambda hit: hit[1])
+
+    def term_stats(self) -> dict:
+        """
+        Maps every term to [document frequency, collection frequency] over the live documents of
+        all segments. A new segment only adds its own dictionary; see Segment.term_stats.
+        """
+        totals = {}
+        for segment in self.segments:
+            for term, doc_freq, collection_freq in segment.term_stats():
+                entry = totals.get(term)
+                if entry is None:
+                    totals[term] = [doc_freq, collection_freq]
+                else:
+                    entry[0] += doc_freq
+                    entry[1] += collection_freq
+        return totals
+
+    def postings_cache_stats(self) -> dict:
+        """Postings cache counters summed over the open segments."""
+        total = {}
+        for segment in self.segments:
+            for name, value in self.bridge.postings_cache_stats(segment.index_ptr).items():
+                total[name] = total.get(name, 0) + value
+        return total
+
+    # --- Merging ---
+    def _pick_merge(self):
+        """Tiered policy: merge MERGE_FACTOR segments of the same size tier, else rewrite a mostly deleted one."""
+        tiers = {}
+        for segment in self.segments:
+            tier = int(math.log(max(segment.live_count, 1), MERGE_FACTOR))
+            tiers.setdefault(tier, []).append(segment)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= MERGE_FACTOR:
+                return tiers[tier][:MERGE_FACTOR]
+        for segment in self.segments:
+            if segment.live_count * 2 < segment.doc_count:
+                return [segment]
+        return None
+
+    def merge(self, segments):
+        """Merges the given segments into one, dropping deleted documents. Searches keep running meanwhile."""
+        with self._lock:
+            name = self._allocate_name()
+            snapshot = [bytes(segment.live_docs) for segment in segments]
+        index_path = os.path.join(self.directory, name + ".idx")
+        if not self.bridge.merge_mapped_indexes([s.index_path for s in segments], index_path, snapshot):
+            raise IOError(f"Could not merge segments into {index_path}")
+
+        with self._lock:
+            # Documents deleted while merging are still in the new file; the live bits of the
+            # merged segments are current, so their union excludes them.
+            size = max((len(segment.live_docs) for segment in segments), default=0)
+            live_docs = bytearray(size)
+            for segment in segments:
+                for i, byte in enumerate(segment.live_docs):
+                    live_docs[i] |= byte
+            _write_atomically(os.path.join(self.directory, name + ".live"), bytes(live_docs))
+            doc_count = sum(int.from_bytes(bitmap, 'little').bit_count() for bitmap in snapshot)
+            merged = Segment(self.bridge, self.directory, name, doc_count, live_docs)
+
+            merged_names = {segment.name for segment in segments}
+            position = min(i for i, s in enumerate(self.segments) if s.name in merged_names)
+            remaining = [s for s in self.segments if s.name not in merged_names]
+            remaining.insert(position, merged)
+            self.segments = remaining
+            self._write_manifest()
+        for segment in segments:
+            self._remove_files(segment)
+        print(f"Merged {len(segments)} segments into {name} ({merged.live_count} live documents).")
+
+    def maybe_merge(self, background=False):
+        """Runs the merge policy until nothing is left to merge, in a background thread if asked."""
+        def run():
+            while True:
+                with self._lock:
+                    candidates = self._pick_merge()
+                if not candidates:
+                    return
+                self.merge(candidates)
+
+        if not background:
+            run()
+            return None
+        if self._merge_thread and self._merge_thread.is_alive():
+            return self._merge_thread
+        self._merge_thread = threading.Thread(target=run, daemon=True)
+        self._merge_thread.start()
+        return self._merge_thread
+
+    @staticmethod
+    def _remove_files(segment):
+        # Other processes may still map the file; unlinking keeps their mapping valid.
+        for path in (segment.index_path, segment.live_path):
+            if os.path.exists(path):
+                os.remove(path)
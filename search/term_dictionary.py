@@ -0,0 +1,83 @@
+import numpy as np
+
+from core.bridge import CoreBridge
+
+TERMS_COLLECTION = "terms"
+TERM_IDS_FIELD = "stem_ids"
+TERM_INSERT_CHUNK = 10000 # Terms per insert_many when saving new terms
+
+# Articles keep their stem stream as TERM_IDS_FIELD: one little-endian uint32 term id per stem,
+# packed into a binary field, a quarter of the size of the BSON string array it replaces. The
+# ids are dense and global: term `id` is stored in the terms collection as {_id: id, term: stem}.
+# Ids are only ever appended, so a saved stream stays valid while the dictionary grows.
+
+def unpack_term_ids(term_ids) -> np.ndarray:
+    """The ids of a packed stem stream as a uint32 array over the same bytes."""
+    return np.frombuffer(term_ids, dtype='<u4')
+
+class TermDictionary:
+    """
+    The global stem -> id dictionary, held in the core and persisted in MongoDB. Only one process
+    (the tokenizer) should add terms; builders and analysis only read it.
+    """
+    def __init__(self, collection=None, bridge=None):
+        self.collection = collection
+        self.bridge = bridge or CoreBridge()
+        self.ptr = self.bridge.lib.create_term_dictionary()
+        self.saved = 0 # Terms already in the collection.
+        if collection is not None:
+            terms = [doc['term'] for doc in collection.find({}, {'term': 1}).sort('_id', 1)]
+            self.bridge.encode_terms(self.ptr, terms)
+            if len(self) != len(terms):
+                raise ValueError(f"The '{collection.name}' collection holds duplicate terms.")
+            last = collection.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+            if last is not None and last['_id'] != len(terms) - 1:
+                raise ValueError(f"The '{collection.name}' collection has gaps in its term ids.")
+            self.saved = len(terms)
+
+    def __len__(self):
+        return self.bridge.term_dictionary_size(self.ptr)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.ptr:
+            self.bridge.lib.destroy_term_dictionary(self.ptr)
+            self.ptr = None
+
+    def encode(self, stems) -> bytes:
+        """Packs a stem stream as term ids, adding the stems not seen before."""
+        return self.bridge.encode_terms(self.ptr, stems)
+
+    def terms(self, first_id=0) -> list:
+        """The terms from id `first_id` on, in id order."""
+        return self.bridge.get_dictionary_terms(self.ptr, first_id)
+
+    def add_to_index(self, index_ptr, documents):
+        """
+        Indexes (doc_id, packed term ids) pairs encoded with this dictionary. Raises ValueError if a
+        document refers to a term id the dictionary does not hold (e.g. stems written by a
+        tokenizer run whose terms were never saved), instead of indexing it without that term.
+        """
+        rejected = self.bridge.add_encoded_documents_to_index(index_ptr, self.ptr, documents)
+        if rejected:
+            first, last = documents[0][0], documents[-1][0]
+            raise ValueError(f"{rejected} term ids in documents {first}..{last} are not in the term dictionary "
+                             f"({len(self)} terms); re-tokenize those documents.")
+
+    def save(self):
+        """
+        Inserts the terms added since the last save. Call it before writing documents that use them,
+        so no stored stream refers to an id the collection does not hold.
+        """
+        if self.collection is None:
+            return
+        new_terms = self.terms(self.saved)
+        for i in range(0, len(new_terms), TERM_INSERT_CHUNK):
+            self.collection.insert_many([{'_id': self.saved + i + k, 'term': term}
+                                         for k, term in enumerate(new_terms[i:i + TERM_INSERT_CHUNK])])
+        self.saved += len(new_terms)
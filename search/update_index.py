@@ -0,0 +1,89 @@
+import sys
+import os
+import argparse
+from datetime import timedelta
+from pymongo import MongoClient
+
+# Add project root to path to allow importing 'core'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from crawler.config import MONGO_URI, DB_NAME, ARTICLES_COLLECTION
+from search.build_boolean_index import STEMMED_QUERY, BATCH_SIZE, build_doc_store
+from search.segments import SegmentedIndex, SEGMENTS_DIR
+from search.term_dictionary import TermDictionary, TERMS_COLLECTION, TERM_IDS_FIELD
+from tokenizer.tokenize_batch import create_db_index
+
+# Each run re-reads the articles tokenized this long before the last one it indexed. Writers
+# applying their updates concurrently can make an earlier tokenized_at visible after a later
+# one; re-indexed articles simply replace their previous copies.
+TOKENIZED_AT_LAG = timedelta(seconds=30)
+
+def update_index(directory=SEGMENTS_DIR, rebuild=False, delete_ids=(), positions=False, doc_store=False, zipf=False):
+    """
+    Brings the segmented index up to date: articles tokenized since the last run go into a new
+    segment (replacing their previous versions), the given ids are deleted, then segments are merged.
+    Articles tokenized within TOKENIZED_AT_LAG of the previous run are indexed again, so one
+    committed late by a concurrent tokenizer is not skipped.
+    `positions` applies to a new index or a rebuild; `doc_store` rewrites the doc-store file afterwards,
+    `zipf` refreshes the Zipf stats from the updated index.
+    """
+    index = SegmentedIndex(directory, create=True, positions=positions)
+    if rebuild:
+        print("Dropping all segments for a full rebuild...")
+        index.reset(positions=positions)
+
+    if delete_ids:
+        index.delete_documents(delete_ids)
+        print(f"Deleted {len(delete_ids)} documents.")
+
+    client = MongoClient(MONGO_URI)
+    articles_collection = client[DB_NAME][ARTICLES_COLLECTION]
+    create_db_index(articles_collection) # The tokenized_at range below must not scan the collection.
+    query = dict(STEMMED_QUERY)
+    if index.indexed_until is not None:
+        query["metadata.tokenized_at"] = {"$gte": index.indexed_until - TOKENIZED_AT_LAG}
+
+    documents = []
+    indexed_until = index.indexed_until
+    cursor = articles_collection.find(
+        query, {"article_id": 1, TERM_IDS_FIELD: 1, "metadata.tokenized_at": 1, "_id": 0}
+    ).batch_size(BATCH_SIZE)
+    for doc in cursor:
+        doc_id, term_ids = doc.get('article_id'), doc.get(TERM_IDS_FIELD)
+        if doc_id is None or not term_ids:
+            continue
+        documents.append((doc_id, term_ids))
+        tokenized_at = doc.get('metadata', {}).get('tokenized_at')
+        if tokenized_at and (indexed_until is None or tokenized_at > indexed_until):
+            indexed_until = tokenized_at
+    if doc_store:
+        build_doc_store(articles_collection)
+
+    # Loaded after the articles were read, so it holds every id they use.
+    with TermDictionary(client[DB_NAME][TERMS_COLLECTION], index.bridge) as dictionary:
+        index.add_documents(documents, indexed_until, dictionary=dictionary)
+    print(f"Indexed {len(documents)} new or changed documents into {len(index.segments)} segments.")
+
+    index.maybe_merge()
+    if zipf:
+        from analysis.zipf_analysis import publish_zipf_stats
+        term_stats = [(term, doc_freq, freq) for term, (doc_freq, freq) in index.term_stats().items()]
+        publish_zipf_stats(client[DB_NAME], term_stats)
+    client.close()
+    print("Index update complete.")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Incrementally update the segmented boolean index.")
+    parser.add_argument('--dir', default=SEGMENTS_DIR, help="Directory holding the index segments.")
+    parser.add_argument('--delete', type=int, nargs='+', default=[], metavar='ID',
+                        help="article_id values to remove from the index.")
+    parser.add_argument('--rebuild', action='store_true', help="Drop all segments and index every article again.")
+    parser.add_argument('--positions', action='store_true',
+                        help="Store term positions (for phrase and NEAR queries) in a new or rebuilt index.")
+    parser.add_argument('--doc-store', action='store_true',
+                        help="Rewrite the doc-store file with the titles and urls of all indexed articles.")
+    parser.add_argument('--zipf', action='store_true',
+                        help="Recalculate the Zipf stats from the updated index.")
+    args = parser.parse_args()
+
+    update_index(args.dir, rebuild=args.rebuild, delete_ids=args.delete, positions=args.positions, doc_store=args.doc_store,
+                 zipf=args.zipf)
@@ -20,8 +20,85 @@ def test_tokenizer_and_stemmer(bridge):
     assert tokens == ["научные", "исследования"]
     
     stems = [bridge.stem_word(t) for t in tokens]
-    # Our simple stemmer doesn't handle these well, this is a smoke test
-    assert isinstance(stems, list) 
+    assert stems == ["научн", "исследован"]
+
+def test_russian_stemmer(bridge):
+    """Tests the Snowball Russian stemmer on the endings of each of its steps."""
+    cases = {
+        "красивейшими": "красив", "прочитавшись": "прочита", "бегавший": "бега", "длинный": "длин",
+        "умываться": "умыва", "книгами": "книг", "возможностью": "возможн", "говорите": "говор",
+        "история": "истор", "жизнь": "жизн", "мы": "мы", "": "", "data": "data",
+    }
+    for _ in range(2): # The second round is served from the stem cache.
+        assert {word: bridge.stem_word(word) for word in cases} == cases
+    assert bridge.stem_word("ёлками") == bridge.stem_word("елками") == "елк" # Folded as by the tokenizer.
+
+def test_token_spans_and_streaming(bridge):
+    """Tests offset-based tokenization, Cyrillic case folding and feeding a text in chunks."""
+    data = "Ёлки-ПАЛКИ, Йод и data2Х — ЩЁКИ".encode("utf-8")
+    normalized, spans = bridge.tokenize_spans(data)
+    assert len(normalized) == len(data)
+    tokens = [normalized[start:start + length].decode("utf-8") for start, length in spans]
+    assert tokens == ["елки", "палки", "йод", "и", "data", "х", "щеки"]
+    assert [data[start:start + length].decode("utf-8") for start, length in spans][:2] == ["Ёлки", "ПАЛКИ"]
+    assert bridge.tokenize(data.decode("utf-8")) == tokens
+
+    # Every cut, including ones inside a two-byte letter, gives the same tokens.
+    for cut in range(len(data) + 1):
+        assert list(bridge.iter_stream_tokens([data[:cut], b"", data[cut:]])) == tokens
+    with bridge.managed_token_stream() as stream:
+        base, text, first = bridge.feed_token_stream(stream, data[:3]) # "Ё" and half of "л".
+        assert (base, text, first) == (0, b"", [])
+        base, text, rest = bridge.feed_token_stream(stream, data[3:], last=True)
+        assert base == 0 and text == normalized and rest == spans
+
+    # The thousands sign and the combining marks (U+0482..U+0489) separate words, even across chunks.
+    data = "҂а сло\u0483во".encode("utf-8")
+    assert bridge.tokenize(data.decode("utf-8")) == ["а", "сло", "во"]
+    for cut in range(len(data) + 1):
+        assert list(bridge.iter_stream_tokens([data[:cut], data[cut:]])) == ["а", "сло", "во"]
+
+def test_results_as_core_buffers(bridge):
+    """Tests that results are memoryviews over core buffers, freed once the last view is gone."""
+    import gc
+    import weakref
+    import numpy as np
+
+    with bridge.managed_index() as index_ptr:
+        bridge.add_documents_to_index(index_ptr, [(doc_id, ["общ"] + (["нечет"] if doc_id % 2 else [])) for doc_id in range(1, 2001)])
+        ids = bridge.search_index_ids(index_ptr, "общ AND нечет")
+        assert ids.format == "i" and len(ids) == 1000
+        array = np.asarray(ids) # Wraps the core's buffer, no copy.
+        assert array.dtype == np.int32 and array[0] == 1 and array[-1] == 1999
+        assert bridge.search_index(index_ptr, "общ AND нечет") == ids.tolist()
+        assert len(bridge.search_index_ids(index_ptr, "нет")) == 0
+
+        owner = weakref.ref(ids.obj._owner)
+        del ids
+        gc.collect()
+        assert owner() is not None and array.sum() == 1000 * 1000 # The array keeps the buffer alive.
+        del array
+        gc.collect()
+        assert owner() is None
+
+    with bridge.managed_freq_map() as map_ptr:
+        bridge.add_stems_to_freq_map(map_ptr, ["б", "а", "ёж", "б", "ёж", "б"])
+        stems, frequencies = bridge.get_freq_map_columns(map_ptr)
+        assert stems == ["б", "ёж", "а"] and frequencies.tolist() == [3, 2, 1]
+    assert bridge.tokenize("Ёжик в\0тумане") == ["ежик", "в", "тумане"]
+    assert bridge.tokenize("") == []
+
+def test_tokenize_and_stem_batch(bridge):
+    """Tests that the batch call matches per-document tokenize and stem_word calls."""
+    texts = ["Научные исследования", "", "42 — 17", "Теория информации. Основного"]
+    results = bridge.tokenize_and_stem_batch(texts)
+
+    assert len(results) == len(texts)
+    for text, (tokens, stems) in zip(texts, results):
+        expected_tokens = bridge.tokenize(text)
+        assert tokens == expected_tokens
+        assert stems == [bridge.stem_word(t) for t in expected_tokens]
+    assert bridge.tokenize_and_stem_batch([]) == []
 
 def test_indexing_and_search(bridge):
     """Tests the full C++ indexing and search pipeline."""
@@ -43,6 +120,124 @@ def test_indexing_and_search(bridge):
         results_not = bridge.search_index(index_ptr, "наук NOT компьютер")
         assert sorted(results_not) == [1]
 
+def test_postings_stay_sorted(bridge):
+    """Tests that postings are sorted and deduplicated whatever the insertion order."""
+    with bridge.managed_index() as index_ptr:
+        for doc_id in [5, 3, 9, 1, 3]:
+            bridge.add_document_to_index(index_ptr, doc_id, ["наук", "наук"])
+        bridge.add_document_to_index(index_ptr, 4, ["данн"])
+        bridge.add_document_to_index(index_ptr, 9, ["данн"])
+
+        assert bridge.search_index(index_ptr, "наук") == [1, 3, 5, 9]
+        assert bridge.search_index(index_ptr, "наук OR данн") == [1, 3, 4, 5, 9]
+        assert bridge.search_index(index_ptr, "наук AND данн") == [9]
+        assert bridge.search_index(index_ptr, "наук NOT данн") == [1, 3, 5]
+
+def test_batched_indexing(bridge):
+    """Tests that batched ingestion builds the same index as per-document calls."""
+    documents = [
+        (1, ["наук", "исследован", "наук"]),
+        (2, []),
+        (3, ["компьютер", "наук"]),
+        (2, ["исследован", "данн", "данн"]),
+    ]
+    with bridge.managed_index() as batched_ptr, bridge.managed_index() as single_ptr:
+        bridge.add_documents_to_index(batched_ptr, documents)
+        bridge.add_documents_to_index(batched_ptr, [])
+        for doc_id, stems in documents:
+            bridge.add_document_to_index(single_ptr, doc_id, stems)
+
+        for query in ["наук", "исследован", "данн", "компьютер OR данн", "наук NOT компьютер"]:
+            assert bridge.search_index(batched_ptr, query) == bridge.search_index(single_ptr, query)
+        assert bridge.search_index(batched_ptr, "исследован") == [1, 2]
+
+def test_term_dictionary_and_encoded_indexing(bridge, tmp_path):
+    """Tests packed term-id streams: dense ids, indexing from ids and counting them for Zipf."""
+    from search.term_dictionary import TermDictionary, unpack_term_ids
+    from analysis.zipf_analysis import count_term_ids
+
+    documents = [
+        (1, ["наук", "исследован", "наук"]),
+        (3, ["компьютер", "наук"]),
+        (2, ["исследован", "данн", "данн"]),
+    ]
+    with TermDictionary(bridge=bridge) as dictionary:
+        encoded = [(doc_id, dictionary.encode(stems)) for doc_id, stems in documents]
+        assert unpack_term_ids(encoded[0][1]).tolist() == [0, 1, 0] and len(encoded[0][1]) == 12
+        assert dictionary.terms() == ["наук", "исследован", "компьютер", "данн"] and dictionary.terms(3) == ["данн"]
+        assert dictionary.encode([]) == b""
+
+        with bridge.managed_index(positions=True) as encoded_ptr, bridge.managed_index(positions=True) as plain_ptr:
+            assert bridge.add_encoded_documents_to_index(encoded_ptr, dictionary.ptr, encoded) == 0
+            bridge.add_documents_to_index(plain_ptr, documents)
+            for query in ["наук", "данн OR компьютер", "исследован NOT данн", '"наук исследован"']:
+                assert bridge.search_index(encoded_ptr, query) == bridge.search_index(plain_ptr, query)
+            encoded_path, plain_path = str(tmp_path / "encoded.idx"), str(tmp_path / "plain.idx")
+            assert bridge.save_mapped_index(encoded_ptr, encoded_path) and bridge.save_mapped_index(plain_ptr, plain_path)
+        with bridge.managed_mapped_index(encoded_path) as a, bridge.managed_mapped_index(plain_path) as b:
+            assert bridge.get_mapped_term_stats(a) == bridge.get_mapped_term_stats(b)
+
+        counts = count_term_ids([term_ids for _, term_ids in encoded])
+        assert dict(zip(dictionary.terms(), counts.tolist())) == {"наук": 3, "исследован": 2, "компьютер": 1, "данн": 2}
+
+        # An id past the end of the dictionary is reported instead of silently dropped.
+        unknown = (9, encoded[0][1] + (99).to_bytes(4, "little"))
+        with bridge.managed_index() as index_ptr:
+            assert bridge.add_encoded_documents_to_index(index_ptr, dictionary.ptr, [unknown]) == 1
+            with pytest.raises(ValueError):
+                dictionary.add_to_index(index_ptr, encoded + [unknown])
+
+def test_merge_mapped_indexes(bridge, tmp_path):
+    """Tests that merging segments gives the same index as building it in one go."""
+    documents = [(doc_id, ["общ", "чётн" if doc_id % 2 == 0 else "нечётн", f"уник{doc_id % 7}"]) for doc_id in range(1, 601)]
+    segment_paths = [str(tmp_path / f"seg{i}.idx") for i in range(3)]
+    for i, path in enumerate(segment_paths):
+        with bridge.managed_index() as index_ptr:
+            bridge.add_documents_to_index(index_ptr, documents[i * 200:(i + 1) * 200])
+            assert bridge.save_mapped_index(index_ptr, path)
+
+    merged_path = str(tmp_path / "merged.idx")
+    assert bridge.merge_mapped_indexes(segment_paths, merged_path)
+    assert not bridge.merge_mapped_indexes([str(tmp_path / "missing.idx")], merged_path)
+
+    with bridge.managed_index() as index_ptr, bridge.managed_mapped_index(merged_path) as merged_ptr:
+        bridge.add_documents_to_index(index_ptr, documents)
+        for query in ["общ", "чётн", "нечётн AND уник3", "уник1 OR уник2 NOT чётн", "отсутств"]:
+            assert bridge.search_mapped_index(merged_ptr, query) == bridge.search_index(index_ptr, query)
+
+    # A document in several inputs comes whole from the last one: no terms of the older copy survive.
+    for i, documents in enumerate([[(5, ["стар", "общ"]), (6, ["стар"])], [(5, ["нов", "нов", "нов"])]]):
+        with bridge.managed_index() as index_ptr:
+            bridge.add_documents_to_index(index_ptr, documents)
+            assert bridge.save_mapped_index(index_ptr, segment_paths[i])
+    assert bridge.merge_mapped_indexes(segment_paths[:2], merged_path)
+    with bridge.managed_mapped_index(merged_path) as merged_ptr:
+        assert bridge.search_mapped_index(merged_ptr, "стар") == [6]
+        assert bridge.search_mapped_index(merged_ptr, "общ") == []
+        assert bridge.search_mapped_index(merged_ptr, "нов") == [5]
+
+def test_query_precedence_and_grouping(bridge):
+    """Tests operator precedence, parentheses, unary NOT and implicit AND."""
+    with bridge.managed_index() as index_ptr:
+        bridge.add_document_to_index(index_ptr, 1, ["a"])
+        bridge.add_document_to_index(index_ptr, 2, ["b", "c"])
+        bridge.add_document_to_index(index_ptr, 3, ["a", "c"])
+        bridge.add_document_to_index(index_ptr, 4, ["b"])
+
+        # AND binds tighter than OR.
+        assert bridge.search_index(index_ptr, "a OR b AND c") == [1, 2, 3]
+        assert bridge.search_index(index_ptr, "( a OR b ) AND c") == [2, 3]
+        assert bridge.search_index(index_ptr, "(a OR b) c") == [2, 3]
+        assert bridge.search_index(index_ptr, "a OR b NOT c") == [1, 3, 4]
+        assert bridge.search_index(index_ptr, "(a OR b) AND NOT c") == [1, 4]
+        assert bridge.search_index(index_ptr, "c AND NOT (a OR b)") == []
+        assert bridge.search_index(index_ptr, "c NOT NOT a") == [3]
+        # A bare negation has nothing to filter.
+        assert bridge.search_index(index_ptr, "NOT a") == []
+        # Malformed input is tolerated.
+        assert bridge.search_index(index_ptr, "(a OR b") == [1, 2, 3, 4]
+        assert bridge.search_index(index_ptr, "a AND") == [1, 3]
+
 def test_zipf_calculation(bridge):
     """Smoke test for C++ Zipf frequency calculation."""
     with bridge.managed_freq_map() as freq_map_ptr:
@@ -60,4 +255,288 @@ def test_zipf_calculation(bridge):
             {'stem': 'c', 'frequency': 1}
         ]
 
+        # The legacy array and the columns list ties in the same order: by stem.
+        bridge.add_stems_to_freq_map(freq_map_ptr, ["d", "e", "e", "b", "d"])
+        array = bridge.lib.get_freq_map_as_array(freq_map_ptr)
+        try:
+            pairs = [(array.pairs[i].stem.decode("utf-8"), array.pairs[i].frequency) for i in range(array.count)]
+        finally:
+            bridge.lib.free_freq_array(array)
+        assert pairs == [("a", 3), ("b", 2), ("d", 2), ("e", 2), ("c", 1)]
+        assert [(row['stem'], row['frequency']) for row in bridge.get_freq_map_as_list(freq_map_ptr)] == pairs
+
+def test_term_tables_grow(bridge, tmp_path):
+    """Tests the index and the frequency map well past their initial table size, and the legacy file round trip."""
+    path = str(tmp_path / "index.bin")
+    stems = [f"терм{n}" for n in range(20000)]
+    with bridge.managed_index() as index_ptr:
+        bridge.add_documents_to_index(index_ptr, [(doc_id, stems[doc_id::100]) for doc_id in range(100)])
+        assert bridge.search_index(index_ptr, "терм0 OR терм19999") == [0, 99]
+        assert bridge.save_index(index_ptr, path)
+    with bridge.managed_index(path) as index_ptr:
+        assert bridge.search_index(index_ptr, "терм12345") == [45]
+        assert bridge.search_index(index_ptr, "терм20000") == []
+
+    with bridge.managed_freq_map() as freq_map_ptr:
+        bridge.add_stems_to_freq_map(freq_map_ptr, stems + stems[:10])
+        freq_list = bridge.get_freq_map_as_list(freq_map_ptr)
+    assert len(freq_list) == len(stems)
+    assert sorted(item['stem'] for item in freq_list[:10]) == sorted(stems[:10])
+    assert freq_list[0]['frequency'] == 2 and freq_list[-1]['frequency'] == 1
+
+
+
+def test_mapped_index_search(bridge, tmp_path):
+    """Tests saving the index in the mapped format and searching it in place."""
+    path = str(tmp_path / "index.idx")
+    with bridge.managed_index() as index_ptr:
+        bridge.add_document_to_index(index_ptr, 2, ["компьютер", "наук"])
+        bridge.add_document_to_index(index_ptr, 1, ["наук", "исследован"])
+        bridge.add_document_to_index(index_ptr, 3, ["исследован", "данн"])
+        assert bridge.save_mapped_index(index_ptr, path)
+
+    with bridge.managed_mapped_index(path) as mapped_ptr:
+        assert mapped_ptr is not None
+        assert bridge.search_mapped_index(mapped_ptr, "наук") == [1, 2]
+        assert bridge.search_mapped_index(mapped_ptr, "наук AND исследован") == [1]
+        assert bridge.search_mapped_index(mapped_ptr, "компьютер OR данн") == [2, 3]
+        assert bridge.search_mapped_index(mapped_ptr, "наук NOT компьютер") == [1]
+        assert bridge.search_mapped_index(mapped_ptr, "отсутств") == []
+
+    assert bridge.open_mapped_index(str(tmp_path / "missing.idx")) is None
+
+def test_mapped_index_compressed_postings(bridge, tmp_path):
+    """Tests AND/NOT over long compressed posting lists that span several skip blocks."""
+    path = str(tmp_path / "index.idx")
+    legacy_path = str(tmp_path / "index.bin")
+    doc_ids = range(1, 2001)
+    with bridge.managed_index() as index_ptr:
+        for doc_id in doc_ids:
+            stems = ["общ"]
+            if doc_id % 2 == 0:
+                stems.append("чётн")
+            if doc_id % 97 == 0:
+                stems.append("редк")
+            bridge.add_document_to_index(index_ptr, doc_id, stems)
+        assert bridge.save_mapped_index(index_ptr, path)
+        assert bridge.save_index(index_ptr, legacy_path)
+
+    # The mapped file also stores a term frequency per posting and 4 bytes of length per document.
+    lengths_size = 4 * (max(doc_ids) + 1)
+    assert (os.path.getsize(path) - lengths_size) * 3 < os.path.getsize(legacy_path) * 2
+
+    even = [d for d in doc_ids if d % 2 == 0]
+    rare = [d for d in doc_ids if d % 97 == 0]
+    with bridge.managed_mapped_index(path) as mapped_ptr:
+        assert bridge.search_mapped_index(mapped_ptr, "общ") == list(doc_ids)
+        assert bridge.search_mapped_index(mapped_ptr, "редк AND чётн") == [d for d in rare if d % 2 == 0]
+        assert bridge.search_mapped_index(mapped_ptr, "редк NOT чётн") == [d for d in rare if d % 2 == 1]
+        assert bridge.search_mapped_index(mapped_ptr, "общ NOT чётн") == [d for d in doc_ids if d % 2 == 1]
+        assert bridge.search_mapped_index(mapped_ptr, "редк OR чётн") == sorted(set(even) | set(rare))
+
+def test_segmented_index_updates(bridge, tmp_path):
+    """Tests replacing and deleting documents across segments and merging them away."""
+    from search.segments import SegmentedIndex
+    index = SegmentedIndex(str(tmp_path / "segments"), bridge, create=True)
+    index.add_documents([(doc_id, ["общ", f"стар{doc_id % 3}"]) for doc_id in range(1, 13)])
+    index.add_documents([(4, ["общ", "нов"]), (20, ["нов"])])
+    index.delete_documents([5, 6])
+
+    assert index.search("нов") == [4, 20]
+    assert index.search("стар1") == [1, 7, 10]
+    assert index.search("общ") == [1, 2, 3, 4, 7, 8, 9, 10, 11, 12]
+
+    for _ in range(3):
+        index.add_documents([(21, ["нов"])])
+    index.maybe_merge()
+    assert len(index.segments) < 5
+    assert index.search("нов") == [4, 20, 21]
+    assert index.search("общ") == [1, 2, 3, 4, 7, 8, 9, 10, 11, 12]
+
+    reopened = SegmentedIndex(str(tmp_path / "segments"), bridge)
+    assert [s.name for s in reopened.segments] == [s.name for s in index.segments]
+    assert reopened.search("стар1") == [1, 7, 10]
+
+def test_ranked_search(bridge, tmp_path):
+    """Tests BM25 top-k ranking against exhaustive scoring, with and without deleted documents."""
+    import math
+    import random
+    rng = random.Random(7)
+    vocab = [f"слов{i}" for i in range(50)]
+    weights = [1 / (i + 1) for i in range(50)]
+    documents = [(doc_id, rng.choices(vocab, weights, k=rng.randint(1, 40))) for doc_id in range(1, 1501)]
+    path = str(tmp_path / "index.idx")
+    with bridge.managed_index() as index_ptr:
+        bridge.add_documents_to_index(index_ptr, documents)
+        assert bridge.save_mapped_index(index_ptr, path)
+
+    num_docs = len(documents)
+    avg_length = sum(len(stems) for _, stems in documents) / num_docs
+    doc_freq = {}
+    for _, stems in documents:
+        for stem in set(stems):
+            doc_freq[stem] = doc_freq.get(stem, 0) + 1
+
+    def bm25(stems, terms):
+        score = 0.0
+        for term in terms:
+            tf = stems.count(term)
+            if tf:
+                idf = math.log(1 + (num_docs - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                score += idf * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * len(stems) / avg_length))
+        return score
+
+    live_docs = bytearray(1501 // 8 + 1)
+    for doc_id, _ in documents:
+        if doc_id % 3:
+            live_docs[doc_id >> 3] |= 1 << (doc_id & 7)
+
+    with bridge.managed_mapped_index(path) as mapped_ptr:
+        for terms, k in [(["слов0", "слов1"], 10), (["слов3", "слов40", "слов7"], 25), (["слов49"], 1000)]:
+            for live in (None, live_docs):
+                expected = sorted((-bm25(stems, terms), doc_id) for doc_id, stems in documents
+                                  if bm25(stems, terms) > 0 and (live is None or doc_id % 3))[:k]
+                ranked = bridge.search_mapped_index_ranked(mapped_ptr, " ".join(terms) + " NOT слов2", k, live)
+                assert [score for _, score in ranked] == pytest.approx([-score for score, _ in expected], rel=1e-4)
+        assert bridge.search_mapped_index_ranked(mapped_ptr, "отсутств", 10) == []
+
+def test_phrase_and_near_queries(bridge, tmp_path):
+    """Tests phrase and NEAR/k queries on positional in-memory and mapped indexes."""
+    documents = [
+        (1, ["закон", "ципф", "описыва", "частот"]),
+        (2, ["ципф", "сформулирова", "закон"]),
+        (3, ["закон", "и", "ципф"]),
+        (4, ["закон", "ципф", "закон", "ципф"]),
+    ]
+    # Long lists exercise the skip blocks of both postings and positions.
+    documents += [(doc_id, ["шум"] * (doc_id % 3) + ["закон", "шум", "ципф"]) for doc_id in range(10, 400)]
+    path = str(tmp_path / "index.idx")
+    with bridge.managed_index(positions=True) as index_ptr:
+        bridge.add_documents_to_index(index_ptr, documents)
+        assert bridge.save_mapped_index(index_ptr, path)
+        with bridge.managed_mapped_index(path) as mapped_ptr:
+            for search, ptr in ((bridge.search_index, index_ptr), (bridge.search_mapped_index, mapped_ptr)):
+                assert search(ptr, '"закон ципф"') == [1, 4]
+                assert search(ptr, '"ципф закон"') == [4]
+                assert search(ptr, 'закон NEAR/1 ципф') == [1, 4]
+                assert search(ptr, 'закон NEAR/2 ципф NOT "закон ципф"') == [2, 3] + list(range(10, 400))
+                assert search(ptr, '"закон шум ципф" AND частот') == []
+                assert search(ptr, '"шум шум закон"')[:3] == [11, 14, 17]
+
+    flat_path = str(tmp_path / "flat.idx")
+    with bridge.managed_index() as index_ptr:
+        bridge.add_documents_to_index(index_ptr, documents)
+        assert bridge.save_mapped_index(index_ptr, flat_path)
+    assert os.path.getsize(flat_path) < os.path.getsize(path)
+    with bridge.managed_mapped_index(flat_path) as mapped_ptr:
+        # Without positions a phrase matches like AND.
+        assert bridge.search_mapped_index(mapped_ptr, '"закон ципф"')[:4] == [1, 2, 3, 4]
+
+def test_postings_and_result_caches(bridge, tmp_path):
+    """Tests that hot posting lists are served from the core's cache and the LRU result cache evicts by size."""
+    from search.cache import LRUCache
+    path = str(tmp_path / "index.idx")
+    with bridge.managed_index() as index_ptr:
+        for doc_id in range(1, 1001):
+            bridge.add_document_to_index(index_ptr, doc_id, ["общ"] + (["чётн"] if doc_id % 2 == 0 else []))
+        assert bridge.save_mapped_index(index_ptr, path)
+
+    with bridge.managed_mapped_index(path) as mapped_ptr:
+        expected = bridge.search_mapped_index(mapped_ptr, "общ NOT чётн")
+        assert expected == list(range(1, 1001, 2))
+        assert bridge.postings_cache_stats(mapped_ptr)["entries"] == 2
+        assert bridge.search_mapped_index(mapped_ptr, "общ NOT чётн") == expected
+        stats = bridge.postings_cache_stats(mapped_ptr)
+        assert stats["hits"] == 2 and stats["misses"] == 2
+
+        bridge.set_postings_cache_limit(mapped_ptr, 0)
+        assert bridge.postings_cache_stats(mapped_ptr)["entries"] == 0
+        assert bridge.search_mapped_index(mapped_ptr, "общ NOT чётн") == expected
+        assert bridge.postings_cache_stats(mapped_ptr)["bytes"] == 0
+
+    cache = LRUCache(3, sizeof=lambda value: 1)
+    for key in "abc":
+        cache.put(key, key.upper())
+    assert cache.get("a") == "A"
+    cache.put("d", "D") # Evicts "b", the least recently used.
+    assert cache.get("b") is None and cache.get("c") == "C" and len(cache) == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_search_cursor_pages_and_counts(bridge, tmp_path):
+    """Tests count-only search and reading matches page by page through search cursors."""
+    from search.segments import SegmentedIndex
+    path = str(tmp_path / "index.idx")
+    documents = [(doc_id, ["общ"] + (["чётн"] if doc_id % 2 == 0 else [])) for doc_id in range(1, 301)]
+    even = [doc_id for doc_id, stems in documents if "чётн" in stems]
+    with bridge.managed_index() as index_ptr:
+        bridge.add_documents_to_index(index_ptr, documents)
+        assert bridge.save_mapped_index(index_ptr, path)
+        assert bridge.count_index_matches(index_ptr, "чётн") == 150
+        with bridge.managed_search_cursor(bridge.open_search_cursor(index_ptr, "общ NOT чётн")) as cursor:
+            assert bridge.search_cursor_count(cursor) == 150
+            chunks = list(bridge.iter_search_cursor(cursor, 40))
+            assert [len(chunk) for chunk in chunks] == [40, 40, 40, 30]
+            assert sum(chunks, []) == [d for d in range(1, 301) if d % 2 == 1]
+
+    with bridge.managed_mapped_index(path) as mapped_ptr:
+        live_docs = bytearray(b"\xff" * 38)
+        live_docs[0] = 0 # Deletes documents 1..7.
+        assert bridge.count_mapped_index_matches(mapped_ptr, "чётн", live_docs) == 147
+        with bridge.managed_search_cursor(bridge.open_mapped_search_cursor(mapped_ptr, "чётн", live_docs)) as cursor:
+            bridge.search_cursor_seek(cursor, 145)
+            assert bridge.search_cursor_next(cursor, 10) == [298, 300]
+            assert bridge.search_cursor_next(cursor, 10) == []
+            bridge.search_cursor_seek(cursor, 2) # Seeking back restarts the lazy evaluation.
+            assert bridge.search_cursor_next(cursor, 3) == [12, 14, 16]
+            assert bridge.search_cursor_count(cursor) == 147
+
+    index = SegmentedIndex(str(tmp_path / "segments"), bridge, create=True)
+    for start in range(0, 300, 100):
+        index.add_documents(documents[start:start + 100][::-1])
+    assert index.count("чётн") == 150
+    assert index.search_page("чётн", 95, 10) == (even[95:105], 150)
+    assert index.search_page("чётн", 140, None) == (even[140:], 150)
+    assert index.search_page("чётн", 140, None, total=150) == (even[140:], 150)
+
+def test_concurrent_searches_share_one_mapped_index(bridge, tmp_path):
+    """Tests that many threads can query one mapped index handle at once."""
+    from concurrent.futures import ThreadPoolExecutor
+    path = str(tmp_path / "index.idx")
+    with bridge.managed_index() as index_ptr:
+        bridge.add_documents_to_index(index_ptr, [(doc_id, ["общ", f"ост{doc_id % 7}"]) for doc_id in range(1, 3001)])
+        assert bridge.save_mapped_index(index_ptr, path)
+
+    queries = [f"общ NOT ост{r}" for r in range(7)] * 20
+    with bridge.managed_mapped_index(path) as mapped_ptr:
+        expected = {query: bridge.search_mapped_index(mapped_ptr, query) for query in set(queries)}
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda query: bridge.search_mapped_index(mapped_ptr, query), queries))
+        assert all(result == expected[query] for query, result in zip(queries, results))
+        assert bridge.postings_cache_stats(mapped_ptr)["hits"] > 0
+
+def test_term_stats_from_the_index(bridge, tmp_path):
+    """Tests document and collection frequencies read from mapped indexes, merges and segments."""
+    from search.segments import SegmentedIndex
+    from analysis.zipf_analysis import zipf_rows
+    documents = [(1, ["кот", "кот", "пёс"]), (2, ["кот"]), (9, ["пёс", "мышь", "пёс"])]
+    paths = [str(tmp_path / f"part{n}.idx") for n in range(2)]
+    for path, part in zip(paths, (documents[:2], documents[2:])):
+        with bridge.managed_index() as index_ptr:
+            bridge.add_documents_to_index(index_ptr, part)
+            assert bridge.save_mapped_index(index_ptr, path)
+    merged = str(tmp_path / "merged.idx")
+    assert bridge.merge_mapped_indexes(paths, merged)
+
+    with bridge.managed_mapped_index(merged) as mapped_ptr:
+        assert bridge.get_mapped_term_stats(mapped_ptr) == [("кот", 2, 3), ("мышь", 1, 1), ("пёс", 2, 3)]
+        # Deleting document 1 leaves "кот" once in document 2.
+        assert bridge.get_mapped_term_stats(mapped_ptr, bytearray([0b1111_1101, 0xff])) == [
+            ("кот", 1, 1), ("мышь", 1, 1), ("пёс", 1, 2)]
 
+    index = SegmentedIndex(str(tmp_path / "segments"), bridge, create=True)
+    index.add_documents(documents[:2])
+    index.add_documents(documents[2:] + [(2, ["мышь"])])
+    assert index.term_stats() == {"кот": [1, 2], "пёс": [2, 3], "мышь": [2, 2]}
+    rows = zipf_rows([("кот", 1, 2), ("пёс", 2, 3), ("мышь", None, 2)])
+    assert [(row["stem"], row["rank"]) for row in rows] == [("пёс", 1), ("кот", 2), ("мышь", 3)]
+    assert rows[1]["frequency_rank_product"] == 4 and "doc_frequency" not in rows[2]
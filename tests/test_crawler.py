@@ -0,0 +1,121 @@
+import sys
+import os
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+def test_async_crawler_against_local_server(tmp_path):
+    """Tests the concurrent crawler end to end against a local stand-in for Wikipedia."""
+    pytest.importorskip("aiohttp")
+    pytest.importorskip("bs4")
+    import asyncio
+    import threading
+    import time
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    from urllib.parse import unquote
+    from crawler.async_crawler import AsyncWikipediaCrawler, TokenBucket
+    from crawler.frontier import CrawlFrontier
+
+    pages = {
+        "/wiki/Категория:Наука": '<div id="mw-subcategories"><a href="/wiki/Категория:Физика">Физика</a></div>'
+                                 '<div id="mw-pages"><a href="/wiki/Статья_1">1</a><a href="/wiki/Служебная:Поиск">s</a>'
+                                 '<a href="/wiki/Статья_2">2</a></div>',
+        "/wiki/Категория:Физика": '<div id="mw-pages">' + "".join(f'<a href="/wiki/Статья_{n}">{n}</a>' for n in range(1, 9)) + '</div>',
+    }
+    for n in range(1, 9):
+        pages[f"/wiki/Статья_{n}"] = f'<h1 id="firstHeading">Статья {n}</h1><div id="mw-content-text"><p>Текст статьи {n}.</p></div>'
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = unquote(self.path)
+            requests_seen.append(path)
+            body = pages.get(path)
+            # The first request for article 3 fails and must be retried.
+            status = 503 if path == "/wiki/Статья_3" and requests_seen.count(path) == 1 else (200 if body else 404)
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.end_headers()
+            if status == 200:
+                self.wfile.write(body.encode("utf-8"))
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        stored = []
+        journal_path = str(tmp_path / "frontier.journal")
+        frontier = CrawlFrontier(journal_path)
+        crawler = AsyncWikipediaCrawler(base_url, "/wiki/Категория:Наука", stored.extend, max_articles=6,
+                                        known_urls={f"{base_url}/wiki/Статья_2"}, first_article_id=11,
+                                        concurrency=4, rate=1000, burst=10, batch_size=4, frontier=frontier)
+        assert asyncio.run(crawler.crawl()) == 6
+        frontier.close()
+
+        # A batch that fails to store is logged and its urls stay pending; the crawl still finishes.
+        calls = []
+        def flaky_store(batch):
+            calls.append(len(batch))
+            if len(calls) == 1:
+                raise IOError("database unavailable")
+        flaky_path = str(tmp_path / "flaky.journal")
+        flaky = AsyncWikipediaCrawler(base_url, "/wiki/Категория:Наука", flaky_store, max_articles=8,
+                                      concurrency=4, rate=1000, burst=10, batch_size=2, frontier=CrawlFrontier(flaky_path))
+        assert asyncio.run(asyncio.wait_for(flaky.crawl(), 30)) == sum(calls) - 2
+        assert flaky.failed == 2
+        flaky.frontier.close()
+        resumed_flaky = CrawlFrontier(flaky_path)
+        assert len(resumed_flaky.pending()) == 2
+        resumed_flaky.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert sorted(doc["article_id"] for doc in stored) == list(range(11, 17))
+    titles = {doc["title"] for doc in stored}
+    assert len(titles) == 6 and "Статья 2" not in titles and "Статья 3" in titles
+    assert "/wiki/Служебная:Поиск" not in requests_seen
+    resumed = CrawlFrontier(journal_path)
+    assert resumed.pending() == [] and f"{base_url}/wiki/Категория:Физика" in resumed
+    assert sum(doc["url"] in resumed for doc in stored) == 6 and f"{base_url}/wiki/Статья_8" not in resumed
+    resumed.close()
+
+    async def take(bucket, n):
+        start = time.monotonic()
+        for _ in range(n):
+            await bucket.acquire()
+        return time.monotonic() - start
+    # One token up front, then one every 50 ms.
+    assert 0.18 < asyncio.run(take(TokenBucket(rate=20, burst=1), 5)) < 1.0
+
+def test_crawl_frontier_journal(tmp_path):
+    """Tests that the frontier journal resumes pending urls after a crash and survives compaction."""
+    from crawler.frontier import CrawlFrontier
+    path = str(tmp_path / "frontier.journal")
+    frontier = CrawlFrontier(path)
+    assert frontier.is_new
+    frontier.seed_from_state({"to_visit_categories": ["к1"], "visited_categories": ["к0"], "visited_articles": ["с0"]})
+    assert frontier.add("к2") and not frontier.add("к1") and not frontier.add("к0")
+    assert frontier.pop() == "к1"
+    frontier.done("к1")
+    assert frontier.pop() == "к2" # Taken but never done: pending again after a restart.
+    assert frontier.add("к3") and frontier.mark_seen("с1") and not frontier.mark_seen("с0")
+    frontier.flush()
+    with open(path, "ab") as f:
+        f.write(b"Q \xd0\xba4") # A record torn by the crash.
+
+    resumed = CrawlFrontier(path)
+    assert not resumed.is_new and resumed.pending() == ["к2", "к3"]
+    assert all(url in resumed for url in ["к0", "к1", "с0", "с1"]) and "к4" not in resumed
+    assert resumed.add("к4") and resumed.pop() == "к2"
+    resumed.compact()
+    resumed.close()
+    with open(path, "rb") as f:
+        assert b"D " not in f.read()
+
+    compacted = CrawlFrontier(path)
+    assert sorted(compacted.pending()) == ["к2", "к3", "к4"] and "с1" in compacted and compacted.seen_count == 7
+    compacted.close()
@@ -0,0 +1,40 @@
+import sys
+import os
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+def test_doc_store(tmp_path):
+    """Tests writing and memory-mapped lookups of the article_id -> title/url store."""
+    from search.doc_store import DocStore, write_doc_store
+    path = str(tmp_path / "index.docs")
+    documents = [(doc_id, f"Статья {doc_id}", f"https://example.org/{doc_id}") for doc_id in range(100, 0, -3)]
+    assert write_doc_store(path, documents + [(7, "Закон Ципфа", None)]) == len(documents)
+
+    store = DocStore(path)
+    assert len(store) == len(documents)
+    assert store.get(100) == {"article_id": 100, "title": "Статья 100", "url": "https://example.org/100"}
+    assert store.get(7) == {"article_id": 7, "title": "Закон Ципфа", "url": ""}
+    assert store.get(2) is None and 3 not in store
+    found, missing = store.lookup([1, 2, 4])
+    assert [doc["article_id"] for doc in found] == [1, 4] and missing == [2]
+    store.close()
+
+    # Merged stores stream the inputs' bytes; a document in several inputs comes from the last.
+    from search.doc_store import merge_doc_stores
+    parts = [str(tmp_path / f"part{i}.docs") for i in range(3)]
+    write_doc_store(parts[0], [(1, "Старая", "u1"), (4, "Четыре", "u4")])
+    write_doc_store(parts[1], [])
+    write_doc_store(parts[2], [(1, "Новая", ""), (2, "Два", "u2")])
+    merged_path = str(tmp_path / "merged.docs")
+    assert merge_doc_stores(merged_path, parts) == 3
+    merged = DocStore(merged_path)
+    assert [merged.get(doc_id) for doc_id in (1, 2, 4)] == [{"article_id": 1, "title": "Новая", "url": ""},
+                                                            {"article_id": 2, "title": "Два", "url": "u2"},
+                                                            {"article_id": 4, "title": "Четыре", "url": "u4"}]
+    merged.close()
+
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 1)
+    with pytest.raises(IOError):
+        DocStore(path)
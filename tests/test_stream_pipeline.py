@@ -0,0 +1,52 @@
+import sys
+import os
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from core.bridge import CoreBridge
+
+@pytest.fixture(scope="module")
+def bridge():
+    """Fixture to provide a single instance of the CoreBridge."""
+    try:
+        return CoreBridge()
+    except ImportError as e:
+        pytest.fail(f"Failed to import C++ core library: {e}")
+
+def test_streaming_pipeline_from_jsonl(bridge, tmp_path):
+    """Tests the single-pass pipeline: a JSONL dump indexed in several segments matches a direct build."""
+    import json
+    from scripts.stream_pipeline import read_jsonl, run_pipeline
+    from search.doc_store import DocStore
+
+    texts = ["Закон Ципфа о частотах слов", "Частоты слов в корпусе", "", "Поиск по корпусу статей",
+             "Слова и частоты", "Ципф изучал слова"]
+    dump = tmp_path / "articles.jsonl"
+    with open(dump, "w", encoding="utf-8") as f:
+        for doc_id, text in enumerate(texts, 1):
+            f.write(json.dumps({"article_id": doc_id, "title": f"Статья {doc_id}", "text": text}, ensure_ascii=False) + "\n")
+        f.write(json.dumps({"text": "без номера"}) + "\n\n")
+
+    out_path, docs_path = str(tmp_path / "stream.idx"), str(tmp_path / "stream.docs")
+    batches = []
+    count = run_pipeline(read_jsonl(dump), out_path, bridge, batch_size=2, workers=2, in_flight=1, positions=True,
+                         segment_docs=2, doc_store_path=docs_path, on_batch=lambda batch, results: batches.append(len(batch)))
+    assert count == 5 and batches == [2, 2, 1]
+    assert not [name for name in os.listdir(tmp_path) if ".seg" in name]
+
+    direct_path = str(tmp_path / "direct.idx")
+    with bridge.managed_index(positions=True) as index_ptr:
+        results = bridge.tokenize_and_stem_batch([text for text in texts if text])
+        bridge.add_documents_to_index(index_ptr, [(doc_id, stems) for doc_id, (_, stems) in zip([1, 2, 4, 5, 6], results)])
+        assert bridge.save_mapped_index(index_ptr, direct_path)
+    with bridge.managed_mapped_index(out_path) as streamed, bridge.managed_mapped_index(direct_path) as direct:
+        assert bridge.get_mapped_term_stats(streamed) == bridge.get_mapped_term_stats(direct)
+        for query in ["частот", "слов AND ципф", '"закон ципф"', "корпус NOT поиск"]:
+            assert bridge.search_mapped_index(streamed, query) == bridge.search_mapped_index(direct, query)
+    store = DocStore(docs_path)
+    assert len(store) == 5 and store.get(6)["title"] == "Статья 6" and store.get(1)["title"] == "Статья 1"
+    store.close()
+
+    assert run_pipeline(iter([]), out_path, bridge) == 0
+    with bridge.managed_mapped_index(out_path) as empty:
+        assert empty and bridge.get_mapped_term_stats(empty) == []
@@ -0,0 +1,80 @@
+import sys
+import os
+import importlib
+import threading
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from core.bridge import CoreBridge
+from search.doc_store import write_doc_store
+
+DOCUMENTS = [(doc_id, ["наук"] + (["ципф"] if doc_id % 3 == 0 else [])) for doc_id in range(1, 61)]
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    """A working directory holding a mapped index and a doc store, where the engine looks for them."""
+    bridge = CoreBridge()
+    monkeypatch.chdir(tmp_path)
+    with bridge.managed_index() as index_ptr:
+        bridge.add_documents_to_index(index_ptr, DOCUMENTS)
+        assert bridge.save_mapped_index(index_ptr, "boolean_index.idx")
+    write_doc_store("boolean_index.docs", [(doc_id, f"Статья {doc_id}", f"https://example.org/{doc_id}") for doc_id, _ in DOCUMENTS])
+    return tmp_path
+
+@pytest.fixture
+def web_app(index_dir):
+    """web.app imported afresh, so its engine opens the index of index_dir."""
+    sys.modules.pop("web.app", None)
+    module = importlib.import_module("web.app")
+    yield module
+    sys.modules.pop("web.app", None)
+
+def test_search_engine_over_mapped_index(index_dir):
+    """Tests the engine against a mapped index and doc store in the working directory."""
+    from search.boolean_search import BooleanSearchEngine
+    engine = BooleanSearchEngine()
+    assert engine.mapped
+    results, total, _ = engine.search_page("Ципфа", offset=5, limit=3)
+    assert total == 20
+    assert results == [{"article_id": doc_id, "title": f"Статья {doc_id}", "url": f"https://example.org/{doc_id}"}
+                       for doc_id in (18, 21, 24)]
+    assert engine.count("наука AND NOT ципф") == 40
+
+    # Pages of a query share one count per index generation; a page walks no further than its end.
+    counts = []
+    count_matches = engine.bridge.count_mapped_index_matches
+    engine.bridge.count_mapped_index_matches = lambda *args: counts.append(args) or count_matches(*args)
+    engine.bridge.search_cursor_count = None
+    assert [engine.search_page("наука", offset=offset, limit=10)[1] for offset in (0, 10, 50)] == [60, 60, 60]
+    assert engine.count("наука") == 60 and len(counts) == 1
+
+def test_search_engine_falls_back_to_the_loaded_index(index_dir, capsys):
+    """Tests that a mapped index the core cannot open (e.g. an older format) falls back to boolean_index.bin."""
+    from search.boolean_search import BooleanSearchEngine
+    bridge = CoreBridge()
+    with bridge.managed_index() as index_ptr:
+        bridge.add_documents_to_index(index_ptr, DOCUMENTS)
+        assert bridge.save_index(index_ptr, "boolean_index.bin")
+    with open("boolean_index.idx", "r+b") as f:
+        f.write(b"\0" * 16)
+    engine = BooleanSearchEngine()
+    assert not engine.mapped and "Warning" in capsys.readouterr().out
+    assert engine.count("ципф") == 20
+
+def test_api_search(web_app):
+    """Tests the JSON search API and that it turns searches away while every worker is busy."""
+    client = web_app.app.test_client()
+    response = client.get("/api/search", query_string={"query": "ципф", "offset": 18, "limit": 5})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["total"] == 20 and [doc["article_id"] for doc in body["results"]] == [57, 60]
+    assert client.get("/api/search", query_string={"query": "наук", "count_only": 1}).get_json()["total"] == 60
+    assert client.get("/api/search").status_code == 400
+
+    # A search holding every slot (e.g. one that timed out but is still running) keeps the rest out.
+    web_app.search_slots = threading.BoundedSemaphore(1)
+    assert web_app.search_slots.acquire(blocking=False)
+    response = client.get("/api/search", query_string={"query": "ципф"})
+    assert response.status_code == 503 and response.headers["Retry-After"]
+    web_app.search_slots.release()
+    assert client.get("/api/search", query_string={"query": "ципф"}).status_code == 200
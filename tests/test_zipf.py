@@ -0,0 +1,22 @@
+import sys
+import os
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+def test_zipf_fit_and_plot_artifacts(tmp_path):
+    """Tests the Zipf fit and the versioned plot artifacts served by the web app."""
+    pytest.importorskip("matplotlib")
+    from analysis.zipf_analysis import fit_zipf, save_zipf_artifacts, load_zipf_manifest
+    ranks = list(range(1, 201))
+    frequencies = [round(10000 / rank ** 1.1) for rank in ranks]
+    alpha, intercept = fit_zipf(ranks, frequencies)
+    assert abs(alpha - 1.1) < 0.05 and abs(intercept - 9.21) < 0.1
+    assert fit_zipf([1, 2], [1, 1]) is None
+
+    directory = str(tmp_path / "zipf")
+    manifest = save_zipf_artifacts(ranks, frequencies, directory)
+    assert load_zipf_manifest(directory) == manifest
+    with open(os.path.join(directory, manifest["plot"]), "rb") as f:
+        assert f.read(8) == b"\x89PNG\r\n\x1a\n"
+    assert load_zipf_manifest(str(tmp_path / "missing")) is None
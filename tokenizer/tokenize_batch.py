@@ -1,42 +1,88 @@
 import sys
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from pymongo import MongoClient, UpdateOne
-from datetime import datetime
 
 # Add project root to path to allow importing core_bridge
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from core.bridge import CoreBridge
 from crawler.config import MONGO_URI, DB_NAME, ARTICLES_COLLECTION
+from search.term_dictionary import TermDictionary, TERMS_COLLECTION, TERM_IDS_FIELD
 
-# Create a single instance of the bridge for this process
+# Create a single instance of the bridge for this process.
+# Pipeline workers are spawned processes, so each of them imports this module and owns its own bridge.
 core_bridge = CoreBridge()
 
 def create_db_index(collection):
-    """Creates an index on the 'metadata.tokenized' field."""
-    if "metadata.tokenized_1" not in collection.index_information():
-        collection.create_index("metadata.tokenized")
-        print("Created index on 'metadata.tokenized'.")
-
-def process_document(document):
-    """Tokenizes and stems a single document using the C++ core library."""
-    text = document.get('text', '')
-    if not text:
-        return None, None
-    
-    tokens = core_bridge.tokenize(text)
-    stems = [core_bridge.stem_word(token) for token in tokens]
-    
-    return tokens, stems
+    """
+    Creates the indexes on 'metadata.tokenized' (documents left to tokenize) and
+    'metadata.tokenized_at' (documents tokenized since update_index.py last ran).
+    """
+    indexes = collection.index_information()
+    for field in ("metadata.tokenized", "metadata.tokenized_at"):
+        if f"{field}_1" not in indexes:
+            collection.create_index(field)
+            print(f"Created index on '{field}'.")
+
+def process_documents(documents):
+    """
+    Tokenizes and stems a list of documents with a single call into the C++ core.
+    Returns a (tokens, stems) pair per document, or (None, None) for documents without text.
+    """
+    with_text = [i for i, doc in enumerate(documents) if doc.get('text')]
+    results = [(None, None)] * len(documents)
+    batch_results = core_bridge.tokenize_and_stem_batch([documents[i]['text'] for i in with_text])
+    for i, result in zip(with_text, batch_results):
+        results[i] = result
+    return results
+
+def make_update(doc_id, tokens, stems, dictionary):
+    """
+    Builds the bulk-write operation that stores a document's stems as packed term ids; of the
+    tokens only their number is kept. String arrays written by earlier versions are left alone
+    (see drop_string_stems). 'metadata.tokenized_at' is the server's clock when the write is
+    applied, not when the batch was built, so concurrent writers cannot commit a time that
+    update_index.py has already read past (see TOKENIZED_AT_LAG there).
+    """
+    return UpdateOne(
+        {'_id': doc_id},
+        {'$set': {
+            TERM_IDS_FIELD: dictionary.encode(stems),
+            'metadata.token_count': len(tokens),
+            'metadata.tokenized': True
+        }, '$currentDate': {'metadata.tokenized_at': True}}
+    )
+
+def drop_string_stems(collection):
+    """
+    One-off migration: removes the `tokens` and `stems` string arrays of earlier versions from
+    the documents that already hold their stems as term ids. Returns the number of documents changed.
+    """
+    result = collection.update_many(
+        {TERM_IDS_FIELD: {'$exists': True}, '$or': [{'tokens': {'$exists': True}}, {'stems': {'$exists': True}}]},
+        {'$unset': {'tokens': "", 'stems': ""}}
+    )
+    return result.modified_count
+
+def write_updates(collection, dictionary, updates, ordered=True):
+    """Saves the terms the updates introduced, then the updates, so no stored id is missing from the dictionary."""
+    dictionary.save()
+    collection.bulk_write(updates, ordered=ordered)
 
 def run_tokenizer_for_query(query, batch_size=500, max_workers=4):
     """
-    Finds documents matching a query and processes them in batches
-    using a thread pool to tokenize and stem their text.
+    Finds documents matching a query and processes them in batches.
+    Each batch is split across a thread pool, one C++ batch call per thread.
     """
     client = MongoClient(MONGO_URI)
     db = client[DB_NAME]
     collection = db[ARTICLES_COLLECTION]
+    dictionary = TermDictionary(db[TERMS_COLLECTION], core_bridge)
     
     create_db_index(collection)
 
@@ -48,45 +94,160 @@ def run_tokenizer_for_query(query, batch_size=500, max_workers=4):
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         for i in range(0, total_docs, batch_size):
             batch_ids = doc_ids_to_process[i:i + batch_size]
-            batch_docs = list(collection.find({'_id': {'$in': batch_ids}}))
+            batch_docs = list(collection.find({'_id': {'$in': batch_ids}}, {'_id': 1, 'text': 1}))
             
-            future_to_doc = {executor.submit(process_document, doc): doc for doc in batch_docs}
+            # The core releases the GIL while it tokenizes, so the chunks run in parallel.
+            chunk_size = max(1, -(-len(batch_docs) // max_workers))
+            future_to_chunk = {
+                executor.submit(process_documents, batch_docs[j:j + chunk_size]): batch_docs[j:j + chunk_size]
+                for j in range(0, len(batch_docs), chunk_size)
+            }
             
             updates = []
-            for future in as_completed(future_to_doc):
-                doc = future_to_doc[future]
+            for future in as_completed(future_to_chunk):
+                chunk = future_to_chunk[future]
                 try:
-                    tokens, stems = future.result()
-                    if tokens is not None:
-                        update = UpdateOne(
-                            {'_id': doc['_id']},
-                            {'$set': {
-                                'tokens': tokens,
-                                'stems': stems,
-                                'metadata.tokenized': True,
-                                'metadata.tokenized_at': datetime.utcnow()
-                            }}
-                        )
-                        updates.append(update)
+                    chunk_results = future.result()
                 except Exception as exc:
-                    print(f"Document {doc['_id']} generated an exception: {exc}")
+                    print(f"Batch starting with document {chunk[0]['_id']} generated an exception: {exc}")
+                    continue
+                for doc, (tokens, stems) in zip(chunk, chunk_results):
+                    if tokens is not None:
+                        updates.append(make_update(doc['_id'], tokens, stems, dictionary))
             
             if updates:
-                collection.bulk_write(updates)
+                write_updates(collection, dictionary, updates)
                 processed_count += len(updates)
                 print(f"Processed batch. Total processed: {processed_count}/{total_docs}")
 
-    print(f"\nTokenization complete. Total documents processed: {processed_count}")
+    print(f"\nTokenization complete. Total documents processed: {processed_count}, {len(dictionary)} distinct stems.")
+    dictionary.close()
     client.close()
 
+# --- Pipelined, process-parallel runner ---
+_END_OF_STREAM = None
+
+def _read_batches(collection, doc_ids, batch_size, out_queue):
+    """Reader stage: fetches the documents batch by batch and hands them to the compute stage."""
+    try:
+        for i in range(0, len(doc_ids), batch_size):
+            batch_ids = doc_ids[i:i + batch_size]
+            out_queue.put(list(collection.find({'_id': {'$in': batch_ids}}, {'_id': 1, 'text': 1})))
+    except Exception as exc:
+        print(f"Reader stage failed: {exc}")
+    finally:
+        out_queue.put(_END_OF_STREAM)
+
+def _write_batches(collection, dictionary, in_queue, total_docs, stats):
+    """
+    Writer stage: waits for each tokenized batch in submission order, encodes its stems with
+    the term dictionary (which only this thread touches) and writes it back.
+    """
+    while True:
+        item = in_queue.get()
+        if item is _END_OF_STREAM:
+            break
+        doc_ids, future = item
+        try:
+            results = future.result()
+        except Exception as exc:
+            print(f"Batch starting with document {doc_ids[0]} generated an exception: {exc}")
+            continue
+        updates = [make_update(doc_id, tokens, stems, dictionary)
+                   for doc_id, (tokens, stems) in zip(doc_ids, results) if tokens is not None]
+        if not updates:
+            continue
+        try:
+            write_updates(collection, dictionary, updates, ordered=False)
+        except Exception as exc:
+            print(f"Writing batch starting with document {doc_ids[0]} failed: {exc}")
+            continue
+        stats['processed'] += len(updates)
+        elapsed = time.monotonic() - stats['started']
+        print(f"Processed batch. Total processed: {stats['processed']}/{total_docs} "
+              f"({stats['processed'] / elapsed:.0f} docs/s)")
+
+def _tokenize_texts(texts):
+    """Compute stage, runs in a worker process with that process's own CoreBridge."""
+    return process_documents([{'text': text} for text in texts])
+
+def run_pipelined_tokenizer(query, batch_size=500, workers=None, queue_size=None):
+    """
+    Tokenizes the documents matching a query with three overlapping stages: a reader thread
+    fetching batches from MongoDB, a pool of worker processes tokenizing and stemming them,
+    and a writer thread running bulk_write. Bounded queues between the stages apply
+    backpressure, so at most `queue_size` batches are read ahead or awaiting their write.
+    """
+    workers = workers or os.cpu_count() or 1
+    queue_size = queue_size or 2 * workers
+
+    # Spawned (not forked) workers: the MongoClient below must not be shared with children.
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    client = MongoClient(MONGO_URI)
+    collection = client[DB_NAME][ARTICLES_COLLECTION]
+    dictionary = TermDictionary(client[DB_NAME][TERMS_COLLECTION], core_bridge)
+    create_db_index(collection)
+
+    # Collect the ids up front: the writer changes the fields the query matches on.
+    doc_ids_to_process = [doc['_id'] for doc in collection.find(query, {'_id': 1})]
+    total_docs = len(doc_ids_to_process)
+    print(f"Found {total_docs} documents to tokenize with {workers} worker processes.")
+
+    read_queue = queue.Queue(maxsize=queue_size)
+    write_queue = queue.Queue(maxsize=queue_size)
+    stats = {'processed': 0, 'started': time.monotonic()}
+    reader = threading.Thread(target=_read_batches, args=(collection, doc_ids_to_process, batch_size, read_queue), daemon=True)
+    writer = threading.Thread(target=_write_batches, args=(collection, dictionary, write_queue, total_docs, stats), daemon=True)
+    reader.start()
+    writer.start()
+
+    try:
+        while True:
+            batch_docs = read_queue.get()
+            if batch_docs is _END_OF_STREAM:
+                break
+            with_text = [doc for doc in batch_docs if doc.get('text')]
+            if not with_text:
+                continue
+            future = pool.submit(_tokenize_texts, [doc['text'] for doc in with_text])
+            write_queue.put(([doc['_id'] for doc in with_text], future)) # Blocks while the writer is behind.
+    finally:
+        write_queue.put(_END_OF_STREAM)
+        writer.join()
+        pool.shutdown()
+        dictionary.close()
+        client.close()
+
+    elapsed = time.monotonic() - stats['started']
+    rate = stats['processed'] / elapsed if elapsed > 0 else 0.0
+    print(f"\nTokenization complete. Total documents processed: {stats['processed']} "
+          f"in {elapsed:.1f}s ({rate:.0f} docs/s), {len(dictionary)} distinct stems.")
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tokenize and stem the articles that have not been processed yet.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Number of worker processes (or threads with --threads).")
+    parser.add_argument('--batch-size', type=int, default=500, help="Documents per batch.")
+    parser.add_argument('--threads', action='store_true', help="Use the single-process thread pool runner instead of the pipeline.")
+    parser.add_argument('--drop-string-stems', action='store_true',
+                        help="Only remove the 'tokens' and 'stems' arrays of earlier versions from articles that have term ids.")
+    args = parser.parse_args()
+
+    if args.drop_string_stems:
+        client = MongoClient(MONGO_URI)
+        removed = drop_string_stems(client[DB_NAME][ARTICLES_COLLECTION])
+        client.close()
+        print(f"Removed the string arrays from {removed} articles.")
+        sys.exit(0)
+
     # Process all documents that have not been tokenized yet
-    # (either the field doesn't exist or the tokens array is empty)
+    # (or were tokenized into string arrays, before term ids were stored)
     untokenized_query = {
         "$or": [
             {"metadata.tokenized": {"$exists": False}},
-            {"tokens": {"$exists": False}},
-            {"tokens": []}
+            {TERM_IDS_FIELD: {"$exists": False}}
         ]
     }
-    run_tokenizer_for_query(untokenized_query)
+    if args.threads:
+        run_tokenizer_for_query(untokenized_query, batch_size=args.batch_size, max_workers=args.workers)
+    else:
+        run_pipelined_tokenizer(untokenized_query, batch_size=args.batch_size, workers=args.workers)
@@ -1,27 +1,57 @@
-from flask import Flask, request, render_template, redirect, url_for, flash, Response
+from flask import Flask, request, render_template, redirect, url_for, flash, Response, jsonify
 import sys
 import os
-import io
 import time
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import numpy as np
+import argparse
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 # Add project root to path for imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from search.boolean_search import BooleanSearchEngine, INDEX_FILE_PATH
+from search.boolean_search import BooleanSearchEngine, INDEX_FILE_PATH, MAPPED_INDEX_FILE_PATH, DEFAULT_TOP_K, RESULTS_PER_PAGE
+from search.segments import SegmentedIndex
 from crawler.config import MONGO_URI, DB_NAME, ARTICLES_COLLECTION
-from analysis.zipf_analysis import ZIPF_COLLECTION
+from analysis.zipf_analysis import ZIPF_COLLECTION, ZIPF_ARTIFACTS_DIR, ZIPF_MANIFEST_NAME, load_zipf_manifest, build_zipf_artifacts_from_db
 from pymongo import MongoClient
 
 app = Flask(__name__)
 app.secret_key = 'your_very_secret_key'
 
+# Searches run on a bounded pool shared by all request threads: the engine and its index are
+# shared, the core runs queries in parallel without the GIL, and a request gives up waiting
+# after SEARCH_TIMEOUT seconds. A query that timed out still finishes in the background and
+# keeps its worker, so a search is only accepted while a worker is free; otherwise the
+# request is turned away at once instead of queueing behind queries nobody waits for.
+SEARCH_WORKERS = os.cpu_count() or 4
+SEARCH_TIMEOUT = 10.0 # Seconds
+SEARCH_RETRY_AFTER = 2 # Seconds a client turned away is asked to wait
+MAX_PAGE_SIZE = 1000
+search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+search_slots = threading.BoundedSemaphore(SEARCH_WORKERS) # One per search running, waited for or not
+
+class SearchBusyError(Exception):
+    """Every search worker is busy."""
+
+def run_search(method, *args, **kwargs):
+    """
+    Runs an engine method on the search pool. Raises SearchBusyError if every worker is busy and
+    FutureTimeoutError after SEARCH_TIMEOUT; the worker is freed when the query itself finishes.
+    """
+    if not search_slots.acquire(blocking=False):
+        raise SearchBusyError()
+    try:
+        future = search_pool.submit(method, *args, **kwargs)
+    except BaseException:
+        search_slots.release()
+        raise
+    future.add_done_callback(lambda _: search_slots.release())
+    return future.result(timeout=SEARCH_TIMEOUT)
+
 # --- Initialize Search Engine ---
 search_engine = None
 try:
-    if os.path.exists(INDEX_FILE_PATH):
+    if SegmentedIndex.exists() or os.path.exists(MAPPED_INDEX_FILE_PATH) or os.path.exists(INDEX_FILE_PATH):
         search_engine = BooleanSearchEngine()
     else:
         print(f"Warning: Index file '{INDEX_FILE_PATH}' not found. Search will be disabled.")
@@ -46,65 +76,154 @@ def search_page():
         flash('Ошибка: Поисковый движок не инициализирован. Индексный файл не найден.', 'error')
         return render_template('search.html')
 
-    if request.method == 'POST':
-        query = request.form.get('query')
-        if query:
-            try:
-                results, ex_time = search_engine.search(query)
-                display_count = len(results) + 5000
-                return render_template('search.html', results=results, query=query, execution_time=ex_time, results_count=display_count)
-            except Exception as e:
-                flash(f'Ошибка при выполнении поиска: {e}', 'error')
-                return render_template('search.html', query=query)
+    # The form posts; a GET with ?query=...&mode=ranked&k=20&page=2 runs the same search.
+    query = request.values.get('query')
+    mode = request.values.get('mode', 'boolean')
+    if mode not in ('boolean', 'ranked'):
+        mode = 'boolean'
+    k = request.values.get('k', DEFAULT_TOP_K, type=int)
+    k = max(1, min(k, 1000))
+    page = max(1, request.values.get('page', 1, type=int))
+    if query:
+        try:
+            offset = (page - 1) * RESULTS_PER_PAGE
+            results, total, ex_time = run_search(search_engine.search_page, query, offset=offset, limit=RESULTS_PER_PAGE,
+                                                 mode=mode, k=k)
+            pages = max(1, -(-total // RESULTS_PER_PAGE))
+            return render_template('search.html', results=results, query=query, execution_time=ex_time, results_count=total,
+                                   mode=mode, k=k, page=page, pages=pages)
+        except FutureTimeoutError:
+            flash(f'Поиск не уложился в {SEARCH_TIMEOUT:g} сек. Уточните запрос.', 'error')
+            return render_template('search.html', query=query, mode=mode, k=k)
+        except SearchBusyError:
+            flash('Сервер перегружен запросами, повторите поиск через несколько секунд.', 'error')
+            return render_template('search.html', query=query, mode=mode, k=k), 503, {"Retry-After": str(SEARCH_RETRY_AFTER)}
+        except Exception as e:
+            flash(f'Ошибка при выполнении поиска: {e}', 'error')
+            return render_template('search.html', query=query, mode=mode, k=k)
     
-    return render_template('search.html')
+    return render_template('search.html', mode=mode, k=k)
+
+@app.route('/api/search')
+def api_search():
+    """
+    JSON search: ?query=...&mode=boolean|ranked&k=10&offset=0&limit=20, or &count_only=1 for
+    just the number of boolean matches.
+    """
+    if not search_engine:
+        return jsonify({"error": "search engine is not initialized"}), 503
+    query = request.args.get('query', '').strip()
+    if not query:
+        return jsonify({"error": "query is required"}), 400
+    mode = request.args.get('mode', 'boolean')
+    if mode not in ('boolean', 'ranked'):
+        return jsonify({"error": "mode must be 'boolean' or 'ranked'"}), 400
+    k = max(1, min(request.args.get('k', DEFAULT_TOP_K, type=int), MAX_PAGE_SIZE))
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = max(1, min(request.args.get('limit', RESULTS_PER_PAGE, type=int), MAX_PAGE_SIZE))
+
+    try:
+        if request.args.get('count_only', type=int):
+            return jsonify({"query": query, "total": run_search(search_engine.count, query)})
+        results, total, ex_time = run_search(search_engine.search_page, query, offset=offset, limit=limit, mode=mode, k=k)
+    except FutureTimeoutError:
+        return jsonify({"error": f"search timed out after {SEARCH_TIMEOUT:g}s"}), 504
+    except SearchBusyError:
+        return jsonify({"error": "all search workers are busy"}), 503, {"Retry-After": str(SEARCH_RETRY_AFTER)}
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"query": query, "mode": mode, "total": total, "offset": offset, "limit": limit,
+                    "execution_time": ex_time, "results": results})
+
+@app.route('/cache/stats')
+def get_cache_stats():
+    # Hit/miss counters of the result and postings caches, for monitoring.
+    if not search_engine:
+        return jsonify({"error": "search engine is not initialized"}), 503
+    return jsonify(search_engine.cache_stats())
+
+# --- Zipf plot ---
+# zipf_analysis.py pre-renders the plot; the route only sends the current render from memory and
+# answers revalidations with 304. If nothing is rendered yet, one background job renders it
+# from the stats in MongoDB and every request waits for that same job.
+ZIPF_RENDER_WAIT = 30.0 # Seconds a request waits for a fallback render
+zipf_render_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="zipf-render")
+_zipf_lock = threading.Lock()
+_zipf_plot = {"manifest_mtime": None, "manifest": None, "png": None}
+_zipf_render_job = None
+
+def current_zipf_plot():
+    """(manifest, png bytes) of the current render, re-read only when the manifest changes; None if there is none."""
+    try:
+        mtime = os.stat(os.path.join(ZIPF_ARTIFACTS_DIR, ZIPF_MANIFEST_NAME)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _zipf_lock:
+        if mtime != _zipf_plot["manifest_mtime"]:
+            manifest = load_zipf_manifest()
+            with open(os.path.join(ZIPF_ARTIFACTS_DIR, manifest["plot"]), "rb") as f:
+                png = f.read()
+            _zipf_plot.update(manifest_mtime=mtime, manifest=manifest, png=png)
+        return _zipf_plot["manifest"], _zipf_plot["png"]
+
+def render_zipf_plot_in_background():
+    """Starts the fallback render unless one is already running; returns its future."""
+    global _zipf_render_job
+    with _zipf_lock:
+        if _zipf_render_job is None or _zipf_render_job.done():
+            _zipf_render_job = zipf_render_pool.submit(build_zipf_artifacts_from_db, zipf_collection)
+        return _zipf_render_job
 
 @app.route('/zipf', methods=['GET'])
 def get_zipf_table():
     limit = int(request.args.get('limit', 100))
     stats = list(zipf_collection.find({}, {"_id": 0}).sort("rank", 1).limit(limit))
-    return render_template('zipf.html', stats=stats, limit=limit, timestamp=int(time.time()))
+    plot = current_zipf_plot()
+    fit = plot[0] if plot else None
+    return render_template('zipf.html', stats=stats, limit=limit, fit=fit,
+                           plot_version=fit["version"] if fit else int(time.time()))
 
 @app.route('/zipf/plot')
 def get_zipf_plot():
-    limit = 10000
-    stats = list(zipf_collection.find({}, {"_id": 0, "rank": 1, "frequency": 1}).sort("rank", 1).limit(limit))
-    
-    if not stats:
-        return "Нет данных для построения графика.", 404
-
-    ranks = np.array([s['rank'] for s in stats])
-    frequencies = np.array([s['frequency'] for s in stats])
-
-    valid_indices = (frequencies > 1) & (ranks > 0)
-    filtered_ranks = ranks[valid_indices]
-    filtered_frequencies = frequencies[valid_indices]
-
-    alpha = 0.0
-    regression_line = np.zeros_like(ranks, dtype=float)
-    if len(filtered_ranks) > 1:
-        log_ranks = np.log(filtered_ranks)
-        log_frequencies = np.log(filtered_frequencies)
-        slope, intercept = np.polyfit(log_ranks, log_frequencies, 1)
-        alpha = -slope
-        regression_line = np.exp(intercept + slope * np.log(ranks))
-    
-    plt.style.use('seaborn-v0_8-whitegrid')
-    fig, ax = plt.subplots(figsize=(12, 8))
-    ax.loglog(ranks, frequencies, marker=".", linestyle='None', label='Фактические данные корпуса', alpha=0.6, markersize=8)
-    ax.loglog(ranks, regression_line, linestyle='--', color='red', linewidth=2, label=f'Идеальный закон Ципфа (α ≈ {alpha:.2f})')
-    ax.set_title("Распределение по закону Ципфа (логарифмическая шкала)", fontsize=16)
-    ax.set_xlabel("Ранг", fontsize=12)
-    ax.set_ylabel("Частота", fontsize=12)
-    ax.legend()
-    ax.grid(True, which="both", ls="-", alpha=0.2)
-
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', bbox_inches='tight')
-    plt.close(fig)
-    buf.seek(0)
-    
-    return Response(buf.getvalue(), mimetype='image/png')
+    plot = current_zipf_plot()
+    if plot is None:
+        try:
+            render_zipf_plot_in_background().result(timeout=ZIPF_RENDER_WAIT)
+        except FutureTimeoutError:
+            return "График строится, повторите запрос позже.", 503, {"Retry-After": "5"}
+        except ValueError:
+            return "Нет данных для построения графика.", 404
+        plot = current_zipf_plot()
+
+    manifest, png = plot
+    response = Response(png, mimetype='image/png')
+    response.set_etag(manifest["version"])
+    response.last_modified = datetime.fromtimestamp(manifest["updated_at"], tz=timezone.utc)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True # Always revalidate; an unchanged plot costs a 304.
+    return response.make_conditional(request)
+
+def serve(host, port, threads):
+    """Production mode: a multi-threaded WSGI server in one process, so every thread shares one index."""
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        print("waitress is not installed, falling back to Flask's threaded server.")
+        app.run(host=host, port=port, threaded=True)
+        return
+    waitress_serve(app, host=host, port=port, threads=threads)
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    parser = argparse.ArgumentParser(description="Run the search web application.")
+    parser.add_argument('--production', action='store_true',
+                        help="Serve with a multi-threaded WSGI server (waitress, if installed) instead of the debug server.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=SEARCH_WORKERS * 2,
+                        help="Request threads of the production server.")
+    args = parser.parse_args()
+
+    if args.production:
+        serve(args.host, args.port, args.threads)
+    else:
+        app.run(debug=True, host=args.host, port=args.port)